@@ -0,0 +1,127 @@
+"""
+Addon catalog search benchmark.
+
+Generates a synthetic catalog of N entries (50,000 by default, names made of
+syllables like real addon names, with a title and a GitHub URL each), builds its
+search index and measures the latency of the queries typed in the git dialog:
+prefixes of a name as it is typed, substrings, names with a typo, and queries
+matching nothing. Everything runs in memory.
+
+    python benchmarks/catalog.py --entries 50000 --output results.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+ROOT_PATH = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_PATH))
+
+from pykek.backend.catalog import Catalog, CatalogEntry  # noqa: E402
+from workload import _percentiles  # noqa: E402
+
+_SYLLABLES = [
+    "ace", "adi", "bag", "bar", "boss", "buff", "cast", "chat", "clique", "cool",
+    "damage", "deadly", "details", "elv", "frame", "gear", "grid", "heal", "hud",
+    "info", "kui", "lib", "loot", "map", "mod", "name", "nom", "omni", "plate",
+    "plus", "quest", "raid", "rare", "scan", "shadow", "skin", "stub", "tank",
+    "timer", "tip", "tool", "track", "ui", "unit", "vuh", "weak", "aura", "xp",
+]  # fmt: skip
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=50_000, help="catalog size")
+    parser.add_argument("--queries", type=int, default=2000, help="queries per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="also write the results there")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = generate(rng, args.entries)
+    catalog = Catalog()
+    started_at = time.perf_counter()
+    catalog.set_entries(entries)
+    build_ms = (time.perf_counter() - started_at) * 1000
+    results = {
+        "workload": {"entries": args.entries, "queries": args.queries},
+        "python": sys.version.split()[0],
+        "build_ms": round(build_ms, 1),
+        "results": run(catalog, entries, rng, args.queries),
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return 0
+
+
+def generate(rng: random.Random, count: int) -> List[CatalogEntry]:
+    entries = []
+    names = set()
+    while len(entries) < count:
+        parts = rng.sample(_SYLLABLES, rng.randint(2, 4))
+        name = "".join(part.capitalize() for part in parts)
+        if rng.random() < 0.3:
+            name = f"{name}{rng.randint(1, 999)}"
+        if name in names:
+            continue
+        names.add(name)
+        author = f"author{rng.randint(1, count // 10)}"
+        entries.append(
+            CatalogEntry(
+                name=name,
+                url=f"https://github.com/{author}/{name}.git",
+                title=" ".join(part.capitalize() for part in parts),
+                author=author,
+            )
+        )
+    return entries
+
+
+def run(
+    catalog: Catalog, entries: List[CatalogEntry], rng: random.Random, queries: int
+) -> Dict[str, object]:
+    def prefix(name: str) -> str:
+        return name[: rng.randint(1, min(len(name), 12))]
+
+    def substring(name: str) -> str:
+        start = rng.randint(0, len(name) - 4)
+        return name[start : start + rng.randint(4, 8)]
+
+    def typo(name: str) -> str:
+        i = rng.randint(1, len(name) - 2)
+        return name[:i] + name[i + 1] + name[i] + name[i + 2 :]
+
+    def miss(name: str) -> str:
+        return "".join(rng.choice("jqxz") for _ in range(rng.randint(3, 10)))
+
+    kinds: Dict[str, Callable[[str], str]] = {
+        "prefix": prefix,
+        "substring": substring,
+        "typo": typo,
+        "miss": miss,
+    }
+    results: Dict[str, object] = {}
+    for kind, make_query in kinds.items():
+        samples = []
+        found = 0
+        for _ in range(queries):
+            entry = rng.choice(entries)
+            query = make_query(entry.name)
+            started_at = time.perf_counter()
+            suggestions = catalog.search(query)
+            samples.append((time.perf_counter() - started_at) * 1000)
+            found += entry in suggestions
+        results[kind] = {**_percentiles(samples), "found": round(found / queries, 2)}
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Startup benchmark.
+
+Aggregates `python -X importtime` over several runs for pykek entry modules,
+and measures the wall time of `python -m pykek --help` and the time to first
+frame of the GTK app (when a display is available).
+
+    python benchmarks/startup.py                    # print results as JSON
+    python benchmarks/startup.py --check            # compare against the baseline
+    python benchmarks/startup.py --update-baseline  # record a new baseline
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT_PATH = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "startup_baseline.json"
+IMPORT_TARGETS = ["pykek.cli", "pykek.backend.config", "pykek.frontend.window"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="allowed slowdown ratio against the baseline when using --check",
+    )
+    args = parser.parse_args()
+
+    results = {
+        "imports": {t: _import_time(t, args.runs) for t in IMPORT_TARGETS},
+        "cli_help_ms": _wall_time_ms(
+            [sys.executable, "-m", "pykek", "--help"], args.runs
+        ),
+        "first_frame_ms": _first_frame_ms(args.runs),
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if args.check:
+        return _check(results, args.tolerance)
+    return 0
+
+
+def _import_time(target: str, runs: int) -> Optional[Dict[str, object]]:
+    totals: List[float] = []
+    self_times: Dict[str, List[float]] = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            cwd=ROOT_PATH,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            return None
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            fields = [f.strip() for f in line.removeprefix("import time:").split("|")]
+            if not fields[0].isdigit():
+                continue
+            module = fields[2].strip()
+            self_times.setdefault(module, []).append(int(fields[0]) / 1000)
+            if module == target:
+                totals.append(int(fields[1]) / 1000)
+    slowest = sorted(
+        ((m, statistics.median(t)) for m, t in self_times.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:10]
+    return {
+        "total_ms": round(statistics.median(totals), 2),
+        "slowest_modules_ms": {m: round(t, 2) for m, t in slowest},
+    }
+
+
+def _wall_time_ms(
+    command: List[str], runs: int, env: Optional[Dict[str, str]] = None
+) -> Optional[float]:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            command, cwd=ROOT_PATH, capture_output=True, env=env, timeout=60
+        )
+        if result.returncode != 0:
+            return None
+        durations.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(durations), 2)
+
+
+def _first_frame_ms(runs: int) -> Optional[float]:
+    if not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+        return None
+    env = {**os.environ, "PYKEK_QUIT_AFTER_FIRST_FRAME": "1"}
+    return _wall_time_ms([sys.executable, "main.py"], runs, env)
+
+
+def _check(results: Dict[str, object], tolerance: float) -> int:
+    if not BASELINE_PATH.exists():
+        print("No baseline recorded, use --update-baseline", file=sys.stderr)
+        return 1
+    with open(BASELINE_PATH, "r") as f:
+        baseline = json.load(f)
+    measures = {
+        f"import {t}": (results["imports"][t], baseline["imports"].get(t))  # type: ignore
+        for t in IMPORT_TARGETS
+    }
+    failures = []
+    for name, (current, reference) in measures.items():
+        if current is None or reference is None:
+            continue
+        if current["total_ms"] > reference["total_ms"] * tolerance:
+            failures.append(
+                f"{name}: {current['total_ms']}ms > {reference['total_ms']}ms"
+            )
+    for key in ["cli_help_ms", "first_frame_ms"]:
+        current, reference = results[key], baseline.get(key)
+        if current is None or reference is None:
+            continue
+        if current > reference * tolerance:  # type: ignore
+            failures.append(f"{key}: {current}ms > {reference}ms")
+    for failure in failures:
+        print(f"Startup regression: {failure}", file=sys.stderr)
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
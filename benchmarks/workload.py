@@ -0,0 +1,269 @@
+"""
+Synthetic workload benchmark.
+
+Generates a WoW directory with N addon folders, a fraction of which are git
+addons cloned from local bare remotes with M commits and B branches, then
+measures the backend operations on it: `GameInstance.load_addons`,
+`Addon.update_status`, `Addon.reload_branches`, `Addon.update`,
+`Addon.switch_to_branch` and `Addon.clone`. Everything runs offline.
+
+    python benchmarks/workload.py --addons 150 --output results.json
+    python benchmarks/workload.py --compare results.json  # against a previous run
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+ROOT_PATH = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_PATH))
+
+from pykek.backend.addon import Addon, AddonStatus  # noqa: E402
+from pykek.backend.fetch_coordinator import fetch_coordinator  # noqa: E402
+from pykek.backend.game_instance import GameInstance  # noqa: E402
+from pykek.backend.remote import remote_policy  # noqa: E402
+from pykek.backend.state_store import state_store  # noqa: E402
+
+# Options that don't describe the workload
+_OPTIONS = ["output", "compare", "tolerance"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--addons", type=int, default=50, help="number of addons")
+    parser.add_argument("--git-fraction", type=float, default=0.7)
+    parser.add_argument("--outdated-fraction", type=float, default=0.5)
+    parser.add_argument("--commits", type=int, default=50, help="commits per remote")
+    parser.add_argument("--branches", type=int, default=3, help="branches per remote")
+    parser.add_argument("--runs", type=int, default=5, help="runs of load_addons")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="also write the results there")
+    parser.add_argument("--compare", type=Path, help="previous results to compare to")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="allowed p50 slowdown ratio against the results given to --compare",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pykek-bench-") as tmp_dir:
+        root = Path(tmp_dir)
+        # Keep the history, checks and timings of the benchmark out of user data
+        state_store.path = root / "state.db"
+        workload = generate(
+            root,
+            addons=args.addons,
+            git_fraction=args.git_fraction,
+            outdated_fraction=args.outdated_fraction,
+            commits=args.commits,
+            branches=args.branches,
+            seed=args.seed,
+        )
+        results = {
+            "workload": {k: v for k, v in vars(args).items() if k not in _OPTIONS},
+            "git": _git_version(),
+            "python": sys.version.split()[0],
+            "results": run(root, workload, args.runs),
+        }
+        state_store.close()
+
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if args.compare is not None:
+        return _compare(results, args.compare, args.tolerance)
+    return 0
+
+
+### Workload
+
+
+def generate(
+    root: Path,
+    addons: int,
+    git_fraction: float,
+    outdated_fraction: float,
+    commits: int,
+    branches: int,
+    seed: int,
+) -> Dict[str, List[str]]:
+    """
+    Creates `root/wow` and the bare remotes of its git addons in `root/remotes`.
+    Returns the names of the git addons, and of the outdated ones.
+    """
+    rng = random.Random(seed)
+    wow_dir = root / "wow"
+    addons_dir = wow_dir / "Interface" / "AddOns"
+    addons_dir.mkdir(parents=True)
+    (wow_dir / "WoW.exe").touch()
+    git_addons, outdated = [], []
+    for i in range(addons):
+        name = f"Addon{i:04d}"
+        if rng.random() >= git_fraction:
+            (addons_dir / name).mkdir()
+            (addons_dir / name / f"{name}.toc").write_text(_toc(name, "1.0"))
+            continue
+        remote = root / "remotes" / f"{name}.git"
+        _make_remote(remote, name, commits, branches)
+        _git("clone", "-q", str(remote), str(addons_dir / name))
+        git_addons.append(name)
+        if rng.random() < outdated_fraction:
+            _fast_import(remote, name, "main", 1, commits)
+            outdated.append(name)
+    return {"git_addons": git_addons, "outdated": outdated}
+
+
+def _make_remote(remote: Path, name: str, commits: int, branches: int) -> None:
+    _git("init", "-q", "--bare", "--initial-branch=main", str(remote))
+    _fast_import(remote, name, "main", commits, 0)
+    for b in range(1, branches):
+        _git("--git-dir", str(remote), "branch", f"branch-{b}", "main")
+        _fast_import(remote, name, f"branch-{b}", 3, commits)
+
+
+def _fast_import(
+    remote: Path, name: str, branch: str, commits: int, start: int
+) -> None:
+    """Appends `commits` TOC changes to `branch` of `remote` with git fast-import"""
+    stream = []
+    has_parent = start > 0 or branch != "main"
+    for n in range(start, start + commits):
+        toc = _toc(name, f"1.{n}").encode()
+        message = f"Release 1.{n}".encode()
+        date = 1_600_000_000 + n * 3600
+        stream.append(f"commit refs/heads/{branch}\n".encode())
+        stream.append(f"committer Bench <bench@pykek> {date} +0000\n".encode())
+        stream.append(f"data {len(message)}\n".encode() + message + b"\n")
+        if has_parent and n == start:
+            stream.append(f"from refs/heads/{branch}^0\n".encode())
+        stream.append(f"M 100644 inline {name}.toc\n".encode())
+        stream.append(f"data {len(toc)}\n".encode() + toc + b"\n")
+    subprocess.run(
+        ["git", "--git-dir", str(remote), "fast-import", "--quiet"],
+        input=b"".join(stream),
+        check=True,
+    )
+
+
+def _toc(name: str, version: str) -> str:
+    return f"## Interface: 110000\n## Title: {name}\n## Version: {version}\n"
+
+
+### Measurements
+
+
+def run(root: Path, workload: Dict[str, List[str]], runs: int) -> Dict[str, object]:
+    instance = GameInstance.from_dir_path(str(root / "wow"))
+    results: Dict[str, object] = {}
+    results["load_addons"] = _measure(instance.load_addons, runs)
+    addons = {addon.name: addon for addon in instance.addons}
+    git_addons = [addons[name] for name in workload["git_addons"]]
+    outdated = [addons[name] for name in workload["outdated"]]
+
+    results["reload_branches"] = _measure_each(git_addons, Addon.reload_branches)
+    fetch_coordinator.begin_refresh()
+    results["update_status"] = _measure_each(git_addons, Addon.update_status)
+    statuses = [addon.current_status for addon in outdated]
+    assert all(status == AddonStatus.OUTDATED for status in statuses)
+    results["update"] = _measure_each(outdated, Addon.update)
+
+    switchable = [addon for addon in git_addons if len(addon.branches) > 1]
+    results["switch_to_branch"] = _measure_each(
+        switchable, lambda addon: addon.switch_to_branch(addon.branches[-1])
+    )
+
+    clones_dir = root / "clones"
+    results["clone"] = _measure_each(
+        git_addons,
+        lambda addon: remote_policy.clone(
+            str(root / "remotes" / f"{addon.name}.git"), str(clones_dir / addon.name)
+        ),
+    )
+    return results
+
+
+def _measure(fn: Callable[[], object], runs: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return _percentiles(samples)
+
+
+def _measure_each(
+    addons: List[Addon], fn: Callable[[Addon], object]
+) -> Dict[str, float]:
+    samples = []
+    for addon in addons:
+        start = time.perf_counter()
+        fn(addon)
+        samples.append((time.perf_counter() - start) * 1000)
+    return _percentiles(samples)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if len(samples) == 0:
+        return {"count": 0}
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 2),
+        "p50_ms": round(cuts[49], 2),
+        "p90_ms": round(cuts[89], 2),
+        "p99_ms": round(cuts[98], 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+### Helpers
+
+
+def _compare(results: Dict[str, object], previous_path: Path, tolerance: float) -> int:
+    with open(previous_path, "r") as f:
+        previous = json.load(f)
+    if previous.get("workload") != results["workload"]:
+        print("warning: comparing results of different workloads", file=sys.stderr)
+    exit_code = 0
+    current = results["results"]
+    assert isinstance(current, Dict)
+    for name, stats in current.items():
+        before = previous.get("results", {}).get(name, {}).get("p50_ms")
+        if not before or "p50_ms" not in stats:
+            continue
+        ratio = stats["p50_ms"] / before
+        status = "ok"
+        if ratio > tolerance:
+            status = "REGRESSION"
+            exit_code = 1
+        after = stats["p50_ms"]
+        print(f"{name}: p50 {before:.2f} -> {after:.2f} ms (x{ratio:.2f}) {status}")
+    return exit_code
+
+
+def _git(*args: str) -> None:
+    subprocess.run(["git", *args], check=True)
+
+
+def _git_version() -> str:
+    result = subprocess.run(["git", "--version"], capture_output=True, text=True)
+    return result.stdout.strip().removeprefix("git version ")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("GIT_TERMINAL_PROMPT", "0")
+    sys.exit(main())
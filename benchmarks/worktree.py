@@ -0,0 +1,108 @@
+"""
+Dirty worktree detection benchmark.
+
+Creates a git addon with N tracked files (10,000 by default, like texture-heavy
+addons) and measures how long it takes to tell whether its worktree is clean:
+with a plain `Repo.is_dirty()`, with git's split index enabled, and through
+`WorktreeAccelerator` (clean, and with the last tracked file modified). Everything runs offline.
+
+    python benchmarks/worktree.py --files 10000 --output results.json
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+ROOT_PATH = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_PATH))
+
+from git import Repo  # noqa: E402
+from pykek.backend.worktree import WorktreeAccelerator  # noqa: E402
+from workload import _git_version, _percentiles  # noqa: E402
+
+_IDENTITY = {
+    "GIT_AUTHOR_NAME": "Bench",
+    "GIT_AUTHOR_EMAIL": "bench@pykek",
+    "GIT_COMMITTER_NAME": "Bench",
+    "GIT_COMMITTER_EMAIL": "bench@pykek",
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10_000, help="tracked files")
+    parser.add_argument("--runs", type=int, default=20, help="runs of each check")
+    parser.add_argument("--output", type=Path, help="also write the results there")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pykek-bench-") as tmp_dir:
+        repo_path = Path(tmp_dir) / "TextureHeavyAddon"
+        generate(repo_path, args.files)
+        results = {
+            "workload": {"files": args.files, "runs": args.runs},
+            "git": _git_version(),
+            "python": sys.version.split()[0],
+            "results": run(repo_path, args.runs),
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return 0
+
+
+def generate(repo_path: Path, files: int) -> None:
+    """Creates a repository with `files` tracked files, 100 per folder"""
+    for i in range(files):
+        path = repo_path / "Textures" / f"Set{i // 100:03d}" / f"Texture{i:05d}.blp"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(64))
+    (repo_path / "TextureHeavyAddon.toc").write_text("## Title: TextureHeavyAddon\n")
+    env = {**os.environ, **_IDENTITY}
+    for command in [["init", "-q"], ["add", "-A"], ["commit", "-q", "-m", "Init"]]:
+        subprocess.run(["git", *command], cwd=repo_path, env=env, check=True)
+    # As if the addon was installed a while ago, out of the racy window
+    past = time.time() - 3600
+    for root, _, names in os.walk(repo_path):
+        if ".git" not in Path(root).parts:
+            for name in names:
+                os.utime(os.path.join(root, name), (past, past))
+
+
+def run(repo_path: Path, runs: int) -> Dict[str, object]:
+    repo = Repo(repo_path)
+    results: Dict[str, object] = {}
+    results["git_is_dirty"] = _measure(lambda: repo.is_dirty(), runs)
+
+    accelerator = WorktreeAccelerator()
+    accelerator.accelerate(repo)
+    results["git_is_dirty_accelerated"] = _measure(lambda: repo.is_dirty(), runs)
+
+    results["accelerator_clean"] = _measure(lambda: accelerator.is_dirty(repo), runs)
+
+    # The last file in index order, a scan stopping at the first change sees all
+    modified = repo_path / repo.git.ls_files().splitlines()[-1]
+    modified.write_bytes(os.urandom(64))
+    results["accelerator_dirty"] = _measure(lambda: accelerator.is_dirty(repo), runs)
+    return results
+
+
+def _measure(fn: Callable[[], object], runs: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return _percentiles(samples)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+import sys
+from pykek.cli import main
+
+sys.exit(main())
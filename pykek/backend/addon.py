@@ -3,8 +3,24 @@ from enum import Enum
 import os
 from pathlib import Path
 import re
-from typing import Optional, Protocol
-from git import List, Repo
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Protocol
+import weakref
+from pykek.backend.fetch_coordinator import fetch_coordinator
+from pykek.backend.history import HistoryEntry, history
+from pykek.backend.metrics import metrics
+from pykek.backend.mirror import mirror_store
+from pykek.backend.remote import RemoteUnreachableError, remote_owner, remote_policy
+from pykek.backend.state_store import AddonState, state_store
+from pykek.backend.timings import timings
+from pykek.backend.transfer import TransferListener, TransferProgress
+from pykek.backend.worktree import worktree_accelerator
+from pykek.log import logger
+from pykek.tracing import span
+
+if TYPE_CHECKING:
+    from git import Repo
+    from pykek.backend.catalog import CatalogEntry
 
 
 class AddonStatus(Enum):
@@ -12,6 +28,7 @@ class AddonStatus(Enum):
     OUTDATED = 2
     NON_GIT = 3
     LOADING = 4
+    UNREACHABLE = 5
 
     @staticmethod
     def icon_name(self) -> str:
@@ -21,6 +38,8 @@ class AddonStatus(Enum):
             return "folder-download-symbolic"
         if self == AddonStatus.NON_GIT:
             return "dialog-warning-symbolic"
+        if self == AddonStatus.UNREACHABLE:
+            return "network-error-symbolic"
         return "process-working-symbolic"
 
 
@@ -50,6 +69,12 @@ class AddonStatusRepresentation:
                 css_class="warning",
                 label="This addon is not versioned, meaning you won't be able to see if there is an update available.",
             )
+        if status == AddonStatus.UNREACHABLE:
+            return cls(
+                icon_name="network-error-symbolic",
+                css_class="error",
+                label="This addon's git repository couldn't be reached, click to try again.",
+            )
         if status == AddonStatus.LOADING:
             return cls(
                 icon_name="process-working-symbolic",
@@ -59,6 +84,13 @@ class AddonStatusRepresentation:
         raise Exception(f"Unexpected AddonStatus {status}")
 
 
+@dataclass
+class GitInfo:
+    url: str
+    branch: str
+    sha: str
+
+
 class AddonListener(Protocol):
     def addon_status_did_change(self, new_status: AddonStatus) -> None:
         pass
@@ -66,8 +98,14 @@ class AddonListener(Protocol):
     def addon_version_did_change(self, new_version: Optional[str]) -> None:
         pass
 
+    def addon_title_did_change(self, new_title: Optional[str]) -> None:
+        pass
 
-@dataclass
+    def addon_transfer_did_progress(self, progress: TransferProgress) -> None:
+        pass
+
+
+@dataclass(slots=True)
 class Addon:
     dir_path: str
     name: str
@@ -76,6 +114,11 @@ class Addon:
     current_status: AddonStatus
     branches: List[str]
     current_branch: str
+    dependencies: List[str] = field(default_factory=list)
+    optional_dependencies: List[str] = field(default_factory=list)
+    title: Optional[str] = None
+    # Known repository of a non-git addon, matched in the catalog by name or title
+    catalog_entry: Optional["CatalogEntry"] = None
 
     _listeners: List[AddonListener] = field(
         init=False, repr=False, default_factory=list
@@ -83,25 +126,49 @@ class Addon:
 
     @classmethod
     def from_dir_path(cls, dir_path: Path):
-        name = dir_path.name
-        is_git = _is_git_dir(dir_path)
-        toc_info = _parse_toc(dir_path, name)
-        version = None
-        if isinstance(toc_info, _TOCInfo):
-            version = toc_info.version
-        return cls(
-            dir_path=str(dir_path),
-            name=name,
-            is_git=is_git,
-            version=version,
-            current_status=AddonStatus.UP_TO_DATE if is_git else AddonStatus.NON_GIT,
-            branches=[],
-            current_branch="",
-        )
+        with span("from_dir_path", addon=dir_path.name):
+            name = dir_path.name
+            is_git = _is_git_dir(dir_path)
+            toc_info = _parse_toc(dir_path, name)
+            version = None
+            title = None
+            dependencies: List[str] = []
+            optional_dependencies: List[str] = []
+            if isinstance(toc_info, _TOCInfo):
+                version = toc_info.version
+                title = toc_info.title
+                dependencies = toc_info.dependencies
+                optional_dependencies = toc_info.optional_dependencies
+            return cls(
+                dir_path=str(dir_path),
+                name=name,
+                is_git=is_git,
+                version=version,
+                current_status=AddonStatus.UP_TO_DATE
+                if is_git
+                else AddonStatus.NON_GIT,
+                branches=[],
+                current_branch="",
+                dependencies=dependencies,
+                optional_dependencies=optional_dependencies,
+                title=title,
+            )
 
     @classmethod
-    def clone(cls, git_url: str, target_dir: str):
-        Repo.clone_from(git_url, target_dir)
+    def clone(
+        cls,
+        git_url: str,
+        target_dir: str,
+        listener: Optional[TransferListener] = None,
+    ):
+        started_at = time.monotonic()
+        with span("clone", url=git_url):
+            if mirror_store.enabled:
+                mirror_store.clone(git_url, target_dir, listener)
+            else:
+                remote_policy.clone(git_url, target_dir, listener=listener)
+        worktree_accelerator.accelerate(_open_repo(target_dir))
+        timings.record(target_dir, "clone", time.monotonic() - started_at)
 
     def add_listener(self, listener: AddonListener) -> None:
         if self._listeners.count(listener) > 0:
@@ -111,13 +178,68 @@ class Addon:
     def remove_listener(self, listener: AddonListener) -> None:
         self._listeners.remove(listener)
 
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "addon": self.name,
+            "branch": self.current_branch or None,
+            "version": self.version,
+            "status": self.current_status.name.lower(),
+        }
+
+    def save_state(self, checked: bool = False) -> None:
+        """Queues the current state of the addon for the state store"""
+        state = AddonState(
+            dir_path=self.dir_path,
+            instance=os.path.normpath(Path(self.dir_path).parent.parent.parent),
+            name=self.name,
+            url=None,
+            branch=self.current_branch or None,
+            head_sha=None,
+            upstream_sha=None,
+            status=self.current_status.name.lower(),
+            version=self.version,
+            checked_at=time.time() if checked else None,
+        )
+        if self.is_git:
+            try:
+                info = self.git_info()
+                state.url, state.branch, state.head_sha = (
+                    info.url,
+                    info.branch,
+                    info.sha,
+                )
+                state.upstream_sha = self.upstream_sha()
+            except Exception as e:
+                logger.warning(f"Couldn't read {self.name} git state: {e}")
+        state_store.save_addon(state)
+
+    def transfer_did_progress(self, progress: TransferProgress) -> None:
+        for listener in self._listeners:
+            listener.addon_transfer_did_progress(progress)
+
+    def set_status(self, status: AddonStatus) -> None:
+        if self.current_status == status:
+            return
+        self.current_status = status
+        for listener in self._listeners:
+            listener.addon_status_did_change(self.current_status)
+
     def update_status(self) -> None:
         if self.is_git:
             if self.current_status != AddonStatus.LOADING:
                 self.current_status = AddonStatus.LOADING
                 for listener in self._listeners:
                     listener.addon_status_did_change(self.current_status)
-            has_update = self.check_for_update()
+            try:
+                has_update = self.check_for_update()
+            except RemoteUnreachableError as e:
+                logger.warning(f"Couldn't check {self.name} for updates: {e}")
+                self.set_status(AddonStatus.UNREACHABLE)
+                return
+            except Exception as e:
+                logger.error(f"Update check failed for {self.name}: {e}")
+                self.set_status(AddonStatus.UNREACHABLE)
+                return
             new_status = AddonStatus.OUTDATED if has_update else AddonStatus.UP_TO_DATE
             if self.current_status != new_status:
                 self.current_status = new_status
@@ -130,30 +252,121 @@ class Addon:
                     listener.addon_status_did_change(self.current_status)
 
     def check_for_update(self) -> bool:
-        if not self.is_git:
-            return False
-        repo = Repo(self.dir_path)
-        remote = repo.remote()
-        remote.fetch()
-        commits = list(repo.iter_commits(f"HEAD..origin/{self.current_branch}"))
-        return len(commits) > 0
+        with span("check_for_update", addon=self.name):
+            if not self.is_git:
+                return False
+            if self.current_branch == "":
+                self.reload_branches()
+            repo = _open_repo(self.dir_path)
+            fetch_coordinator.fetch(repo, self.current_branch, listener=self)
+            with span("rev_list", addon=self.name):
+                commits = list(repo.iter_commits(f"HEAD..origin/{self.current_branch}"))
+            return len(commits) > 0
+
+    def prefetch(self) -> None:
+        """
+        Fetches every remote branch in the background. Unlike `update_status`,
+        the addon doesn't go through LOADING: its status only changes when its
+        branch fell behind.
+        """
+        with span("prefetch", addon=self.name):
+            if not self.is_git:
+                return
+            if self.current_branch == "":
+                self.reload_branches()
+            repo = _open_repo(self.dir_path)
+            fetch_coordinator.fetch(repo, self.current_branch)
+            self.reload_branches()
+            has_update = self.commits_behind() > 0
+            self.set_status(
+                AddonStatus.OUTDATED if has_update else AddonStatus.UP_TO_DATE
+            )
+            self.save_state(checked=True)
+
+    def git_info(self) -> GitInfo:
+        repo = _open_repo(self.dir_path)
+        return GitInfo(
+            url=repo.remote().url,
+            branch=repo.active_branch.name,
+            sha=repo.head.commit.hexsha,
+        )
 
     def update(self) -> None:
+        with span("update", addon=self.name):
+            if not self.is_git:
+                return
+            self.current_status = AddonStatus.LOADING
+            for listener in self._listeners:
+                listener.addon_status_did_change(self.current_status)
+            repo = _open_repo(self.dir_path)
+            self._record_history(repo, "update")
+            repo.git.reset("--hard", f"origin/{self.current_branch}")
+            self.current_status = AddonStatus.UP_TO_DATE
+            for listener in self._listeners:
+                listener.addon_status_did_change(self.current_status)
+
+    def reset_to(self, sha: str) -> None:
+        """Moves the checked out branch back to `sha`, e.g. to undo an update"""
         if not self.is_git:
             return
-        self.current_status = AddonStatus.LOADING
-        for listener in self._listeners:
-            listener.addon_status_did_change(self.current_status)
-        repo = Repo(self.dir_path)
-        repo.git.reset("--hard", f"origin/{self.current_branch}")
-        self.current_status = AddonStatus.UP_TO_DATE
-        for listener in self._listeners:
-            listener.addon_status_did_change(self.current_status)
+        repo = _open_repo(self.dir_path)
+        repo.git.reset("--hard", sha)
+
+    def rollback(self, entry: Optional[HistoryEntry] = None) -> Optional[HistoryEntry]:
+        """
+        Moves the addon back to where `entry` (default: its latest history entry)
+        recorded it, without any network access. The rollback is itself recorded,
+        so rolling back twice returns to where the addon was.
+        """
+        if not self.is_git:
+            return None
+        entry = entry or history.last(self.dir_path)
+        if entry is None:
+            return None
+        self.set_status(AddonStatus.LOADING)
+        repo = _open_repo(self.dir_path)
+        self._record_history(repo, "rollback")
+        if repo.head.is_detached or repo.active_branch.name != entry.branch:
+            repo.git.checkout("--force", entry.branch)
+        repo.git.reset("--hard", entry.sha)
+        self.reload_branches()
+        has_update = self.commits_behind() > 0
+        self.set_status(AddonStatus.OUTDATED if has_update else AddonStatus.UP_TO_DATE)
+        return entry
+
+    def commits_behind(self) -> int:
+        """Returns how many upstream commits an update would apply, without fetching"""
+        if not self.is_git or self.current_branch == "":
+            return 0
+        repo = _open_repo(self.dir_path)
+        count = repo.git.rev_list("--count", f"HEAD..origin/{self.current_branch}")
+        return int(count)
+
+    def upstream_sha(self) -> Optional[str]:
+        """Returns the SHA of the remote-tracking branch, without fetching"""
+        if not self.is_git or self.current_branch == "":
+            return None
+        repo = _open_repo(self.dir_path)
+        return repo.commit(f"origin/{self.current_branch}").hexsha
+
+    def remote_owner(self) -> Optional[str]:
+        """Returns the owner of the remote, e.g. the author on GitHub"""
+        if not self.is_git:
+            return None
+        return remote_owner(_open_repo(self.dir_path).remote().url)
+
+    def upstream_commit_dates(self, limit: int = 10) -> List[int]:
+        """Returns the timestamps of the latest commits of the remote-tracking branch"""
+        if not self.is_git or self.current_branch == "":
+            return []
+        repo = _open_repo(self.dir_path)
+        commits = repo.iter_commits(f"origin/{self.current_branch}", max_count=limit)
+        return [commit.committed_date for commit in commits]
 
     def reload_branches(self) -> None:
         if not self.is_git:
             return
-        repo = Repo(self.dir_path)
+        repo = _open_repo(self.dir_path)
         remote = repo.remote()
         branches = []
         for ref in remote.refs:
@@ -163,30 +376,60 @@ class Addon:
         self.branches = branches
         self.current_branch = repo.active_branch.name
 
-    def switch_to_branch(self, branch: str) -> None:
-        if not self.is_git:
-            return
-        self.current_status = AddonStatus.LOADING
-        for listener in self._listeners:
-            listener.addon_status_did_change(self.current_status)
-        repo = Repo(self.dir_path)
-        if repo.is_dirty():
-            repo.git.reset("--hard")
-        repo.git.checkout("--force", f"{branch}")
-        self.current_status = AddonStatus.UP_TO_DATE
-        for listener in self._listeners:
-            listener.addon_status_did_change(self.current_status)
+    def switch_to_branch(self, branch: str, fast_forward: bool = False) -> None:
+        """
+        Checks `branch` out. With `fast_forward`, the branch is also fast-forwarded
+        to its remote-tracking ref, e.g. when branches are prefetched. A branch that
+        diverged from it is left as is, and shown as outdated.
+        """
+        with span("switch_to_branch", addon=self.name, branch=branch):
+            if not self.is_git:
+                return
+            self.current_status = AddonStatus.LOADING
+            for listener in self._listeners:
+                listener.addon_status_did_change(self.current_status)
+            repo = _open_repo(self.dir_path)
+            self._record_history(repo, "switch")
+            if worktree_accelerator.is_dirty(repo):
+                repo.git.reset("--hard")
+            repo.git.checkout("--force", f"{branch}")
+            new_status = AddonStatus.UP_TO_DATE
+            remote_refs = {ref.name for ref in repo.remote().refs}
+            if fast_forward and f"origin/{branch}" in remote_refs:
+                upstream = f"origin/{branch}"
+                if repo.is_ancestor("HEAD", upstream):
+                    repo.git.merge("--ff-only", upstream)
+                elif not repo.is_ancestor(upstream, "HEAD"):
+                    logger.info(f"{self.name} {branch} diverged from {upstream}")
+                    new_status = AddonStatus.OUTDATED
+            self.current_status = new_status
+            for listener in self._listeners:
+                listener.addon_status_did_change(self.current_status)
 
     def refresh_toc_info(self) -> None:
         toc_info = _parse_toc(Path(self.dir_path), self.name)
-        version = None
-        if isinstance(toc_info, _TOCInfo):
-            version = toc_info.version
+        if not isinstance(toc_info, _TOCInfo):
+            # Unreadable TOC, nothing it used to declare holds anymore
+            toc_info = _TOCInfo(version=None)
+        version = toc_info.version
+        self.dependencies = toc_info.dependencies
+        self.optional_dependencies = toc_info.optional_dependencies
+        if self.title != toc_info.title:
+            self.title = toc_info.title
+            for listener in self._listeners:
+                listener.addon_title_did_change(toc_info.title)
         if self.version != version:
             self.version = version
             for listener in self._listeners:
                 listener.addon_version_did_change(version)
 
+    def _record_history(self, repo: "Repo", action: str) -> None:
+        if not repo.head.is_valid() or repo.head.is_detached:
+            return
+        history.record(
+            self.dir_path, action, repo.active_branch.name, repo.head.commit.hexsha
+        )
+
     def _backup_path(self) -> Path:
         return Path(self.dir_path + ".tmpbkp")
 
@@ -207,6 +450,19 @@ class Addon:
         self._backup_path().rmdir()
 
 
+def _open_repo(dir_path: str) -> "Repo":
+    # GitPython is slow to import, so it is only loaded on first use
+    from git import Repo
+
+    repo = Repo(dir_path)
+    _open_repos.add(repo)
+    return repo
+
+
+_open_repos: "weakref.WeakSet[Repo]" = weakref.WeakSet()
+metrics.gauge("pykek_open_repos", "Repository handles alive", lambda: len(_open_repos))
+
+
 def _is_git_dir(addon_dir_path: Path) -> bool:
     git_dir_path = Path(os.path.join(addon_dir_path, ".git"))
     return os.path.exists(git_dir_path)
@@ -215,23 +471,49 @@ def _is_git_dir(addon_dir_path: Path) -> bool:
 @dataclass
 class _TOCInfo:
     version: Optional[str]
+    title: Optional[str] = None
+    dependencies: List[str] = field(default_factory=list)
+    optional_dependencies: List[str] = field(default_factory=list)
 
     @classmethod
     def from_toc_path(cls, path: Path):
         with open(path, "r") as f:
             content = f.read()
             version = _extract_value("Version", content)
-            return cls(version)
+            return cls(
+                version,
+                title=_extract_value("Title", content),
+                dependencies=_extract_names(_REQUIRED_DEPS_PATTERN, content),
+                optional_dependencies=_extract_names(_OPTIONAL_DEPS_PATTERN, content),
+            )
         raise Exception(f"Couldn't read TOC file at {path}")
 
 
 def _parse_toc(addon_dir_path: Path, addon_name: str) -> Optional[_TOCInfo]:
-    toc_path = Path(os.path.join(addon_dir_path, f"{addon_name}.toc"))
-    try:
-        toc = _TOCInfo.from_toc_path(toc_path)
-        return toc
-    except Exception as _:
-        return None
+    with span("parse_toc", addon=addon_name):
+        toc_path = Path(os.path.join(addon_dir_path, f"{addon_name}.toc"))
+        try:
+            toc = _TOCInfo.from_toc_path(toc_path)
+            return toc
+        except Exception as _:
+            return None
+
+
+# `## Dependencies`, `## RequiredDeps` and any `## Dep...` are required by the game
+_REQUIRED_DEPS_PATTERN = re.compile(
+    r"^##\s*(?:RequiredDeps|Dep\w*)\s*:(.*)$", re.MULTILINE
+)
+_OPTIONAL_DEPS_PATTERN = re.compile(r"^##\s*OptionalDeps\s*:(.*)$", re.MULTILINE)
+
+
+def _extract_names(pattern: "re.Pattern[str]", text: str) -> List[str]:
+    names: List[str] = []
+    for match in pattern.finditer(text):
+        for name in match.group(1).split(","):
+            name = name.strip()
+            if name != "" and name not in names:
+                names.append(name)
+    return names
 
 
 def _extract_value(key: str, text: str) -> Optional[str]:
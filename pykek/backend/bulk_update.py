@@ -0,0 +1,200 @@
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Dict, List, Optional, Protocol
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.dependencies import DependencyGraph
+from pykek.backend.history import history
+from pykek.backend.operations import update_addon
+from pykek.backend.timings import timings
+from pykek.log import logger
+
+DEFAULT_MAX_PARALLEL = 4
+
+
+@dataclass
+class BulkUpdateProgress:
+    total: int
+    done: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    # Expected seconds of work left, from the recorded durations of the addons
+    expected_work: Optional[float] = None
+    parallelism: int = 1
+
+    def finished(self) -> int:
+        return self.done + self.failed
+
+    def throughput(self) -> float:
+        """Returns the number of addons finished per second"""
+        elapsed = time.monotonic() - self.started_at
+        return self.finished() / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        """
+        Returns the estimated number of seconds left, from the recorded durations
+        when they're known, otherwise from the throughput once something finished
+        """
+        if self.expected_work is not None:
+            return self.expected_work / self.parallelism
+        throughput = self.throughput()
+        if throughput == 0:
+            return None
+        return (self.total - self.finished()) / throughput
+
+
+class BulkUpdateListener(Protocol):
+    def bulk_update_did_progress(self, progress: BulkUpdateProgress) -> None:
+        pass
+
+
+@dataclass
+class BulkUpdateResult:
+    updated: List[Addon]
+    failed: Dict[str, str]
+    rolled_back: bool = False
+
+
+class BulkUpdate:
+    """
+    BulkUpdate updates many addons through a bounded parallel pipeline.
+
+    With a dependency graph, addons are updated in waves so that libraries are up
+    to date before their dependents, each wave being waited for before the next one
+    starts. Within a wave, the slowest updates start first (longest processing time
+    first, from the recorded durations, then the number of commits behind). TOC
+    info is refreshed once everything is done, and progress is reported to the
+    listener at most every `progress_interval` seconds. In all-or-nothing mode, the first failure
+    stops the pipeline and every addon already updated is reset to its previous
+    commit.
+    """
+
+    def __init__(
+        self,
+        addons: List[Addon],
+        max_parallel: int = DEFAULT_MAX_PARALLEL,
+        all_or_nothing: bool = False,
+        listener: Optional[BulkUpdateListener] = None,
+        progress_interval: float = 0.25,
+        graph: Optional[DependencyGraph] = None,
+    ) -> None:
+        self._addons = addons
+        self._graph = graph
+        self._max_parallel = max_parallel
+        self._all_or_nothing = all_or_nothing
+        self._listener = listener
+        self._progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._progress = BulkUpdateProgress(
+            total=len(addons), parallelism=min(max_parallel, max(len(addons), 1))
+        )
+        self._expected: Dict[str, float] = {}
+        self._last_notification = 0.0
+        self._updated: List[Addon] = []
+        self._failed: Dict[str, str] = {}
+
+    def run(self) -> BulkUpdateResult:
+        history.begin_session()
+        self._expected = timings.estimates(
+            [addon.dir_path for addon in self._addons], "update"
+        )
+        if len(self._expected) > 0:
+            self._progress.expected_work = sum(self._expected.values())
+        waves = [self._addons]
+        if self._graph is not None:
+            waves = self._graph.waves(self._addons)
+        previous_shas = {}
+        if self._all_or_nothing:
+            previous_shas = {
+                addon.dir_path: addon.git_info().sha for addon in self._addons
+            }
+        slots = threading.Semaphore(self._max_parallel)
+        for wave in waves:
+            if self._all_or_nothing and len(self._failed) > 0:
+                break
+            self._run_wave(wave, slots)
+
+        rolled_back = self._all_or_nothing and len(self._failed) > 0
+        if rolled_back:
+            self._roll_back(previous_shas)
+        for addon in self._updated:
+            addon.refresh_toc_info()
+        self._notify(force=True)
+        updated = [] if rolled_back else list(self._updated)
+        return BulkUpdateResult(updated, dict(self._failed), rolled_back)
+
+    def _run_wave(self, wave: List[Addon], slots: threading.Semaphore) -> None:
+        addons = sorted(
+            wave,
+            key=lambda addon: (
+                self._expected.get(addon.dir_path, 0.0),
+                _commits(addon),
+            ),
+            reverse=True,
+        )
+        for addon in addons:
+            slots.acquire()
+            if self._all_or_nothing and len(self._failed) > 0:
+                slots.release()
+                break
+            future = update_addon(addon, refresh_toc=False).future
+            future.add_done_callback(
+                lambda f, addon=addon: self._on_update_done(addon, f, slots)
+            )
+        # Callbacks release their slot last, so once every slot is back all the
+        # results are recorded (wait() could return before the callbacks ran)
+        for _ in range(self._max_parallel):
+            slots.acquire()
+        for _ in range(self._max_parallel):
+            slots.release()
+
+    def _on_update_done(
+        self, addon: Addon, future: Future, slots: threading.Semaphore
+    ) -> None:
+        try:
+            error = "cancelled" if future.cancelled() else future.exception()
+            if error is not None:
+                addon.set_status(AddonStatus.OUTDATED)
+            with self._lock:
+                if self._progress.expected_work is not None:
+                    self._progress.expected_work = max(
+                        self._progress.expected_work - self._expected[addon.dir_path],
+                        0.0,
+                    )
+                if error is None:
+                    self._updated.append(addon)
+                    self._progress.done += 1
+                else:
+                    logger.error(f"Couldn't update {addon.name}: {error}")
+                    self._failed[addon.name] = str(error)
+                    self._progress.failed += 1
+            self._notify()
+        finally:
+            slots.release()
+
+    def _roll_back(self, previous_shas: Dict[str, str]) -> None:
+        for addon in self._updated:
+            try:
+                addon.reset_to(previous_shas[addon.dir_path])
+                addon.set_status(AddonStatus.OUTDATED)
+            except Exception as e:
+                logger.error(f"Couldn't roll {addon.name} back: {e}")
+        logger.warning(f"Rolled back {len(self._updated)} addon(s)")
+
+    def _notify(self, force: bool = False) -> None:
+        if self._listener is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_notification < self._progress_interval:
+                return
+            self._last_notification = now
+        self._listener.bulk_update_did_progress(self._progress)
+
+
+def _commits(addon: Addon) -> int:
+    try:
+        return addon.commits_behind()
+    except Exception:
+        return 0
@@ -0,0 +1,249 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+import heapq
+import json
+from pathlib import Path
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pykek.backend.remote import normalize_remote_url
+from pykek.log import logger
+
+# Prefix matches looked at for short queries, in alphabetical order of their key
+_PREFIX_SCAN = 200
+# Share of the query trigrams a key must contain to be suggested
+_MIN_CONTAINMENT = 0.4
+# Postings counted for a query, and candidates then scored on all its trigrams
+_CANDIDATE_POSTINGS = 2000
+_CANDIDATES = 64
+
+_COLOR_CODES = re.compile(r"\|c[0-9a-fA-F]{8}|\|r")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    name: str
+    url: str
+    title: Optional[str] = None
+    author: Optional[str] = None
+    description: Optional[str] = None
+
+
+def normalize(text: str) -> str:
+    """
+    Returns the search key of a name: lowercase, without TOC color codes,
+    punctuation and spaces, so that "|cff00ff00Deadly Boss Mods|r" and
+    "deadly-boss-mods" match
+    """
+    return _SEPARATORS.sub("", _COLOR_CODES.sub("", text).casefold())
+
+
+def _trigrams(key: str) -> Set[str]:
+    # Padded at the start, so that keys sharing their first letters rank higher
+    padded = f"  {key}"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class Catalog:
+    """
+    Catalog is a local list of known addon repositories, loaded from the JSON or
+    YAML file at `path` on first use, and indexed for suggestions as you type.
+
+    Every entry is indexed under the keys of its name, TOC title and repository
+    name. Keys are kept sorted for prefix lookups, and each trigram of a key points
+    to the keys containing it: a search only scores the keys sharing trigrams with
+    the query, the rarest first, instead of scanning every entry.
+    """
+
+    def __init__(self) -> None:
+        self.path: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._loaded_path: Optional[Path] = None
+        self._index = _Index([])
+
+    def is_configured(self) -> bool:
+        return self.path is not None
+
+    def set_entries(self, entries: List[CatalogEntry]) -> None:
+        index = _Index(entries)
+        with self._lock:
+            self._index = index
+            self._loaded_path = self.path
+
+    def clear(self) -> None:
+        with self._lock:
+            self.path = None
+            self._loaded_path = None
+            self._index = _Index([])
+
+    def entries(self) -> List[CatalogEntry]:
+        return list(self._loaded().entries)
+
+    ### Queries
+
+    def search(self, query: str, limit: int = 8) -> List[CatalogEntry]:
+        """Returns the entries best matching `query`, a name or a repository URL"""
+        if "/" in query:
+            query = normalize_remote_url(query).rsplit("/", 1)[-1]
+        return self._loaded().search(normalize(query), limit)
+
+    def match(self, name: str, title: Optional[str] = None) -> Optional[CatalogEntry]:
+        """Returns the entry named like the folder `name` or the TOC `title`, if any"""
+        index = self._loaded()
+        for text in [name, title]:
+            if text is None:
+                continue
+            entry = index.exact.get(normalize(text))
+            if entry is not None:
+                return index.entries[entry]
+        return None
+
+    ### Loading
+
+    def _loaded(self) -> "_Index":
+        with self._lock:
+            if self.path is None or self.path == self._loaded_path:
+                return self._index
+            path = self.path
+            self._loaded_path = path
+            try:
+                self._index = _Index(_read_entries(path))
+                logger.info(f"Loaded {len(self._index.entries)} catalog entries")
+            except Exception as e:
+                logger.error(f"Couldn't load the catalog at {path}: {e}")
+                self._index = _Index([])
+            return self._index
+
+
+class _Index:
+    def __init__(self, entries: List[CatalogEntry]) -> None:
+        self.entries = entries
+        # Key id -> key, and the entry it belongs to
+        self.keys: List[str] = []
+        self.key_entries: List[int] = []
+        self.exact: Dict[str, int] = {}
+        self.trigrams: Dict[str, List[int]] = {}
+        for entry_index, entry in enumerate(entries):
+            for key in _entry_keys(entry):
+                key_id = len(self.keys)
+                self.keys.append(key)
+                self.key_entries.append(entry_index)
+                self.exact.setdefault(key, entry_index)
+                for trigram in _trigrams(key):
+                    self.trigrams.setdefault(trigram, []).append(key_id)
+        self.sorted_keys = sorted(zip(self.keys, range(len(self.keys))))
+
+    def search(self, key: str, limit: int) -> List[CatalogEntry]:
+        if key == "" or limit <= 0:
+            return []
+        scores: Dict[int, float] = {}
+        self._score_prefixes(key, scores)
+        if len(key) >= 3:
+            self._score_trigrams(key, scores)
+        best = heapq.nlargest(
+            limit,
+            scores.items(),
+            key=lambda item: (item[1], -len(self.entries[item[0]].name)),
+        )
+        return [self.entries[entry] for entry, _ in best]
+
+    def _score_prefixes(self, key: str, scores: Dict[int, float]) -> None:
+        # Exact matches first, then the prefix matches, shorter keys first
+        start = bisect_left(self.sorted_keys, (key, -1))
+        end = min(start + _PREFIX_SCAN, len(self.sorted_keys))
+        for candidate, key_id in self.sorted_keys[start:end]:
+            if not candidate.startswith(key):
+                break
+            score = 3.0 if candidate == key else 2.0 + len(key) / len(candidate)
+            entry = self.key_entries[key_id]
+            if score > scores.get(entry, 0.0):
+                scores[entry] = score
+
+    def _score_trigrams(self, key: str, scores: Dict[int, float]) -> None:
+        query_trigrams = sorted(
+            _trigrams(key), key=lambda t: len(self.trigrams.get(t, ()))
+        )
+        # Candidates come from the rarest trigrams of the query, common ones (like
+        # "lib") would make every keystroke count thousands of keys
+        shared: Dict[int, int] = {}
+        budget = _CANDIDATE_POSTINGS
+        for trigram in query_trigrams:
+            key_ids = self.trigrams.get(trigram, [])
+            if len(key_ids) > budget and len(shared) > 0:
+                break
+            budget -= len(key_ids)
+            for key_id in key_ids:
+                shared[key_id] = shared.get(key_id, 0) + 1
+        best = heapq.nlargest(_CANDIDATES, shared, key=shared.__getitem__)
+        for key_id in best:
+            padded = f"  {self.keys[key_id]}"
+            count = sum(1 for trigram in query_trigrams if trigram in padded)
+            containment = count / len(query_trigrams)
+            if containment < _MIN_CONTAINMENT:
+                continue
+            # Fuzzy matches stay below prefix matches, shorter keys first
+            score = containment - len(padded) / 1000
+            entry = self.key_entries[key_id]
+            if score > scores.get(entry, 0.0):
+                scores[entry] = score
+
+
+def _entry_keys(entry: CatalogEntry) -> List[str]:
+    keys = []
+    repository = normalize_remote_url(entry.url).rsplit("/", 1)[-1]
+    for text in [entry.name, entry.title, repository]:
+        if text is None:
+            continue
+        key = normalize(text)
+        if key != "" and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def _read_entries(path: Path) -> List[CatalogEntry]:
+    """
+    Reads a catalog file: either a mapping of addon names to repository URLs (or to
+    mappings with a `url` and metadata), or a list of mappings with a `name` too
+    """
+    with open(path, "r") as f:
+        if path.suffix in [".yml", ".yaml"]:
+            import yaml
+
+            content = yaml.safe_load(f)
+        else:
+            content = json.load(f)
+    items: List[Tuple[Optional[str], Any]] = []
+    if isinstance(content, dict):
+        items = list(content.items())
+    elif isinstance(content, list):
+        items = [(None, item) for item in content]
+    else:
+        raise ValueError("expected a mapping or a list of entries")
+    entries = []
+    for name, value in items:
+        if isinstance(value, str):
+            value = {"url": value}
+        if not isinstance(value, dict):
+            continue
+        name = name or value.get("name")
+        url = value.get("url")
+        if not isinstance(name, str) or not isinstance(url, str):
+            continue
+        entries.append(
+            CatalogEntry(
+                name=name,
+                url=url,
+                title=_optional_str(value.get("title")),
+                author=_optional_str(value.get("author")),
+                description=_optional_str(value.get("description")),
+            )
+        )
+    return entries
+
+
+def _optional_str(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) else None
+
+
+catalog = Catalog()
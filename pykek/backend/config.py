@@ -1,11 +1,20 @@
 from abc import ABC, abstractmethod
+import atexit
+from dataclasses import dataclass
 import os
 from pathlib import Path
-from loguru import logger
+import shutil
+import threading
+from pykek.log import logger
 import platformdirs
+from pykek.backend.catalog import catalog
 from pykek.backend.game_instance import GameInstance
-from typing import Dict, List, Optional, Protocol
-import yaml
+from pykek.backend.mirror import mirror_store
+from pykek.backend.prefetch import prefetcher
+from pykek.backend.remote import remote_policy
+from pykek.backend.scheduler import scheduler
+from pykek.backend.worktree import worktree_accelerator
+from typing import Any, Dict, List, Optional, Protocol
 
 
 class ConfigListener(Protocol):
@@ -13,21 +22,35 @@ class ConfigListener(Protocol):
         pass
 
 
+@dataclass
+class InstanceSettings:
+    check_for_updates: bool = True
+
+
 class Config(ABC):
     """myp
     Config stores the app's configuration,
     it should never be instanciated directly.
 
-    Use `Config.load()` to load the config or `Config.write()` to write to it.
+    Use `Config.load()` to load the config, and `Config.schedule_write()` (or
+    `Config.write()` when it must be on disk right away) to write to it.
     """
 
     CONFIG_FILE_PATH = Path(
         os.path.join(platformdirs.user_config_path(appname="pykek"), "config.yml")
     )
+    WRITE_DELAY = 0.5
 
     game_instances: List[GameInstance] = []
     favorite_instance: Optional[GameInstance] = None
+    instance_settings: Dict[str, InstanceSettings] = {}
+    # Concurrency limits, the defaults of the backend are used when unset
+    max_workers: Optional[int] = None
+    max_per_host: Optional[int] = None
+    max_parallel_updates: Optional[int] = None
     _listeners: List[ConfigListener] = []
+    _write_lock = threading.Lock()
+    _pending_write: Optional[threading.Timer] = None
 
     @abstractmethod
     def __init__(self) -> None:
@@ -36,53 +59,102 @@ class Config(ABC):
     @staticmethod
     def load() -> None:
         """Loads the configuration by reading the config file"""
+        import yaml
+
         if not Config.CONFIG_FILE_PATH.exists():
             logger.info(f"{Config.CONFIG_FILE_PATH} does not exist, it will be created")
             os.makedirs(Config.CONFIG_FILE_PATH.parent, exist_ok=True)
             with open(Config.CONFIG_FILE_PATH, "w") as f:
                 f.close()
-        else:
-            with open(Config.CONFIG_FILE_PATH, "r") as f:
-                conf = yaml.safe_load(f)
-                f.close()
+            return
+
+        with open(Config.CONFIG_FILE_PATH, "r") as f:
+            try:
+                conf = yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                Config._keep_invalid_file(f"Invalid YAML: {e}")
+                return
+            f.close()
+
+        errors = _validate(conf)
+        if len(errors) > 0:
+            Config._keep_invalid_file("\n".join(errors))
+            return
+        for key in conf:
+            if key not in _KNOWN_FIELDS:
+                logger.warning(f"Ignoring unknown field {key} in the config file")
 
-                if not isinstance(conf, Dict):
-                    logger.error(
-                        f"Unexpected error while reading {Config.CONFIG_FILE_PATH} file"
-                    )
-                    return
-
-                instances = conf.get("instances", [])
-                if not isinstance(instances, List):
-                    logger.error(
-                        f"Unexpected error while reading {Config.CONFIG_FILE_PATH} instances field"
-                    )
-                    return
-
-                if len(instances) == 0:
-                    logger.warning(
-                        f"{Config.CONFIG_FILE_PATH} exists but instances field is missing or empty"
-                    )
-                else:
-                    for wow_dir_path in instances:
-                        try:
-                            instance = GameInstance.from_dir_path(wow_dir_path)
-                            Config.add_game_instance(instance)
-                        except Exception as _:
-                            pass
+        mirror_store.enabled = conf.get("mirrors", False)
+        worktree_accelerator.fsmonitor = conf.get("fsmonitor", False)
+        prefetcher.enabled = conf.get("prefetch", False)
+        if conf.get("catalog") is not None:
+            catalog.path = Path(os.path.expanduser(conf["catalog"]))
+        Config.max_workers = conf.get("max_workers")
+        Config.max_per_host = conf.get("max_per_host")
+        Config.max_parallel_updates = conf.get("max_parallel_updates")
+        Config._apply_limits()
+
+        instances = conf.get("instances", [])
+        if len(instances) == 0:
+            logger.warning(
+                f"{Config.CONFIG_FILE_PATH} exists but instances field is missing or empty"
+            )
+        for entry in instances:
+            if isinstance(entry, str):
+                entry = {"path": entry}
+            wow_dir_path = entry["path"]
+            try:
+                instance = GameInstance.from_dir_path(wow_dir_path)
+            except Exception as _:
+                continue
+            check_for_updates = entry.get("check_for_updates", True)
+            Config.instance_settings[wow_dir_path] = InstanceSettings(check_for_updates)
+            Config.add_game_instance(instance)
+
+        favorite = conf.get("favorite")
+        for instance in Config.game_instances:
+            if instance.dir_path == favorite:
+                Config.favorite_instance = instance
 
     @staticmethod
     def write() -> None:
-        with open(Config.CONFIG_FILE_PATH, "w") as f:
+        """Writes the config file now, atomically"""
+        import yaml
+
+        with Config._write_lock:
+            if Config._pending_write is not None:
+                Config._pending_write.cancel()
+                Config._pending_write = None
             if len(Config.game_instances) == 0:
-                f.close()
-                return
-            instances_paths = list(map(lambda i: i.dir_path, Config.game_instances))
-            yaml_repr = {"instances": instances_paths}
-            yaml.dump(yaml_repr, f)
-            f.close()
+                content = ""
+            else:
+                content = yaml.dump(Config._yaml_repr())
+            _write_atomically(Config.CONFIG_FILE_PATH, content)
         logger.info("Config file updated")
 
+    @staticmethod
+    def schedule_write() -> None:
+        """
+        Writes the config file after `WRITE_DELAY` seconds, so that a burst of
+        changes results in a single write
+        """
+        with Config._write_lock:
+            if Config._pending_write is not None:
+                Config._pending_write.cancel()
+            Config._pending_write = threading.Timer(Config.WRITE_DELAY, Config.write)
+            Config._pending_write.daemon = True
+            Config._pending_write.start()
+
+    @staticmethod
+    def flush() -> None:
+        """Writes the config file now if a write is scheduled"""
+        if Config._pending_write is not None:
+            Config.write()
+
+    @staticmethod
+    def settings(instance: GameInstance) -> InstanceSettings:
+        return Config.instance_settings.get(instance.dir_path, InstanceSettings())
+
     @staticmethod
     def add_game_instance(game_instance: GameInstance) -> None:
         Config.game_instances.append(game_instance)
@@ -105,6 +177,130 @@ class Config(ABC):
     @staticmethod
     def reset() -> None:
         """Resets the config. Mostly used for testing purpose."""
+        if Config._pending_write is not None:
+            Config._pending_write.cancel()
+            Config._pending_write = None
         Config.game_instances = []
         Config.favorite_instance = None
+        Config.instance_settings = {}
+        Config.max_workers = None
+        Config.max_per_host = None
+        Config.max_parallel_updates = None
         Config._listeners = []
+        mirror_store.enabled = False
+        worktree_accelerator.fsmonitor = False
+        prefetcher.enabled = False
+        prefetcher.reset()
+        catalog.clear()
+
+    @staticmethod
+    def _yaml_repr() -> Dict[str, object]:
+        instances: List[object] = []
+        for instance in Config.game_instances:
+            settings = Config.settings(instance)
+            if settings == InstanceSettings():
+                instances.append(instance.dir_path)
+            else:
+                instances.append(
+                    {
+                        "path": instance.dir_path,
+                        "check_for_updates": settings.check_for_updates,
+                    }
+                )
+        yaml_repr: Dict[str, object] = {"instances": instances}
+        if Config.favorite_instance is not None:
+            yaml_repr["favorite"] = Config.favorite_instance.dir_path
+        if mirror_store.enabled:
+            yaml_repr["mirrors"] = True
+        if worktree_accelerator.fsmonitor:
+            yaml_repr["fsmonitor"] = True
+        if prefetcher.enabled:
+            yaml_repr["prefetch"] = True
+        if catalog.path is not None:
+            yaml_repr["catalog"] = str(catalog.path)
+        for key in ["max_workers", "max_per_host", "max_parallel_updates"]:
+            if getattr(Config, key) is not None:
+                yaml_repr[key] = getattr(Config, key)
+        return yaml_repr
+
+    @staticmethod
+    def _apply_limits() -> None:
+        if Config.max_workers is not None:
+            scheduler.max_workers = Config.max_workers
+        if Config.max_per_host is not None:
+            remote_policy.max_per_host = Config.max_per_host
+
+    @staticmethod
+    def _keep_invalid_file(reason: str) -> None:
+        """Moves an invalid config file aside, so that the next write can't lose it"""
+        invalid_path = Config.CONFIG_FILE_PATH.with_suffix(".yml.invalid")
+        shutil.copyfile(Config.CONFIG_FILE_PATH, invalid_path)
+        logger.error(
+            f"Couldn't load {Config.CONFIG_FILE_PATH}, it was copied to {invalid_path}:"
+            f"\n{reason}"
+        )
+
+
+_KNOWN_FIELDS = [
+    "instances",
+    "favorite",
+    "mirrors",
+    "fsmonitor",
+    "prefetch",
+    "catalog",
+    "max_workers",
+    "max_per_host",
+    "max_parallel_updates",
+]
+
+
+def _validate(conf: Any) -> List[str]:
+    """Returns the schema errors of a config file content"""
+    if not isinstance(conf, Dict):
+        return ["the config must be a mapping"]
+    errors = []
+    instances = conf.get("instances", [])
+    if not isinstance(instances, List):
+        errors.append("instances must be a list")
+        instances = []
+    for entry in instances:
+        if isinstance(entry, str):
+            continue
+        if not isinstance(entry, Dict) or not isinstance(entry.get("path"), str):
+            errors.append(f"invalid instance {entry}, expected a path")
+        elif not isinstance(entry.get("check_for_updates", True), bool):
+            errors.append(f"check_for_updates of {entry['path']} must be a boolean")
+    if not isinstance(conf.get("favorite", ""), str):
+        errors.append("favorite must be a path")
+    if not isinstance(conf.get("catalog", ""), str):
+        errors.append("catalog must be a path")
+    for key in ["mirrors", "fsmonitor", "prefetch"]:
+        if not isinstance(conf.get(key, False), bool):
+            errors.append(f"{key} must be a boolean")
+    for key in ["max_workers", "max_per_host", "max_parallel_updates"]:
+        value = conf.get(key, 1)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            errors.append(f"{key} must be a positive integer")
+    return errors
+
+
+atexit.register(Config.flush)
+
+
+def _write_atomically(path: Path, content: str) -> None:
+    """Writes to a temporary file, fsyncs it, then renames it over `path`"""
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
@@ -0,0 +1,439 @@
+"""
+Optional background service keeping game instances and addons state warm.
+
+The daemon serves newline-delimited JSON-RPC 2.0 over a local Unix socket,
+both the GTK frontend and the CLI can connect to it as thin clients.
+"""
+
+import json
+import os
+from pathlib import Path
+import socket
+import socketserver
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+import platformdirs
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.config import Config
+from pykek.backend.game_instance import GameInstance
+from pykek.backend.history import history
+from pykek.backend.maintenance import MaintenanceScheduler
+from pykek.backend.operations import (
+    Operation,
+    check_addon,
+    check_and_update_addon,
+    rollback_addon,
+    switch_addon,
+    switch_addons,
+)
+from pykek.backend.update_scheduler import UpdateScheduler
+from pykek.log import logger
+
+SOCKET_NAME = "pykek.sock"
+
+
+def socket_path() -> Path:
+    """Returns the path of the daemon socket, in the user runtime directory"""
+    if sys.platform not in ["darwin", "win32"] and not os.environ.get(
+        "XDG_RUNTIME_DIR"
+    ):
+        # platformdirs would warn and fall back to a directory shared in /tmp
+        return platformdirs.user_cache_path(appname="pykek") / "run" / SOCKET_NAME
+    return platformdirs.user_runtime_path(appname="pykek") / SOCKET_NAME
+
+
+class DaemonError(Exception):
+    pass
+
+
+class Daemon:
+    """Daemon owns the warm state and runs the operations requested by clients."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._update_scheduler = UpdateScheduler()
+        self._maintenance_scheduler = MaintenanceScheduler()
+
+    def start(self) -> None:
+        """
+        Loads every configured instance, schedules periodic update checks
+        and git maintenance in idle time
+        """
+        for instance in Config.game_instances:
+            self._load(instance)
+        self._update_scheduler.start()
+        self._maintenance_scheduler.start()
+
+    def stop(self) -> None:
+        self._update_scheduler.stop()
+        self._maintenance_scheduler.stop()
+
+    ### RPC methods
+
+    def instances(self) -> List[str]:
+        return [instance.dir_path for instance in Config.game_instances]
+
+    def status(self, instance: Optional[str] = None) -> List[Dict[str, object]]:
+        return [addon.as_dict() for addon in self._instance(instance).addons]
+
+    def rescan(self, instance: Optional[str] = None) -> List[Dict[str, object]]:
+        """Scans the addons folder again, e.g. after addons were installed"""
+        game_instance = self._instance(instance)
+        self._load(game_instance)
+        return [addon.as_dict() for addon in game_instance.addons]
+
+    def check(
+        self, instance: Optional[str] = None, addons: Optional[List[str]] = None
+    ) -> List[Dict[str, object]]:
+        return _wait_all([check_addon(a) for a in self._addons(instance, addons)])
+
+    def update(
+        self,
+        instance: Optional[str] = None,
+        addons: Optional[List[str]] = None,
+        atomic: bool = False,
+    ) -> List[Dict[str, object]]:
+        """
+        Updates `addons`, every addon without. When `atomic`, a failed update rolls
+        back the ones already done.
+        """
+        if atomic:
+            return update_atomically(
+                self._instance(instance), self._addons(instance, addons)
+            )
+        history.begin_session()
+        graph = self._instance(instance).dependency_graph()
+        records = []
+        # Libraries are updated before their dependents
+        for wave in graph.waves(self._addons(instance, addons)):
+            records += _wait_all([check_and_update_addon(a) for a in wave])
+        return records
+
+    def switch(
+        self,
+        branch: str,
+        addons: Optional[List[str]] = None,
+        instance: Optional[str] = None,
+        author: Optional[str] = None,
+    ) -> List[Dict[str, object]]:
+        """
+        Switches `addons` to `branch`. Without `addons`, every addon having `branch`
+        is switched, only the ones of `author` if given.
+        """
+        if not addons:
+            return _wait_all(
+                switch_addons(self._instance(instance).addons, branch, author)
+            )
+        for addon in self._addons(instance, addons):
+            if not addon.is_git:
+                raise DaemonError(f"{addon.name} is not a git addon")
+        return _wait_all(
+            [switch_addon(a, branch) for a in self._addons(instance, addons)]
+        )
+
+    def rollback(
+        self,
+        instance: Optional[str] = None,
+        addons: Optional[List[str]] = None,
+        session: bool = False,
+    ) -> List[Dict[str, object]]:
+        """Rolls addons back to their previous commit, or the whole latest session"""
+        if not session:
+            return _wait_all(
+                [rollback_addon(a) for a in self._addons(instance, addons)]
+            )
+        positions = history.last_session()
+        return _wait_all(
+            [
+                rollback_addon(addon, positions[addon.dir_path])
+                for addon in self._addons(instance, addons)
+                if addon.dir_path in positions
+            ]
+        )
+
+    def pause(self, reason: str) -> bool:
+        """
+        Pauses scheduled update checks and maintenance,
+        e.g. on battery or metered connections
+        """
+        self._update_scheduler.pause(reason)
+        self._maintenance_scheduler.pause(reason)
+        return True
+
+    def resume(self, reason: str) -> bool:
+        self._update_scheduler.resume(reason)
+        self._maintenance_scheduler.resume(reason)
+        return True
+
+    ### Helpers
+
+    def _instance(self, dir_path: Optional[str]) -> GameInstance:
+        if len(Config.game_instances) == 0:
+            raise DaemonError("No WoW instance configured")
+        if dir_path is None:
+            return Config.favorite_instance or Config.game_instances[0]
+        for instance in Config.game_instances:
+            if _same_path(instance.dir_path, dir_path):
+                return instance
+        raise DaemonError(f"Unknown instance {dir_path}")
+
+    def _load(self, instance: GameInstance) -> None:
+        with self._lock:
+            self._update_scheduler.remove_addons(instance.addons)
+            self._maintenance_scheduler.remove_addons(instance.addons)
+            instance.load_addons()
+            if Config.settings(instance).check_for_updates:
+                self._update_scheduler.add_addons(instance.addons)
+            self._maintenance_scheduler.add_addons(instance.addons)
+
+    def _addons(
+        self, instance: Optional[str], names: Optional[List[str]]
+    ) -> List[Addon]:
+        game_instance = self._instance(instance)
+        if not names:
+            return game_instance.addons
+        by_name = {addon.name: addon for addon in game_instance.addons}
+        if any(name not in by_name for name in names):
+            # Installed since the daemon started, e.g. by the CLI or the app
+            self._load(game_instance)
+            by_name = {addon.name: addon for addon in game_instance.addons}
+        missing = [name for name in names if name not in by_name]
+        if len(missing) > 0:
+            raise DaemonError(f"Unknown addon(s): {', '.join(missing)}")
+        return [by_name[name] for name in names]
+
+
+def _same_path(first: str, second: str) -> bool:
+    def normalized(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    if normalized(first) == normalized(second):
+        return True
+    try:
+        # Symlinks and other spellings of the same directory
+        return os.path.samefile(first, second)
+    except OSError:
+        return False
+
+
+def _wait_all(operations: List[Operation]) -> List[Dict[str, object]]:
+    """Waits for `operations`, operations are shared with any other client"""
+    results = []
+    for operation in operations:
+        try:
+            operation.result()
+            results.append(operation.addon.as_dict())
+        except Exception as e:
+            results.append(
+                {**operation.addon.as_dict(), "status": "error", "error": str(e)}
+            )
+    return results
+
+
+def update_atomically(
+    instance: GameInstance, addons: List[Addon]
+) -> List[Dict[str, object]]:
+    """
+    Checks `addons` then updates the outdated ones all or nothing, blocking until
+    done. Returns a record per addon, like `_wait_all`.
+    """
+    checks = _wait_all([check_addon(addon) for addon in addons])
+    result = instance.update_all(
+        all_or_nothing=True, max_parallel=Config.max_parallel_updates, addons=addons
+    )
+    records = []
+    for addon, check in zip(addons, checks):
+        if check["status"] == "error":
+            records.append(check)
+        elif addon.name in result.failed:
+            records.append(
+                {
+                    **addon.as_dict(),
+                    "status": "error",
+                    "error": result.failed[addon.name],
+                }
+            )
+        else:
+            records.append(
+                {
+                    **addon.as_dict(),
+                    "updated": addon in result.updated,
+                    "rolled_back": result.rolled_back,
+                }
+            )
+    return records
+
+
+def status_from_record(record: Dict[str, object]) -> Optional[AddonStatus]:
+    """Returns the status of an addon record sent by the daemon, None on error"""
+    status = str(record.get("status", "")).upper()
+    if status not in AddonStatus.__members__:
+        return None
+    return AddonStatus[status]
+
+
+### Server
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            response = self.server.dispatch(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    METHODS = [
+        "instances",
+        "status",
+        "rescan",
+        "check",
+        "update",
+        "switch",
+        "rollback",
+        "pause",
+        "resume",
+    ]
+
+    def __init__(self, daemon: Daemon, path: Optional[Path] = None) -> None:
+        self.daemon = daemon
+        self.socket_path = path or socket_path()
+        os.makedirs(self.socket_path.parent, mode=0o700, exist_ok=True)
+        if self.socket_path.exists():
+            client = DaemonClient.connect(self.socket_path)
+            if client is not None:
+                client.close()
+                raise DaemonError(f"A daemon is already running on {self.socket_path}")
+            # Left behind by a daemon that didn't exit cleanly
+            self.socket_path.unlink()
+        super().__init__(str(self.socket_path), _RequestHandler)
+        os.chmod(self.socket_path, 0o600)
+
+    def dispatch(self, raw_request: bytes) -> Dict[str, Any]:
+        request_id = None
+        try:
+            request = json.loads(raw_request)
+            request_id = request.get("id")
+            method = request.get("method")
+            if method not in DaemonServer.METHODS:
+                raise DaemonError(f"Unknown method {method}")
+            result = getattr(self.daemon, method)(**request.get("params", {}))
+            return {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except Exception as e:
+            logger.error(f"Daemon request failed: {e}")
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {"code": -32000, "message": str(e)},
+            }
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+def serve(path: Optional[Path] = None) -> None:
+    """Runs the daemon in the foreground until interrupted"""
+    Config.load()
+    daemon = Daemon()
+    with DaemonServer(daemon, path) as server:
+        daemon.start()
+        logger.info(f"pykek daemon listening on {server.socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.stop()
+
+
+### Client
+
+
+class DaemonClient:
+    """
+    DaemonClient calls the daemon methods over its Unix socket.
+
+    The daemon answers each connection serially, so calls made concurrently use
+    connections of their own: a long update doesn't hold status loads back. Idle
+    connections are kept for the next calls.
+    """
+
+    def __init__(self, socket_path: Path, sock: socket.socket) -> None:
+        self._socket_path = socket_path
+        self._lock = threading.Lock()
+        self._idle: List[_Connection] = [_Connection(sock)]
+        self._next_id = 0
+
+    @classmethod
+    def connect(cls, path: Optional[Path] = None) -> Optional["DaemonClient"]:
+        """Returns a client connected to the daemon, or None if it's not running"""
+        path = path or socket_path()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(str(path))
+        except OSError:
+            sock.close()
+            return None
+        return cls(path, sock)
+
+    def call(self, method: str, **params) -> Any:
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            connection = self._idle.pop() if len(self._idle) > 0 else None
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(str(self._socket_path))
+            except OSError as e:
+                sock.close()
+                raise DaemonError(f"Couldn't connect to the daemon: {e}")
+            connection = _Connection(sock)
+        request = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": method,
+            "params": params,
+        }
+        try:
+            line = connection.request(json.dumps(request).encode() + b"\n")
+        except OSError as e:
+            connection.close()
+            raise DaemonError(f"Connection to the daemon lost: {e}")
+        if not line:
+            connection.close()
+            raise DaemonError("Connection to the daemon lost")
+        with self._lock:
+            self._idle.append(connection)
+        response = json.loads(line)
+        if "error" in response:
+            raise DaemonError(response["error"]["message"])
+        return response["result"]
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class _Connection:
+    def __init__(self, sock: socket.socket) -> None:
+        self._socket = sock
+        self._file = sock.makefile("rwb")
+
+    def request(self, data: bytes) -> bytes:
+        self._file.write(data)
+        self._file.flush()
+        return self._file.readline()
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
@@ -0,0 +1,205 @@
+from dataclasses import dataclass
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from pykek.backend.addon import Addon
+
+
+def _key(name: str) -> str:
+    # The game matches dependencies to addon folders case-insensitively
+    return name.casefold()
+
+
+@dataclass
+class _Node:
+    addon: "Addon"
+    required: Tuple[str, ...]
+    optional: Tuple[str, ...]
+
+    def keys(self) -> List[str]:
+        return [_key(name) for name in self.required + self.optional]
+
+
+class DependencyGraph:
+    """
+    DependencyGraph links the addons of an instance through the dependencies their
+    TOC declare (`## Dependencies`, `## RequiredDeps` and `## OptionalDeps`).
+
+    `sync()` only relinks the addons whose dependencies changed since the previous
+    call. Cycles and the update levels (libraries first, then their dependents)
+    are computed on demand, in linear time, from the strongly connected components
+    of the graph: the addons of a cycle share the same level.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, _Node] = {}
+        self._dependents: Dict[str, Set[str]] = {}
+        self._levels: Optional[Dict[str, int]] = None
+        self._cycles: List[List[str]] = []
+
+    def sync(self, addons: List["Addon"]) -> None:
+        """Brings the graph up to date with `addons` and their current TOC info"""
+        with self._lock:
+            keys = set()
+            for addon in addons:
+                key = _key(addon.name)
+                keys.add(key)
+                required = tuple(addon.dependencies)
+                optional = tuple(addon.optional_dependencies)
+                node = self._nodes.get(key)
+                if node is not None and (node.required, node.optional) == (
+                    required,
+                    optional,
+                ):
+                    node.addon = addon
+                    continue
+                if node is not None:
+                    self._unlink(key, node)
+                node = _Node(addon, required, optional)
+                self._nodes[key] = node
+                for dependency in node.keys():
+                    self._dependents.setdefault(dependency, set()).add(key)
+                self._levels = None
+            for key in [key for key in self._nodes if key not in keys]:
+                self._unlink(key, self._nodes.pop(key))
+                self._levels = None
+
+    ### Queries
+
+    def dependencies(self, addon: "Addon") -> List["Addon"]:
+        """Returns the installed dependencies of `addon`, optional ones included"""
+        with self._lock:
+            node = self._nodes.get(_key(addon.name))
+            if node is None:
+                return []
+            return [self._nodes[key].addon for key in self._installed(node)]
+
+    def dependents(self, addon: "Addon", transitive: bool = False) -> List["Addon"]:
+        """Returns the addons depending on `addon`, sorted by name"""
+        with self._lock:
+            key = _key(addon.name)
+            found: Set[str] = set()
+            queue = [key]
+            while len(queue) > 0:
+                for dependent in self._dependents.get(queue.pop(), set()):
+                    if dependent not in found and dependent != key:
+                        found.add(dependent)
+                        if transitive:
+                            queue.append(dependent)
+            addons = [self._nodes[key].addon for key in found if key in self._nodes]
+        return sorted(addons, key=lambda addon: addon.name.casefold())
+
+    def missing(self) -> Dict[str, List[str]]:
+        """Returns the required dependencies that aren't installed, by addon name"""
+        with self._lock:
+            missing = {}
+            for node in self._nodes.values():
+                names = [
+                    name for name in node.required if _key(name) not in self._nodes
+                ]
+                if len(names) > 0:
+                    missing[node.addon.name] = names
+            return missing
+
+    def cycles(self) -> List[List[str]]:
+        """Returns the names of the addons of each dependency cycle"""
+        with self._lock:
+            self._compute_levels()
+            return [
+                sorted(self._nodes[key].addon.name for key in cycle)
+                for cycle in self._cycles
+            ]
+
+    def waves(self, addons: List["Addon"]) -> List[List["Addon"]]:
+        """
+        Splits `addons` into waves: the dependencies of an addon, even through
+        addons left out, are in earlier waves
+        """
+        with self._lock:
+            levels = self._compute_levels()
+        waves: Dict[int, List["Addon"]] = {}
+        for addon in addons:
+            waves.setdefault(levels.get(_key(addon.name), 0), []).append(addon)
+        return [waves[level] for level in sorted(waves)]
+
+    ### Levels
+
+    def _compute_levels(self) -> Dict[str, int]:
+        if self._levels is not None:
+            return self._levels
+        levels: Dict[str, int] = {}
+        cycles = []
+        # Components come out dependencies first, so levels need a single pass
+        for component in self._strongly_connected_components():
+            members = set(component)
+            level = 0
+            for key in component:
+                for dependency in self._installed(self._nodes[key]):
+                    if dependency not in members:
+                        level = max(level, levels[dependency] + 1)
+            for key in component:
+                levels[key] = level
+            first = self._nodes[component[0]]
+            if len(component) > 1 or component[0] in self._installed(first):
+                cycles.append(component)
+        self._levels = levels
+        self._cycles = cycles
+        return levels
+
+    def _strongly_connected_components(self) -> List[List[str]]:
+        """Tarjan's algorithm, iterative so that long chains don't hit recursion limits"""
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        components = []
+        for root in self._nodes:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._installed(self._nodes[root])))]
+            while len(work) > 0:
+                key, dependencies = work[-1]
+                descended = False
+                for dependency in dependencies:
+                    if dependency not in index:
+                        index[dependency] = low[dependency] = len(index)
+                        stack.append(dependency)
+                        on_stack.add(dependency)
+                        node = self._nodes[dependency]
+                        work.append((dependency, iter(self._installed(node))))
+                        descended = True
+                        break
+                    if dependency in on_stack:
+                        low[key] = min(low[key], index[dependency])
+                if descended:
+                    continue
+                work.pop()
+                if len(work) > 0:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[key])
+                if low[key] == index[key]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == key:
+                            break
+                    components.append(component)
+        return components
+
+    def _installed(self, node: _Node) -> List[str]:
+        return [key for key in node.keys() if key in self._nodes]
+
+    def _unlink(self, key: str, node: _Node) -> None:
+        for dependency in node.keys():
+            dependents = self._dependents.get(dependency)
+            if dependents is not None:
+                dependents.discard(key)
+                if len(dependents) == 0:
+                    del self._dependents[dependency]
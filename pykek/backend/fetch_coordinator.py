@@ -0,0 +1,151 @@
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from pykek.log import logger
+from pykek.tracing import span
+from pykek.backend.metrics import record_cache_lookup
+from pykek.backend.mirror import mirror_store
+from pykek.backend.remote import normalize_remote_url, remote_policy
+from pykek.backend.timings import timings
+from pykek.backend.transfer import TransferListener
+
+if TYPE_CHECKING:
+    from git import Repo
+
+
+@dataclass
+class FetchStats:
+    """FetchStats counts the fetches requested during a refresh."""
+
+    requested: int = 0
+    network_fetches: int = 0
+    local_fetches: int = 0
+
+    @property
+    def saved_fetches(self) -> int:
+        return self.local_fetches
+
+
+@dataclass
+class _SharedFetch:
+    source_dir: str = ""
+    refspec: str = ""
+    done: threading.Event = field(default_factory=threading.Event)
+    error: Optional[Exception] = None
+    finished_at: Optional[float] = None
+
+
+class FetchCoordinator:
+    """
+    FetchCoordinator deduplicates fetches of addons sharing the same upstream.
+
+    The first addon asking for a given (remote URL, branch) pair fetches from
+    the network, the others wait for it and then fetch from its freshly
+    updated local copy, or from the shared mirror when mirrors are enabled.
+
+    Use `begin_refresh()` before a new round of update checks.
+    """
+
+    def __init__(self, max_age: float = 60.0) -> None:
+        self.max_age = max_age
+        self.stats = FetchStats()
+        self._lock = threading.Lock()
+        self._fetches: Dict[Tuple[str, str], _SharedFetch] = {}
+
+    def begin_refresh(self) -> FetchStats:
+        """Forgets previous fetches and returns the stats of the previous refresh"""
+        with self._lock:
+            previous = self.stats
+            self._fetches = {}
+            self.stats = FetchStats()
+        if previous.requested > 0:
+            logger.info(
+                f"Previous refresh: {previous.network_fetches} network fetches, "
+                f"{previous.saved_fetches} saved"
+            )
+        return previous
+
+    def fetch(
+        self,
+        repo: "Repo",
+        branch: str,
+        listener: Optional[TransferListener] = None,
+    ) -> None:
+        """Fetches `branch`, `listener` gets the progress of network fetches"""
+        started_at = time.monotonic()
+        with span("fetch", repo=repo.working_dir, branch=branch):
+            self._fetch(repo, branch, listener)
+        timings.record(str(repo.working_dir), "fetch", time.monotonic() - started_at)
+
+    def _fetch(
+        self, repo: "Repo", branch: str, listener: Optional[TransferListener]
+    ) -> None:
+        url = repo.remote().url
+        key = (normalize_remote_url(url), branch)
+        with self._lock:
+            self.stats.requested += 1
+            shared = self._fetches.get(key)
+            if shared is None or self._is_stale(shared):
+                shared = _SharedFetch()
+                self._fetches[key] = shared
+                is_leader = True
+            else:
+                is_leader = False
+
+        if is_leader:
+            self._network_fetch(repo, url, shared, listener)
+            return
+
+        shared.done.wait()
+        if shared.error is not None or shared.source_dir == repo.working_dir:
+            self._network_fetch(repo, url, None, listener)
+            return
+        record_cache_lookup("fetch", hit=True)
+        if mirror_store.enabled:
+            mirror_store.borrow(repo, url)
+        repo.git.fetch(shared.source_dir, shared.refspec)
+        with self._lock:
+            self.stats.local_fetches += 1
+
+    def _network_fetch(
+        self,
+        repo: "Repo",
+        url: str,
+        shared: Optional[_SharedFetch],
+        listener: Optional[TransferListener],
+    ) -> None:
+        record_cache_lookup("fetch", hit=False)
+        try:
+            if mirror_store.enabled:
+                source_dir = str(mirror_store.update(url, listener))
+                refspec = "+refs/heads/*:refs/remotes/origin/*"
+                mirror_store.borrow(repo, url)
+                repo.git.fetch(source_dir, refspec)
+            else:
+                source_dir = str(repo.working_dir)
+                refspec = "+refs/remotes/origin/*:refs/remotes/origin/*"
+                remote_policy.fetch(repo, listener=listener)
+            with self._lock:
+                self.stats.network_fetches += 1
+            if shared is not None:
+                shared.source_dir = source_dir
+                shared.refspec = refspec
+        except Exception as e:
+            if shared is not None:
+                shared.error = e
+            raise
+        finally:
+            if shared is not None:
+                shared.finished_at = time.monotonic()
+                shared.done.set()
+
+    def _is_stale(self, shared: _SharedFetch) -> bool:
+        if shared.error is not None:
+            return True
+        if shared.finished_at is None:
+            return False
+        return time.monotonic() - shared.finished_at > self.max_age
+
+
+fetch_coordinator = FetchCoordinator()
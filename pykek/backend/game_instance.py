@@ -1,17 +1,31 @@
+from concurrent.futures import Future, wait
 from dataclasses import dataclass, field
-from typing import List, Protocol
-from loguru import logger
+from typing import List, Optional, Protocol
+from pykek.log import logger
+from pykek.tracing import span
 import os
 from pathlib import Path
-from pykek.backend.addon import Addon
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.bulk_update import (
+    DEFAULT_MAX_PARALLEL,
+    BulkUpdate,
+    BulkUpdateListener,
+    BulkUpdateResult,
+)
+from pykek.backend.catalog import catalog
+from pykek.backend.dependencies import DependencyGraph
+from pykek.backend.history import history
+from pykek.backend.operations import check_addon, rollback_addon, switch_addons
+from pykek.backend.state_store import state_store
+from pykek.backend.timings import timings
 
 
 class GameInstanceListener(Protocol):
-    def addons_did_load(self, addons: List[Addon]) -> None:
+    def addons_did_load(self, instance: "GameInstance", addons: List[Addon]) -> None:
         pass
 
 
-@dataclass
+@dataclass(slots=True)
 class GameInstance:
     """GameInstance stores various information about a WoW instance."""
 
@@ -21,6 +35,9 @@ class GameInstance:
     _listeners: List[GameInstanceListener] = field(
         init=False, repr=False, default_factory=list
     )
+    _dependency_graph: DependencyGraph = field(
+        init=False, repr=False, default_factory=DependencyGraph
+    )
 
     @classmethod
     def from_dir_path(cls, dir_path: str):
@@ -41,16 +58,140 @@ class GameInstance:
         self._listeners.remove(listener)
 
     def load_addons(self):
-        self.addons.clear()
-        addons_path = Path(os.path.join(self.dir_path, "Interface/AddOns"))
-        directories = [p for p in addons_path.iterdir() if p.is_dir()]
-        for directory in directories:
-            if directory.name.startswith("Blizzard_"):
+        with span("load_addons", instance=self.dir_path):
+            self.addons.clear()
+            addons_path = Path(os.path.join(self.dir_path, "Interface/AddOns"))
+            directories = [p for p in addons_path.iterdir() if p.is_dir()]
+            for directory in directories:
+                if directory.name.startswith("Blizzard_"):
+                    continue
+                addon = Addon.from_dir_path(directory)
+                self.addons.append(addon)
+            self._restore_statuses()
+            self._check_dependencies()
+            self._match_catalog()
+            for listener in self._listeners:
+                listener.addons_did_load(self, self.addons)
+
+    def _restore_statuses(self) -> None:
+        """Shows the last known statuses until the addons are checked again"""
+        known = (AddonStatus.OUTDATED, AddonStatus.UP_TO_DATE, AddonStatus.UNREACHABLE)
+        by_name = {status.name.lower(): status for status in known}
+        states = state_store.addon_states(instance=os.path.normpath(self.dir_path))
+        statuses = {state.dir_path: by_name.get(state.status or "") for state in states}
+        for addon in self.addons:
+            status = statuses.get(addon.dir_path)
+            if addon.is_git and status is not None:
+                addon.current_status = status
+
+    def _check_dependencies(self) -> None:
+        graph = self.dependency_graph()
+        for name, dependencies in graph.missing().items():
+            logger.warning(
+                f"{name} requires missing addon(s): {', '.join(dependencies)}"
+            )
+        for cycle in graph.cycles():
+            logger.warning(f"Dependency cycle between {', '.join(cycle)}")
+
+    def _match_catalog(self) -> None:
+        """Finds the known repository of every non-git addon, by folder or title"""
+        if not catalog.is_configured():
+            return
+        with span("match_catalog", instance=self.dir_path):
+            for addon in self.addons:
+                if not addon.is_git:
+                    addon.catalog_entry = catalog.match(addon.name, addon.title)
+
+    def dependency_graph(self) -> DependencyGraph:
+        """
+        Returns the dependency graph of the addons, relinking only the ones whose
+        TOC changed since the previous call
+        """
+        self._dependency_graph.sync(self.addons)
+        return self._dependency_graph
+
+    def name(self) -> str:
+        return Path(self.dir_path).name
+
+    def check_for_updates(self) -> List[Future]:
+        """
+        Schedules a status check of every addon on the shared scheduler, the ones
+        that took the longest before first
+        """
+        expected = timings.estimates([a.dir_path for a in self.addons], "check")
+        addons = sorted(
+            self.addons, key=lambda a: expected.get(a.dir_path, 0.0), reverse=True
+        )
+        return [check_addon(addon).future for addon in addons]
+
+    def update_all(
+        self,
+        all_or_nothing: bool = False,
+        listener: Optional[BulkUpdateListener] = None,
+        max_parallel: Optional[int] = None,
+        addons: Optional[List[Addon]] = None,
+    ) -> BulkUpdateResult:
+        """
+        Updates every outdated addon (only the ones of `addons` if given), blocking
+        until all of them are done.
+
+        The updates run on the shared scheduler, so this must not be called from one
+        of its workers.
+        """
+        outdated = [
+            a
+            for a in (self.addons if addons is None else addons)
+            if a.current_status == AddonStatus.OUTDATED
+        ]
+        bulk_update = BulkUpdate(
+            outdated,
+            max_parallel=max_parallel or DEFAULT_MAX_PARALLEL,
+            all_or_nothing=all_or_nothing,
+            listener=listener,
+            graph=self.dependency_graph(),
+        )
+        return bulk_update.run()
+
+    def switch_branch(self, branch: str, author: Optional[str] = None) -> List[Addon]:
+        """
+        Switches every addon having `branch` to it in parallel (only the ones of
+        `author` if given), blocking until done, and returns the switched addons.
+        Like `update_all`, this must not be called from one of the scheduler workers.
+        """
+        operations = switch_addons(self.addons, branch, author)
+        wait([operation.future for operation in operations])
+        return [
+            operation.addon
+            for operation in operations
+            if operation.future.exception() is None
+        ]
+
+    def remote_owners(self) -> List[str]:
+        """Returns the owners of the addons remotes, e.g. their authors on GitHub"""
+        owners = set()
+        for addon in self.addons:
+            try:
+                owner = addon.remote_owner()
+            except Exception:
                 continue
-            addon = Addon.from_dir_path(directory)
-            self.addons.append(addon)
-        for listener in self._listeners:
-            listener.addons_did_load(self.addons)
+            if owner is not None:
+                owners.add(owner)
+        return sorted(owners, key=str.casefold)
+
+    def rollback_last_session(self) -> List[Addon]:
+        """
+        Rolls back every addon of the instance that was updated or switched during
+        the latest session, blocking until done. Like `update_all`, this must not be
+        called from one of the scheduler workers.
+        """
+        positions = history.last_session()
+        operations = [
+            rollback_addon(addon, positions[addon.dir_path])
+            for addon in self.addons
+            if addon.dir_path in positions
+        ]
+        wait([operation.future for operation in operations])
+        return [operation.addon for operation in operations]
 
 
 def _is_wow_dir(dir_path: str) -> bool:
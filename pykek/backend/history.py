@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+import os
+import time
+from typing import Dict, List, Optional
+from pykek.backend.state_store import StateStore, state_store
+
+
+@dataclass
+class HistoryEntry:
+    """Where an addon was (branch and commit) right before an operation moved it"""
+
+    addon: str
+    action: str
+    branch: str
+    sha: str
+    session: str
+    time: float
+
+
+class History:
+    """
+    History logs the positions of addons before updates and switches.
+
+    Entries live in the state store, which only keeps the latest
+    `max_entries_per_addon` entries of each addon. Rolling back only needs the
+    recorded SHA, which is still in the local repository, so it never touches
+    the network.
+    """
+
+    def __init__(self, store: StateStore, max_entries_per_addon: int = 20) -> None:
+        self.store = store
+        self.max_entries_per_addon = max_entries_per_addon
+        self._session = ""
+        self.begin_session()
+
+    def begin_session(self) -> str:
+        """Starts a new session, e.g. for each run or each bulk update"""
+        self._session = f"{time.time():.6f}-{os.getpid()}"
+        return self._session
+
+    def record(self, addon: str, action: str, branch: str, sha: str) -> HistoryEntry:
+        entry = HistoryEntry(addon, action, branch, sha, self._session, time.time())
+        self.store.execute(
+            "INSERT INTO history (addon, action, branch, sha, session, time) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                entry.addon,
+                entry.action,
+                entry.branch,
+                entry.sha,
+                entry.session,
+                entry.time,
+            ),
+        )
+        self.store.execute(
+            "DELETE FROM history WHERE addon = ? AND id <= "
+            "(SELECT id FROM history WHERE addon = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (addon, addon, self.max_entries_per_addon),
+        )
+        return entry
+
+    def entries(self, addon: Optional[str] = None) -> List[HistoryEntry]:
+        sql = "SELECT addon, action, branch, sha, session, time FROM history"
+        if addon is not None:
+            rows = self.store.query(sql + " WHERE addon = ? ORDER BY id", (addon,))
+        else:
+            rows = self.store.query(sql + " ORDER BY id")
+        return [HistoryEntry(*row) for row in rows]
+
+    def last(self, addon: str, fresh: bool = True) -> Optional[HistoryEntry]:
+        rows = self.store.query(
+            "SELECT addon, action, branch, sha, session, time FROM history "
+            "WHERE addon = ? ORDER BY id DESC LIMIT 1",
+            (addon,),
+            fresh=fresh,
+        )
+        return HistoryEntry(*rows[0]) if len(rows) > 0 else None
+
+    def last_session(self) -> Dict[str, HistoryEntry]:
+        """
+        Returns the position of each addon before the latest session that updated or
+        switched addons, keyed by addon directory.
+        """
+        rows = self.store.query(
+            "SELECT addon, action, branch, sha, session, time FROM history "
+            "WHERE session = (SELECT session FROM history WHERE action != 'rollback' "
+            "ORDER BY id DESC LIMIT 1) AND action != 'rollback' ORDER BY id"
+        )
+        positions: Dict[str, HistoryEntry] = {}
+        for row in rows:
+            entry = HistoryEntry(*row)
+            positions.setdefault(entry.addon, entry)
+        return positions
+
+
+history = History(state_store)
@@ -0,0 +1,191 @@
+"""
+Lockfiles describe the exact addon set of an instance, so that it can be
+reproduced on another machine or instance.
+"""
+
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+import os
+from pathlib import Path
+import time
+from typing import TYPE_CHECKING, Dict, List
+from pykek.backend.game_instance import GameInstance
+from pykek.backend.mirror import mirror_store
+from pykek.backend.remote import normalize_remote_url, remote_policy
+from pykek.backend.scheduler import scheduler
+from pykek.backend.timings import timings
+from pykek.backend.worktree import worktree_accelerator
+from pykek.log import logger
+
+if TYPE_CHECKING:
+    from git import Repo
+
+LOCKFILE_VERSION = 1
+
+
+class LockfileError(Exception):
+    pass
+
+
+@dataclass
+class LockEntry:
+    name: str
+    url: str
+    branch: str
+    sha: str
+    mode: str  # "mirror" when the addon borrows its objects from a mirror, else "clone"
+
+
+@dataclass
+class InstallResult:
+    name: str
+    sha: str
+    action: str  # "cloned", "updated" or "unchanged"
+
+
+@dataclass
+class Lockfile:
+    entries: List[LockEntry]
+
+    @classmethod
+    def from_instance(cls, instance: GameInstance) -> "Lockfile":
+        """Locks the current commit of every git addon of `instance`"""
+        from git import Repo
+
+        entries = []
+        for addon in sorted(instance.addons, key=lambda a: a.name):
+            if not addon.is_git:
+                continue
+            info = addon.git_info()
+            borrowing = mirror_store.is_borrowing(Repo(addon.dir_path), info.url)
+            entries.append(
+                LockEntry(
+                    name=addon.name,
+                    url=info.url,
+                    branch=info.branch,
+                    sha=info.sha,
+                    mode="mirror" if borrowing else "clone",
+                )
+            )
+        return cls(entries)
+
+    @classmethod
+    def load(cls, path: Path) -> "Lockfile":
+        import yaml
+
+        with open(path, "r") as f:
+            content = yaml.safe_load(f)
+        if not isinstance(content, Dict) or content.get("version") != LOCKFILE_VERSION:
+            raise LockfileError(f"{path} is not a version {LOCKFILE_VERSION} lockfile")
+        try:
+            entries = [LockEntry(**entry) for entry in content.get("addons", [])]
+        except TypeError as e:
+            raise LockfileError(f"Invalid entry in {path}: {e}")
+        for entry in entries:
+            if not _is_folder_name(entry.name):
+                raise LockfileError(f"Invalid addon name in {path}: {entry.name!r}")
+        return cls(entries)
+
+    def write(self, path: Path) -> None:
+        import yaml
+
+        content = {
+            "version": LOCKFILE_VERSION,
+            "addons": [asdict(entry) for entry in self.entries],
+        }
+        with open(path, "w") as f:
+            yaml.dump(content, f, sort_keys=False)
+
+    def install(self, dir_path: str) -> Dict[str, Future]:
+        """
+        Installs every locked addon into the instance at `dir_path` in parallel, on
+        the shared scheduler, and returns a future of `InstallResult` per addon name.
+        Addons already installed from the same remote are fetched and moved to their
+        locked commit instead of being cloned again.
+        """
+        addons_dir = os.path.join(dir_path, "Interface/AddOns")
+        os.makedirs(addons_dir, exist_ok=True)
+        target_dirs = {}
+        for entry in self.entries:
+            target_dir = os.path.join(addons_dir, entry.name)
+            # Names come from a shared file, never install outside of the instance.
+            # The folder itself isn't resolved, addons can be symlinks.
+            parent = Path(os.path.normpath(target_dir)).parent.resolve()
+            if not _is_folder_name(entry.name) or parent != Path(addons_dir).resolve():
+                raise LockfileError(f"{entry.name!r} isn't an addon folder name")
+            target_dirs[entry.name] = target_dir
+        return {
+            entry.name: scheduler.submit(_install_entry, entry, target_dirs[entry.name])
+            for entry in self.entries
+        }
+
+
+def _is_folder_name(name: str) -> bool:
+    return (
+        name not in ["", ".", ".."]
+        and not os.path.isabs(name)
+        and os.sep not in name
+        and "/" not in name
+    )
+
+
+def _install_entry(entry: LockEntry, target_dir: str) -> InstallResult:
+    from git import Repo
+
+    if not os.path.exists(target_dir):
+        started_at = time.monotonic()
+        # A local mirror is reused whatever the mode the addon was locked with
+        if mirror_store.enabled or mirror_store.has_mirror(entry.url):
+            repo = mirror_store.clone(entry.url, target_dir)
+        else:
+            remote_policy.clone(entry.url, target_dir)
+            repo = Repo(target_dir)
+        timings.record(target_dir, "clone", time.monotonic() - started_at)
+        action = "cloned"
+    else:
+        repo = _existing_repo(entry, target_dir)
+        is_locked = (
+            repo.head.commit.hexsha == entry.sha
+            and not repo.head.is_detached
+            and repo.active_branch.name == entry.branch
+        )
+        action = "unchanged" if is_locked else "updated"
+    if not _has_commit(repo, entry.sha):
+        remote_policy.fetch(repo)
+    if not _has_commit(repo, entry.sha):
+        raise LockfileError(f"{entry.sha} not found in {entry.url}")
+    repo.git.checkout("--force", "-B", entry.branch, entry.sha)
+    if f"origin/{entry.branch}" in [ref.name for ref in repo.remote().refs]:
+        repo.git.branch("--set-upstream-to", f"origin/{entry.branch}")
+    _verify(repo, entry)
+    logger.info(f"{entry.name} {action} at {entry.sha[:7]}")
+    return InstallResult(entry.name, entry.sha, action)
+
+
+def _existing_repo(entry: LockEntry, target_dir: str) -> "Repo":
+    from git import Repo
+
+    if not os.path.exists(os.path.join(target_dir, ".git")):
+        raise LockfileError(f"{target_dir} exists and isn't a git repository")
+    repo = Repo(target_dir)
+    url = repo.remote().url
+    if normalize_remote_url(url) != normalize_remote_url(entry.url):
+        raise LockfileError(f"{target_dir} tracks {url}, not {entry.url}")
+    return repo
+
+
+def _has_commit(repo: "Repo", sha: str) -> bool:
+    from git import GitCommandError
+
+    try:
+        repo.git.cat_file("-e", f"{sha}^{{commit}}")
+        return True
+    except GitCommandError:
+        return False
+
+
+def _verify(repo: "Repo", entry: LockEntry) -> None:
+    if repo.head.commit.hexsha != entry.sha or repo.active_branch.name != entry.branch:
+        raise LockfileError(f"{entry.name} isn't at {entry.branch}@{entry.sha}")
+    if worktree_accelerator.is_dirty(repo):
+        raise LockfileError(f"{entry.name} has local changes after install")
@@ -0,0 +1,422 @@
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
+from pykek.backend.addon import Addon
+from pykek.backend.metrics import metrics
+from pykek.backend.mirror import mirror_store
+from pykek.backend.operations import (
+    Operation,
+    OperationCancelledError,
+    operation_coordinator,
+)
+from pykek.backend.prefetch import prefetcher
+from pykek.backend.remote import RemoteUnreachableError, remote_policy
+from pykek.backend.state_store import MaintenanceState, state_store
+from pykek.log import logger
+
+if TYPE_CHECKING:
+    from git import Repo
+
+# Loose objects and packs above which a repository gets repacked
+LOOSE_OBJECTS_LIMIT = 100
+PACKS_LIMIT = 10
+# Objects of a repository are counted again at most once a day
+CHECK_INTERVAL = 24 * 3600.0
+# Stale remote-tracking refs are pruned at most once a week, it needs the network
+PRUNE_INTERVAL = 7 * 24 * 3600.0
+# Maintenance starts once no operation ran for that long
+IDLE_DELAY = 60.0
+# Keeps repacks to a single core and a bounded amount of memory
+_LOW_PRIORITY_CONFIG = ["pack.threads=1", "pack.windowMemory=64m"]
+# Packs rewritten by an incremental repack add up to 2 GB at most, like `git maintenance`
+_MAX_REPACK_BATCH_SIZE = 2**31 - 1
+
+
+@dataclass
+class RepoHealth:
+    """RepoHealth is what `git count-objects` and the objects directory tell"""
+
+    loose_objects: int
+    packs: int
+    size: int  # bytes of loose objects and packs
+    has_commit_graph: bool
+    has_multi_pack_index: bool
+
+
+@dataclass
+class MaintenanceReport:
+    health: RepoHealth
+    tasks: List[str] = field(default_factory=list)
+
+
+def repo_health(repo: "Repo") -> RepoHealth:
+    counts: Dict[str, int] = {}
+    for line in repo.git.count_objects("-v").splitlines():
+        key, _, value = line.partition(":")
+        if value.strip().isdigit():
+            counts[key] = int(value)
+    info_dir = Path(repo.git_dir) / "objects" / "info"
+    return RepoHealth(
+        loose_objects=counts.get("count", 0),
+        packs=counts.get("packs", 0),
+        size=(counts.get("size", 0) + counts.get("size-pack", 0)) * 1024,
+        has_commit_graph=(
+            (info_dir / "commit-graph").exists()
+            or (info_dir / "commit-graphs" / "commit-graph-chain").exists()
+        ),
+        has_multi_pack_index=(
+            Path(repo.git_dir) / "objects" / "pack" / "multi-pack-index"
+        ).exists(),
+    )
+
+
+def maintenance_tasks(
+    health: RepoHealth,
+    state: Optional[MaintenanceState],
+    now: float,
+    prune: bool = True,
+) -> List[str]:
+    """
+    Returns the tasks `health` calls for, in the order they should run.
+    Without `prune`, stale remote-tracking refs are kept.
+    """
+    tasks = []
+    if health.loose_objects >= LOOSE_OBJECTS_LIMIT:
+        tasks.append("loose-objects")
+    if health.packs >= PACKS_LIMIT:
+        tasks.append("incremental-repack")
+    elif health.packs >= 2 and not health.has_multi_pack_index:
+        tasks.append("multi-pack-index")
+    if len(tasks) > 0 or not health.has_commit_graph:
+        tasks.append("commit-graph")
+    if prune and (
+        state is None
+        or state.pruned_at is None
+        or now - state.pruned_at >= PRUNE_INTERVAL
+    ):
+        tasks.append("prune-remote")
+    return tasks
+
+
+def _pack_loose_objects(repo: "Repo") -> None:
+    # Without -a, only the loose objects go to a new pack, the others are kept
+    repo.git(c=_LOW_PRIORITY_CONFIG).repack("-d", "-l", "-q")
+
+
+def _incremental_repack(repo: "Repo") -> None:
+    git = repo.git
+    git(c=_LOW_PRIORITY_CONFIG).multi_pack_index("write")
+    batch_size = f"--batch-size={_repack_batch_size(repo)}"
+    git(c=_LOW_PRIORITY_CONFIG).multi_pack_index("repack", batch_size)
+    git(c=_LOW_PRIORITY_CONFIG).multi_pack_index("expire")
+
+
+def _repack_batch_size(repo: "Repo") -> int:
+    """
+    One more than the second largest pack, like `git maintenance`: the largest
+    pack (usually the clone) is never rewritten, the small ones get combined
+    """
+    pack_dir = Path(repo.git_dir) / "objects" / "pack"
+    sizes = sorted((path.stat().st_size for path in pack_dir.glob("*.pack")))
+    second_largest = sizes[-2] if len(sizes) >= 2 else 0
+    return min(second_largest + 1, _MAX_REPACK_BATCH_SIZE)
+
+
+def _write_multi_pack_index(repo: "Repo") -> None:
+    repo.git.multi_pack_index("write")
+
+
+def _write_commit_graph(repo: "Repo") -> None:
+    repo.git.commit_graph("write", "--reachable", "--split")
+
+
+def _prune_remote(repo: "Repo") -> None:
+    url = repo.remote().url
+    remote_policy.run(
+        url, lambda options: repo.git.remote("prune", "origin", **options)
+    )
+
+
+_TASKS: Dict[str, Callable[["Repo"], None]] = {
+    "loose-objects": _pack_loose_objects,
+    "incremental-repack": _incremental_repack,
+    "multi-pack-index": _write_multi_pack_index,
+    "commit-graph": _write_commit_graph,
+    "prune-remote": _prune_remote,
+}
+
+
+def maintain_addon(
+    addon: Addon,
+    yield_to_others: bool = True,
+    clock: Callable[[], float] = time.time,
+) -> Operation:
+    """
+    Runs the maintenance `addon` needs. With `yield_to_others`, the operation
+    stops between tasks as soon as any other operation is waiting.
+    """
+
+    def job(operation: Operation) -> MaintenanceReport:
+        from git import Repo
+
+        repo = Repo(addon.dir_path)
+        now = clock()
+        state = _maintenance_state(addon.dir_path)
+        health = repo_health(repo)
+        tasks = maintenance_tasks(health, state, now)
+        if prefetcher.is_due(addon):
+            tasks.insert(0, "prefetch")
+        pruned_at = state.pruned_at if state is not None else None
+        done = []
+        for task in tasks:
+            operation.raise_if_cancelled()
+            if yield_to_others and operation_coordinator.queued() > 0:
+                raise OperationCancelledError(
+                    f"maintenance of {addon.name} yielded to other operations"
+                )
+            try:
+                if task == "prefetch":
+                    prefetcher.prefetch(addon)
+                else:
+                    _TASKS[task](repo)
+            except RemoteUnreachableError as e:
+                # The remote may be down for a while, the local tasks still run
+                logger.warning(f"Couldn't {task.replace('-', ' ')} {addon.name}: {e}")
+                continue
+            _maintenance_tasks.inc(task=task)
+            done.append(task)
+            if task == "prune-remote":
+                pruned_at = now
+        if any(task not in ["prefetch", "prune-remote"] for task in done):
+            health = repo_health(repo)
+        _save_state(addon.dir_path, health, state, now, done, pruned_at)
+        return MaintenanceReport(health=health, tasks=done)
+
+    return operation_coordinator.submit(addon, ("maintenance",), job)
+
+
+def maintain_mirror(
+    path: Path,
+    yield_to_others: bool = True,
+    clock: Callable[[], float] = time.time,
+) -> MaintenanceReport:
+    """
+    Runs the maintenance the mirror at `path` needs, while no fetch or clone uses
+    it. Repositories borrowing from a mirror may need any of its objects: its local
+    tasks never drop one, and its refs aren't pruned either.
+    """
+    from git import Repo
+
+    repo = Repo(path)
+    done: List[str] = []
+    with mirror_store.url_lock(repo.remote().url):
+        now = clock()
+        state = _maintenance_state(str(path))
+        health = repo_health(repo)
+        for task in maintenance_tasks(health, state, now, prune=False):
+            if yield_to_others and operation_coordinator.queued() > 0:
+                raise OperationCancelledError(
+                    f"maintenance of {path.name} yielded to other operations"
+                )
+            _TASKS[task](repo)
+            _maintenance_tasks.inc(task=task)
+            done.append(task)
+        if len(done) > 0:
+            health = repo_health(repo)
+        _save_state(str(path), health, state, now, done, None)
+    return MaintenanceReport(health=health, tasks=done)
+
+
+def _save_state(
+    dir_path: str,
+    health: RepoHealth,
+    state: Optional[MaintenanceState],
+    now: float,
+    done: List[str],
+    pruned_at: Optional[float],
+) -> None:
+    state_store.save_maintenance(
+        MaintenanceState(
+            dir_path=dir_path,
+            loose_objects=health.loose_objects,
+            packs=health.packs,
+            size=health.size,
+            checked_at=now,
+            maintained_at=now if len(done) > 0 else _maintained_at(state),
+            pruned_at=pruned_at,
+        )
+    )
+
+
+def _maintenance_state(dir_path: str) -> Optional[MaintenanceState]:
+    states = state_store.maintenance_states(dir_path)
+    return states[0] if len(states) > 0 else None
+
+
+def _maintained_at(state: Optional[MaintenanceState]) -> Optional[float]:
+    return state.maintained_at if state is not None else None
+
+
+class MaintenanceScheduler:
+    """
+    MaintenanceScheduler keeps the git repositories of addons in shape.
+
+    Repeated fetches leave loose objects and packs behind, which slows down every
+    later git command. When no operation ran for `IDLE_DELAY` seconds, repositories
+    not checked for `CHECK_INTERVAL` (or due for a prefetch of their branches) are
+    maintained one per `poll_interval`, the least recently checked first: loose
+    objects are packed, packs are consolidated through a multi-pack-index, the
+    commit-graph is written and stale remote-tracking refs are pruned. Once no
+    addon is due, the mirrors of `MirrorStore` get the same local tasks, without
+    pruning. Maintenance runs from its own thread, never takes more than one
+    worker, and stops between tasks as soon as another operation is waiting. It
+    can be paused like update checks.
+    """
+
+    def __init__(
+        self,
+        idle_delay: float = IDLE_DELAY,
+        poll_interval: float = 10.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.idle_delay = idle_delay
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._addons: Dict[str, Addon] = {}
+        self._pause_reasons: Set[str] = set()
+        self._idle_since: Optional[float] = None
+        self._stopped = threading.Event()
+
+    ### Addons
+
+    def add_addons(self, addons: List[Addon]) -> None:
+        with self._lock:
+            for addon in addons:
+                if addon.is_git:
+                    self._addons.setdefault(addon.dir_path, addon)
+
+    def remove_addons(self, addons: List[Addon]) -> None:
+        with self._lock:
+            for addon in addons:
+                self._addons.pop(addon.dir_path, None)
+
+    def due_addons(self) -> List[Addon]:
+        """Returns the addons due for maintenance, the least recently checked first"""
+        now = self._clock()
+        checked_at = self._checked_at()
+        with self._lock:
+            addons = list(self._addons.values())
+        due = [
+            addon
+            for addon in addons
+            if now - checked_at.get(addon.dir_path, 0.0) >= CHECK_INTERVAL
+            or prefetcher.is_due(addon)
+        ]
+        return sorted(due, key=lambda addon: checked_at.get(addon.dir_path, 0.0))
+
+    def due_mirrors(self) -> List[Path]:
+        """Returns the mirrors due for maintenance, the least recently checked first"""
+        now = self._clock()
+        checked_at = self._checked_at()
+        due = [
+            path
+            for path in mirror_store.mirrors()
+            if now - checked_at.get(str(path), 0.0) >= CHECK_INTERVAL
+        ]
+        return sorted(due, key=lambda path: checked_at.get(str(path), 0.0))
+
+    def _checked_at(self) -> Dict[str, float]:
+        return {
+            state.dir_path: state.checked_at
+            for state in state_store.maintenance_states()
+        }
+
+    ### Pause
+
+    def pause(self, reason: str) -> None:
+        with self._lock:
+            self._pause_reasons.add(reason)
+        logger.info(f"Maintenance paused ({reason})")
+
+    def resume(self, reason: str) -> None:
+        with self._lock:
+            self._pause_reasons.discard(reason)
+
+    def is_paused(self) -> bool:
+        return len(self._pause_reasons) > 0
+
+    ### Loop
+
+    def start(self) -> None:
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def is_idle(self) -> bool:
+        """Tells whether no operation ran for `idle_delay` seconds"""
+        now = self._clock()
+        if operation_coordinator.queued() > 0 or operation_coordinator.running() > 0:
+            self._idle_since = None
+            return False
+        if self._idle_since is None:
+            self._idle_since = now
+        return now - self._idle_since >= self.idle_delay
+
+    def run_next(self) -> Optional[Addon]:
+        """
+        Maintains the next due addon if idle, and returns it once done.
+        Without any due addon, maintains the next due mirror instead.
+        """
+        if self.is_paused() or not self.is_idle():
+            return None
+        due = self.due_addons()
+        if len(due) == 0:
+            self._maintain_next_mirror()
+            return None
+        addon = due[0]
+        try:
+            report = maintain_addon(addon, clock=self._clock).result()
+            if len(report.tasks) > 0:
+                logger.info(f"Maintained {addon.name}: {', '.join(report.tasks)}")
+        except OperationCancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Maintenance of {addon.name} failed: {e}")
+            self._postpone(addon.dir_path)
+        return addon
+
+    def _maintain_next_mirror(self) -> None:
+        due = self.due_mirrors()
+        if len(due) == 0:
+            return
+        path = due[0]
+        try:
+            report = maintain_mirror(path, clock=self._clock)
+            if len(report.tasks) > 0:
+                logger.info(f"Maintained {path.name}: {', '.join(report.tasks)}")
+        except OperationCancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Maintenance of {path.name} failed: {e}")
+            self._postpone(str(path))
+
+    def _postpone(self, dir_path: str) -> None:
+        # Not retried before the next interval
+        state = _maintenance_state(dir_path)
+        if state is None:
+            state = MaintenanceState(dir_path, 0, 0, 0, 0.0, None, None)
+        state_store.save_maintenance(replace(state, checked_at=self._clock()))
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            self.run_next()
+
+
+_maintenance_tasks = metrics.counter(
+    "pykek_maintenance_tasks_total", "Git maintenance tasks run, by task"
+)
@@ -0,0 +1,375 @@
+"""
+Runtime metrics of the backend: counters, gauges and histograms.
+
+Metrics are always collected, they only cost a lock and a few additions. They
+are shown on the diagnostics page of the app, and can be written as a Prometheus
+text file with the `PYKEK_METRICS=<path>` environment variable or with
+`pykek --metrics <path>`: the file is rewritten every `EXPORT_INTERVAL` seconds
+and at exit.
+"""
+
+import atexit
+from collections import deque
+import math
+import os
+from pathlib import Path
+import sys
+import threading
+from typing import Callable, Deque, Dict, List, Optional, Tuple, TypeVar, cast
+
+METRICS_ENV_VAR = "PYKEK_METRICS"
+EXPORT_INTERVAL = 15.0
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Labels, float]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Sample]:
+        return []
+
+    def reset(self) -> None:
+        pass
+
+
+class Counter(Metric):
+    """Counter is a value that only goes up, e.g. a number of finished operations"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values = {}
+
+
+class Gauge(Metric):
+    """
+    Gauge is a value that goes up and down. When a function is given, it is called
+    on collection instead, and the gauge is left out when it returns None.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        function: Optional[Callable[[], Optional[float]]] = None,
+    ) -> None:
+        super().__init__(name, help)
+        self._function = function
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: object) -> Optional[float]:
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._values.get(_labels(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [(self.name, (), value)]
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values = {}
+
+
+class Histogram(Metric):
+    """
+    Histogram counts observations (e.g. durations in seconds) in buckets, and keeps
+    the latest `window` observations of each label set to compute quantiles.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        window: int = 1024,
+    ) -> None:
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.window = window
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+        self._recent: Dict[Labels, Deque[float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+            self._recent.setdefault(key, deque(maxlen=self.window)).append(value)
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            return sum(self._counts.get(_labels(labels), []))
+
+    def quantile(self, q: float, **labels: object) -> Optional[float]:
+        """Returns the `q` quantile of the latest observations, None without any"""
+        with self._lock:
+            recent = sorted(self._recent.get(_labels(labels), []))
+        if len(recent) == 0:
+            return None
+        return recent[min(int(len(recent) * q), len(recent) - 1)]
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [dict(key) for key in self._counts]
+
+    def samples(self) -> List[Sample]:
+        samples: List[Sample] = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    samples.append(
+                        (f"{self.name}_bucket", key + (("le", le),), cumulative)
+                    )
+                samples.append((f"{self.name}_sum", key, self._sums[key]))
+                samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = {}
+            self._sums = {}
+            self._recent = {}
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class MetricsRegistry:
+    """MetricsRegistry holds the metrics of the process, by name"""
+
+    def __init__(self) -> None:
+        self.path: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+        self._exporter: Optional[threading.Thread] = None
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        function: Optional[Callable[[], Optional[float]]] = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, help, function))
+
+    def histogram(
+        self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def reset(self) -> None:
+        """Clears the values of every metric. Mostly used for testing purpose."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def prometheus_text(self) -> str:
+        """Returns every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Optional[Path] = None) -> None:
+        """Writes every metric to `path`, atomically so scrapers never read half a file"""
+        path = path or self.path
+        if path is None:
+            return
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def start_export(self, path: Path, interval: float = EXPORT_INTERVAL) -> None:
+        """Writes the metrics to `path` every `interval` seconds and at exit"""
+        with self._lock:
+            self.path = path
+            if self._exporter is not None:
+                return
+            self._exporter = threading.Thread(
+                target=self._export_periodically, args=[interval], daemon=True
+            )
+            self._exporter.start()
+        atexit.register(self.write_prometheus)
+
+    def _export_periodically(self, interval: float) -> None:
+        stopped = threading.Event()
+        while not stopped.wait(interval):
+            try:
+                self.write_prometheus()
+            except OSError:
+                pass
+
+    def _register(self, metric: M) -> M:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric):
+            raise ValueError(f"{metric.name} is already a {existing.kind}")
+        return cast(M, existing)
+
+
+def _format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ""
+    pairs = []
+    for key, value in labels:
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+metrics = MetricsRegistry()
+
+### Caches
+
+_cache_lookups = metrics.counter(
+    "pykek_cache_lookups_total", "Lookups of the backend caches, by cache and result"
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    _cache_lookups.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def cache_hit_rates() -> Dict[str, float]:
+    """Returns the hit rate of every cache looked up so far"""
+    lookups: Dict[str, Dict[str, float]] = {}
+    for _, labels, value in _cache_lookups.samples():
+        label = dict(labels)
+        lookups.setdefault(label["cache"], {})[label["result"]] = value
+    return {
+        cache: results.get("hit", 0.0) / sum(results.values())
+        for cache, results in lookups.items()
+    }
+
+
+### Process
+
+
+def _rss_bytes() -> Optional[float]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows has neither /proc nor getrusage()
+        return None
+    # Not Linux, fall back to the peak RSS (in bytes on macOS)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _git_processes() -> Optional[float]:
+    """Returns the number of git child processes alive, None when unknown"""
+    if not os.path.isdir("/proc"):
+        return None
+    pid = str(os.getpid())
+    count = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # pid (comm) state ppid ..., comm may contain spaces
+        comm = stat[stat.find("(") + 1 : stat.rfind(")")]
+        ppid = stat[stat.rfind(")") + 2 :].split()[1]
+        if ppid == pid and comm.startswith("git"):
+            count += 1
+    return count
+
+
+metrics.gauge(
+    "pykek_resident_memory_bytes", "Resident memory of the process", _rss_bytes
+)
+metrics.gauge("pykek_git_processes", "Git subprocesses alive", _git_processes)
+
+if os.environ.get(METRICS_ENV_VAR):
+    metrics.start_export(Path(os.environ[METRICS_ENV_VAR]))
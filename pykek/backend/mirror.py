@@ -0,0 +1,140 @@
+import hashlib
+import os
+from pathlib import Path
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+from pykek.log import logger
+import platformdirs
+from pykek.backend.metrics import record_cache_lookup
+from pykek.backend.transfer import TransferListener
+from pykek.backend.remote import (
+    RemoteUnreachableError,
+    normalize_remote_url,
+    remote_policy,
+)
+
+if TYPE_CHECKING:
+    from git import Repo
+
+
+class MirrorStore:
+    """
+    MirrorStore maintains a central bare mirror per upstream repository.
+
+    Addon repositories borrow their objects from the mirror through git alternates,
+    so the history of an upstream is stored once whatever the number of instances
+    it is installed in. Mirrors also act as a local cache for (re)installs.
+    """
+
+    def __init__(self, root: Path, enabled: bool = False) -> None:
+        self.root = root
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+
+    def mirror_path(self, url: str) -> Path:
+        normalized = normalize_remote_url(url)
+        digest = hashlib.sha1(normalized.encode()).hexdigest()[:12]
+        name = normalized.rsplit("/", 1)[-1] or "repo"
+        return self.root / f"{name}-{digest}.git"
+
+    def has_mirror(self, url: str) -> bool:
+        return self.mirror_path(url).exists()
+
+    def ensure(self, url: str, listener: Optional[TransferListener] = None) -> Path:
+        """Creates the mirror of `url` if needed, or updates it from the network"""
+        from git import Repo
+
+        path = self.mirror_path(url)
+        with self.url_lock(url):
+            record_cache_lookup("mirror", hit=path.exists())
+            if path.exists():
+                remote_policy.fetch(Repo(path), listener=listener)
+            else:
+                os.makedirs(self.root, exist_ok=True)
+                logger.info(f"Creating mirror of {url} in {path}")
+                remote_policy.clone(url, str(path), "--mirror", listener=listener)
+                mirror = Repo(path)
+                # Borrowing repositories rely on the mirror objects never being pruned
+                with mirror.config_writer() as writer:
+                    writer.set_value("gc", "auto", 0)
+                    writer.set_value("gc", "pruneExpire", "never")
+        return path
+
+    def update(self, url: str, listener: Optional[TransferListener] = None) -> Path:
+        return self.ensure(url, listener)
+
+    def is_borrowing(self, repo: "Repo", url: str) -> bool:
+        alternates_path = Path(repo.git_dir, "objects", "info", "alternates")
+        if not alternates_path.exists():
+            return False
+        objects_path = str(self.mirror_path(url) / "objects")
+        return objects_path in alternates_path.read_text().splitlines()
+
+    def borrow(self, repo: "Repo", url: str) -> None:
+        """
+        Makes `repo` borrow its objects from the mirror of `url`
+        and drops the local copies of the objects the mirror already has.
+        """
+        if self.is_borrowing(repo, url):
+            return
+        objects_path = self.mirror_path(url) / "objects"
+        if not objects_path.exists():
+            return
+        alternates_path = Path(repo.git_dir, "objects", "info", "alternates")
+        os.makedirs(alternates_path.parent, exist_ok=True)
+        with open(alternates_path, "a") as f:
+            f.write(f"{objects_path}\n")
+            f.close()
+        repo.git.repack("-a", "-d", "-l", "-q")
+        logger.info(f"{repo.working_dir} now borrows objects from {objects_path}")
+
+    def clone(
+        self, url: str, target_dir: str, listener: Optional[TransferListener] = None
+    ) -> "Repo":
+        """
+        Clones `url` into `target_dir` from its mirror, sharing the mirror objects.
+
+        When a mirror already exists the clone is made from it first and then
+        fast-forwarded from upstream, so that it still succeeds when offline.
+        """
+        from git import GitCommandError, Repo
+
+        mirror_path = self.mirror_path(url)
+        had_mirror = mirror_path.exists()
+        if not had_mirror:
+            self.ensure(url, listener)
+        repo = Repo.clone_from(str(mirror_path), target_dir, shared=True)
+        repo.remote().set_url(url)
+        if had_mirror:
+            try:
+                self._fast_forward(repo, url)
+            except (GitCommandError, RemoteUnreachableError) as e:
+                logger.warning(
+                    f"Couldn't reach {url}, installed from local mirror: {e}"
+                )
+        return repo
+
+    def _fast_forward(self, repo: "Repo", url: str) -> None:
+        mirror_path = self.ensure(url)
+        repo.git.fetch(str(mirror_path), "+refs/heads/*:refs/remotes/origin/*")
+        repo.git.merge("--ff-only", f"origin/{repo.active_branch.name}")
+
+    def mirrors(self) -> List[Path]:
+        """Returns the paths of the existing mirrors"""
+        if not self.root.exists():
+            return []
+        return sorted(self.root.glob("*.git"))
+
+    def url_lock(self, url: str) -> threading.Lock:
+        """Held while the mirror of `url` is created, fetched or maintained"""
+        key = normalize_remote_url(url)
+        with self._lock:
+            if key not in self._url_locks:
+                self._url_locks[key] = threading.Lock()
+            return self._url_locks[key]
+
+
+mirror_store = MirrorStore(
+    Path(os.path.join(platformdirs.user_data_path(appname="pykek"), "mirrors"))
+)
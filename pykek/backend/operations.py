@@ -0,0 +1,273 @@
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.history import HistoryEntry
+from pykek.backend.metrics import metrics
+from pykek.backend.prefetch import prefetcher
+from pykek.backend.remote import RemoteUnreachableError
+from pykek.backend.scheduler import scheduler
+from pykek.backend.timings import timings
+from pykek.log import logger
+
+
+class OperationCancelledError(Exception):
+    pass
+
+
+@dataclass(eq=False)
+class Operation:
+    """
+    Operation is a git operation requested on an addon.
+
+    Its job gets the operation itself, so that long jobs can call
+    `raise_if_cancelled()` between steps.
+    """
+
+    addon: Addon
+    key: Tuple[Any, ...]
+    job: Callable[["Operation"], Any]
+    future: Future = field(default_factory=Future)
+    _cancel_requested: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def name(self) -> str:
+        return self.key[0]
+
+    def cancel(self) -> None:
+        """Cancels the operation if it is queued, or asks the running job to stop"""
+        self._cancel_requested.set()
+        self.future.cancel()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_requested.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.is_cancelled():
+            raise OperationCancelledError(f"{self.name} on {self.addon.name} cancelled")
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        return self.future.result(timeout)
+
+
+@dataclass
+class _AddonQueue:
+    pending: Deque[Operation] = field(default_factory=deque)
+    running: Optional[Operation] = None
+
+
+class OperationCoordinator:
+    """
+    OperationCoordinator runs the git operations of addons.
+
+    Operations on the same addon are serialized, identical requests are coalesced
+    into the operation already queued or running, and operations can be cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._queues: Dict[str, _AddonQueue] = {}
+
+    def submit(
+        self, addon: Addon, key: Tuple[Any, ...], job: Callable[[Operation], Any]
+    ) -> Operation:
+        with self._lock:
+            queue = self._queues.setdefault(addon.dir_path, _AddonQueue())
+            for operation in self._operations(queue):
+                if operation.key == key and not operation.is_cancelled():
+                    return operation
+            operation = Operation(addon=addon, key=key, job=job)
+            queue.pending.append(operation)
+            if queue.running is None and len(queue.pending) == 1:
+                # Operations of each instance get their share of the workers
+                instance = os.path.normpath(Path(addon.dir_path).parent.parent.parent)
+                scheduler.submit_to(instance, self._drain, addon.dir_path)
+            return operation
+
+    def operations(self, addon: Addon) -> List[Operation]:
+        """Returns the running and queued operations of `addon`"""
+        with self._lock:
+            queue = self._queues.get(addon.dir_path)
+            return self._operations(queue) if queue is not None else []
+
+    def cancel(self, addon: Addon, names: Optional[List[str]] = None) -> None:
+        """Cancels the operations of `addon`, or only the ones named `names`"""
+        for operation in self.operations(addon):
+            if names is None or operation.name in names:
+                operation.cancel()
+
+    def queued(self) -> int:
+        with self._lock:
+            return sum(len(queue.pending) for queue in self._queues.values())
+
+    def running(self) -> int:
+        with self._lock:
+            return sum(queue.running is not None for queue in self._queues.values())
+
+    def _operations(self, queue: _AddonQueue) -> List[Operation]:
+        running = [queue.running] if queue.running is not None else []
+        return running + list(queue.pending)
+
+    def _drain(self, dir_path: str) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[dir_path]
+                if len(queue.pending) == 0:
+                    queue.running = None
+                    del self._queues[dir_path]
+                    return
+                operation = queue.pending.popleft()
+                queue.running = operation
+            if not operation.future.set_running_or_notify_cancel():
+                _finished_operations.inc(operation=operation.name, result="cancelled")
+                continue
+            started_at = time.monotonic()
+            try:
+                result = operation.job(operation)
+                duration = time.monotonic() - started_at
+                timings.record(dir_path, operation.name, duration)
+                _finished_operations.inc(operation=operation.name, result="ok")
+                operation.future.set_result(result)
+            except OperationCancelledError as e:
+                logger.info(str(e))
+                _finished_operations.inc(operation=operation.name, result="cancelled")
+                operation.future.set_exception(e)
+            except Exception as e:
+                logger.error(f"{operation.name} failed for {operation.addon.name}: {e}")
+                _finished_operations.inc(operation=operation.name, result="error")
+                self._settle(operation.addon, e)
+                operation.future.set_exception(e)
+            finally:
+                _operation_durations.observe(
+                    time.monotonic() - started_at, operation=operation.name
+                )
+
+    def _settle(self, addon: Addon, error: Exception) -> None:
+        """Takes `addon` out of LOADING after a failed job, rows would spin forever"""
+        if addon.current_status != AddonStatus.LOADING:
+            return
+        if isinstance(error, RemoteUnreachableError):
+            addon.set_status(AddonStatus.UNREACHABLE)
+        else:
+            addon.set_status(AddonStatus.OUTDATED)
+
+
+### Addon operations
+
+
+def check_addon(addon: Addon) -> Operation:
+    def job(operation: Operation) -> None:
+        if addon.current_branch == "":
+            addon.reload_branches()
+        addon.update_status()
+        addon.save_state(checked=True)
+
+    return operation_coordinator.submit(addon, ("check",), job)
+
+
+def update_addon(addon: Addon, refresh_toc: bool = True) -> Operation:
+    def job(operation: Operation) -> None:
+        addon.update()
+        operation.raise_if_cancelled()
+        if refresh_toc:
+            addon.refresh_toc_info()
+        addon.save_state()
+
+    return operation_coordinator.submit(addon, ("update",), job)
+
+
+def check_and_update_addon(addon: Addon) -> Operation:
+    def job(operation: Operation) -> bool:
+        if addon.current_branch == "":
+            addon.reload_branches()
+        addon.update_status()
+        operation.raise_if_cancelled()
+        if addon.current_status != AddonStatus.OUTDATED:
+            addon.save_state(checked=True)
+            return False
+        addon.update()
+        addon.refresh_toc_info()
+        addon.save_state(checked=True)
+        return True
+
+    return operation_coordinator.submit(addon, ("check_and_update",), job)
+
+
+def switch_addon(addon: Addon, branch: str) -> Operation:
+    """Switches `addon` to `branch`, superseding its pending checks and updates"""
+    operation_coordinator.cancel(addon, ["check", "update", "check_and_update"])
+
+    def job(operation: Operation) -> None:
+        # Prefetched branches are caught up locally, without any network access
+        addon.switch_to_branch(branch, fast_forward=prefetcher.enabled)
+        addon.reload_branches()
+        operation.raise_if_cancelled()
+        addon.refresh_toc_info()
+        addon.save_state()
+
+    return operation_coordinator.submit(addon, ("switch", branch), job)
+
+
+def switch_addons(
+    addons: List[Addon], branch: str, author: Optional[str] = None
+) -> List[Operation]:
+    """
+    Switches every git addon of `addons` having `branch` to it, in parallel. With
+    `author`, only the addons whose remote is owned by `author` are switched.
+    Addons already on `branch` are left alone.
+    """
+    operations = []
+    for addon in addons:
+        if not addon.is_git:
+            continue
+        try:
+            if addon.current_branch == "":
+                addon.reload_branches()
+            owner = addon.remote_owner() if author is not None else None
+        except Exception as e:
+            logger.warning(f"Couldn't read {addon.name} branches: {e}")
+            continue
+        if branch not in addon.branches or addon.current_branch == branch:
+            continue
+        if author is not None and (owner or "").casefold() != author.casefold():
+            continue
+        operations.append(switch_addon(addon, branch))
+    return operations
+
+
+def rollback_addon(addon: Addon, entry: Optional[HistoryEntry] = None) -> Operation:
+    """Rolls `addon` back, superseding its pending checks and updates"""
+    operation_coordinator.cancel(addon, ["check", "update", "check_and_update"])
+
+    def job(operation: Operation) -> Optional[HistoryEntry]:
+        rolled_back_to = addon.rollback(entry)
+        operation.raise_if_cancelled()
+        addon.refresh_toc_info()
+        addon.save_state()
+        return rolled_back_to
+
+    key = ("rollback", entry.sha if entry is not None else None)
+    return operation_coordinator.submit(addon, key, job)
+
+
+operation_coordinator = OperationCoordinator()
+
+_finished_operations = metrics.counter(
+    "pykek_operations_total", "Finished addon operations, by operation and result"
+)
+_operation_durations = metrics.histogram(
+    "pykek_operation_duration_seconds", "Duration of addon operations, by operation"
+)
+metrics.gauge(
+    "pykek_operations_queued", "Addon operations waiting", operation_coordinator.queued
+)
+metrics.gauge(
+    "pykek_operations_running",
+    "Addon operations running",
+    operation_coordinator.running,
+)
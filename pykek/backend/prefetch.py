@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict
+
+if TYPE_CHECKING:
+    from pykek.backend.addon import Addon
+
+PREFETCH_INTERVAL = 3600.0
+
+
+class BranchPrefetcher:
+    """
+    BranchPrefetcher keeps every remote branch of addons local when enabled.
+
+    Prefetches run with the background maintenance, in idle time and at most every
+    `interval` seconds per addon. Switching an addon to another branch is then a
+    local checkout of the prefetched branch, without any network access.
+    """
+
+    def __init__(
+        self,
+        interval: float = PREFETCH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.enabled = False
+        self.interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._prefetched_at: Dict[str, float] = {}
+
+    def is_due(self, addon: "Addon") -> bool:
+        if not self.enabled or not addon.is_git:
+            return False
+        with self._lock:
+            prefetched_at = self._prefetched_at.get(addon.dir_path)
+        return prefetched_at is None or self._clock() - prefetched_at >= self.interval
+
+    def prefetch(self, addon: "Addon") -> None:
+        try:
+            addon.prefetch()
+        finally:
+            # Failed prefetches wait for the next interval too
+            with self._lock:
+                self._prefetched_at[addon.dir_path] = self._clock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._prefetched_at = {}
+
+
+prefetcher = BranchPrefetcher()
@@ -0,0 +1,276 @@
+from dataclasses import dataclass
+import os
+import random
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, TypeVar
+from pykek.log import logger
+from pykek.backend.transfer import (
+    TransferListener,
+    TransferProgressParser,
+    record_transfer,
+)
+
+if TYPE_CHECKING:
+    from git import Git, Repo
+
+T = TypeVar("T")
+
+
+def normalize_remote_url(url: str) -> str:
+    """
+    Normalizes a git remote URL so that different spellings
+    of the same repository share the same key.
+    """
+    normalized = url.strip()
+    scp_like = re.match(r"^(?:[^@/]+@)?([^:/]+):(?!//)(.*)$", normalized)
+    if scp_like:
+        normalized = f"{scp_like.group(1)}/{scp_like.group(2)}"
+    else:
+        normalized = re.sub(r"^[a-zA-Z][a-zA-Z0-9+.-]*://", "", normalized)
+        normalized = re.sub(r"^[^@/]+@", "", normalized)
+    normalized = normalized.rstrip("/").removesuffix(".git").rstrip("/")
+    host, sep, path = normalized.partition("/")
+    return f"{host.lower()}{sep}{path}"
+
+
+def remote_host(url: str) -> str:
+    """Returns the host of a git remote URL, or the path of a local repository"""
+    normalized = normalize_remote_url(url)
+    host = normalized.partition("/")[0]
+    return host or normalized
+
+
+def remote_owner(url: str) -> Optional[str]:
+    """
+    Returns the owner of a git remote URL, e.g. the author of
+    `https://github.com/author/MyAddon`, None when the URL has no owner
+    """
+    segments = normalize_remote_url(url).split("/")
+    if len(segments) < 3 or segments[-2] == "":
+        return None
+    return segments[-2]
+
+
+# Errors telling that the host can't be reached right now: the only ones counting
+# towards its cool-down
+_TRANSIENT_ERRORS = re.compile(
+    r"could not resolve host|temporary failure in name resolution|timed out"
+    r"|timeout|connection refused|connection reset|network is unreachable"
+    r"|no route to host|failed to connect|operation too slow|early eof"
+    r"|remote end hung up|returned error: 5\d\d",
+    re.IGNORECASE,
+)
+# Errors that retrying won't fix: the repository is gone or needs credentials
+_PERMANENT_ERRORS = re.compile(
+    r"not found|does not appear to be a git repository|authentication failed"
+    r"|could not read (?:username|password)|terminal prompts disabled"
+    r"|permission denied|access denied|returned error: 40[134]",
+    re.IGNORECASE,
+)
+
+
+def _is_transient(error: Exception) -> bool:
+    status = getattr(error, "status", None)
+    # Killed after the overall timeout
+    if not isinstance(status, int) or status < 0:
+        return True
+    return _TRANSIENT_ERRORS.search(str(error)) is not None
+
+
+def _is_permanent(error: Exception) -> bool:
+    return not _is_transient(error) and _PERMANENT_ERRORS.search(str(error)) is not None
+
+
+class RemoteUnreachableError(Exception):
+    """Raised when a remote operation failed after retries or its host is in cool-down"""
+
+    pass
+
+
+@dataclass
+class _HostState:
+    semaphore: threading.BoundedSemaphore
+    consecutive_failures: int = 0
+    unreachable_until: float = 0.0
+
+
+class RemotePolicy:
+    """
+    RemotePolicy wraps the git operations reaching a remote (fetch, clone, ls-remote).
+
+    It caps the number of concurrent operations per host, applies connect and
+    overall timeouts, retries failures with exponential backoff and jitter, and
+    marks a host as unreachable for a cool-down period after repeated failures.
+    Only connection errors and timeouts count towards the cool-down, once per
+    operation: a repository that is gone or needs credentials fails right away,
+    without holding back the other repositories of its host.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = 4,
+        connect_timeout: int = 15,
+        timeout: float = 300.0,
+        retries: int = 2,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        failure_threshold: int = 3,
+        cool_down: float = 300.0,
+    ) -> None:
+        self.max_per_host = max_per_host
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+
+    ### Operations
+
+    def fetch(
+        self, repo: "Repo", *args: str, listener: Optional[TransferListener] = None
+    ) -> None:
+        url = repo.remote().url
+        self.run(
+            url,
+            lambda options: self._transfer(
+                repo.git, "fetch", list(args or ["origin"]), url, options, listener
+            ),
+        )
+
+    def clone(
+        self,
+        url: str,
+        target_dir: str,
+        *args: str,
+        listener: Optional[TransferListener] = None,
+    ) -> None:
+        from git import Git
+
+        self.run(
+            url,
+            lambda options: self._transfer(
+                Git(), "clone", [*args, "--", url, target_dir], url, options, listener
+            ),
+        )
+
+    def ls_remote(self, url: str, *args: str) -> str:
+        from git import Git
+
+        return self.run(url, lambda options: Git().ls_remote(*args, url, **options))
+
+    def run(self, url: str, operation: Callable[[Dict[str, Any]], T]) -> T:
+        """
+        Runs `operation` against the host of `url`.
+        `operation` gets the options (env and timeout) to pass to the git command.
+        """
+        from git import GitCommandError
+
+        host = remote_host(url)
+        state = self._host_state(host)
+        attempt = 0
+        while True:
+            if self.is_unreachable(host):
+                raise RemoteUnreachableError(f"{host} is unreachable, skipping {url}")
+            try:
+                with state.semaphore:
+                    result = operation(self._options())
+                self._record_success(state)
+                return result
+            except GitCommandError as e:
+                if _is_permanent(e):
+                    raise RemoteUnreachableError(f"Couldn't reach {url}: {e}") from e
+                if attempt >= self.retries:
+                    if _is_transient(e):
+                        self._record_failure(host, state)
+                    raise RemoteUnreachableError(f"Couldn't reach {url}: {e}") from e
+                delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+                logger.warning(f"{url} failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                attempt += 1
+
+    def _transfer(
+        self,
+        git: "Git",
+        command: str,
+        args: List[str],
+        url: str,
+        options: Dict[str, Any],
+        listener: Optional[TransferListener],
+    ) -> None:
+        """Runs a clone or a fetch, streaming its progress to `listener`"""
+        from git.cmd import handle_process_output
+        from git.util import finalize_process
+
+        parser = TransferProgressParser(listener)
+        started_at = time.monotonic()
+        process = getattr(git, command)(
+            "--progress",
+            *args,
+            as_process=True,
+            with_stdout=False,
+            universal_newlines=True,
+            env=options["env"],
+        )
+        handle_process_output(
+            process,
+            None,
+            parser.feed,
+            decode_streams=False,
+            kill_after_timeout=options["kill_after_timeout"],
+        )
+        finalize_process(process, stderr=parser.error_message())
+        record_transfer(
+            remote_host(url), parser.received_bytes, time.monotonic() - started_at
+        )
+
+    ### Hosts
+
+    def is_unreachable(self, host: str) -> bool:
+        return time.monotonic() < self._host_state(host).unreachable_until
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts = {}
+
+    def _options(self) -> Dict[str, Any]:
+        env = {
+            "GIT_TERMINAL_PROMPT": "0",
+            "GIT_HTTP_LOW_SPEED_LIMIT": "1",
+            "GIT_HTTP_LOW_SPEED_TIME": str(self.connect_timeout),
+        }
+        if "GIT_SSH_COMMAND" not in os.environ:
+            env["GIT_SSH_COMMAND"] = (
+                f"ssh -o ConnectTimeout={self.connect_timeout} -o BatchMode=yes"
+            )
+        return {"kill_after_timeout": self.timeout, "env": env}
+
+    def _host_state(self, host: str) -> _HostState:
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = _HostState(
+                    semaphore=threading.BoundedSemaphore(self.max_per_host)
+                )
+            return self._hosts[host]
+
+    def _record_success(self, state: _HostState) -> None:
+        with self._lock:
+            state.consecutive_failures = 0
+            state.unreachable_until = 0.0
+
+    def _record_failure(self, host: str, state: _HostState) -> None:
+        with self._lock:
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self.failure_threshold:
+                state.unreachable_until = time.monotonic() + self.cool_down
+                logger.warning(
+                    f"{host} marked as unreachable for {self.cool_down:.0f}s"
+                )
+
+
+remote_policy = RemotePolicy()
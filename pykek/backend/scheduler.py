@@ -0,0 +1,84 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+_Job = Tuple[Future, Callable, Tuple[Any, ...], Dict[str, Any]]
+
+
+class Scheduler:
+    """
+    Scheduler runs backend jobs (addons scans, update checks...)
+    on a bounded pool of worker threads shared by every game instance.
+
+    Jobs are queued per group (the game instance they belong to) and workers take
+    the next job from each group in turn, so that a large instance doesn't hold
+    the jobs of the other instances behind all of its own.
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queues: Dict[str, Deque[_Job]] = {}
+        # Groups with queued jobs, the next one to take a job from first
+        self._turns: Deque[str] = deque()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.submit_to("", fn, *args, **kwargs)
+
+    def submit_to(self, group: str, fn: Callable, *args, **kwargs) -> Future:
+        """Queues `fn` in `group`, groups get a fair share of the workers"""
+        future: Future = Future()
+        executor = self._get_executor()
+        with self._lock:
+            queue = self._queues.setdefault(group, deque())
+            if len(queue) == 0:
+                self._turns.append(group)
+            queue.append((future, fn, args, kwargs))
+        # Every job gets a run, which runs whichever job's turn it is
+        executor.submit(self._run_next)
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="pykek"
+                )
+            return self._executor
+
+    def _next_job(self) -> Optional[_Job]:
+        with self._lock:
+            if len(self._turns) == 0:
+                return None
+            group = self._turns.popleft()
+            queue = self._queues[group]
+            job = queue.popleft()
+            if len(queue) > 0:
+                self._turns.append(group)
+            else:
+                del self._queues[group]
+            return job
+
+    def _run_next(self) -> None:
+        # Cancelled jobs are skipped, their own runs will find nothing left
+        while (job := self._next_job()) is not None:
+            future, fn, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return
+
+
+scheduler = Scheduler()
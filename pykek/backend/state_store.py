@@ -0,0 +1,279 @@
+import atexit
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+from pykek.log import logger
+import platformdirs
+
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS addons (
+    dir_path TEXT PRIMARY KEY,
+    instance TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT,
+    branch TEXT,
+    head_sha TEXT,
+    upstream_sha TEXT,
+    status TEXT,
+    version TEXT,
+    checked_at REAL
+);
+CREATE INDEX IF NOT EXISTS addons_instance ON addons (instance);
+CREATE INDEX IF NOT EXISTS addons_status ON addons (status);
+CREATE INDEX IF NOT EXISTS addons_url ON addons (url);
+
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    addon TEXT NOT NULL,
+    action TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    session TEXT NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_addon ON history (addon, id);
+
+CREATE TABLE IF NOT EXISTS timings (
+    id INTEGER PRIMARY KEY,
+    addon TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    duration REAL NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_addon ON timings (addon, operation, id);
+
+CREATE TABLE IF NOT EXISTS maintenance (
+    dir_path TEXT PRIMARY KEY,
+    loose_objects INTEGER NOT NULL,
+    packs INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    checked_at REAL NOT NULL,
+    maintained_at REAL,
+    pruned_at REAL
+);
+"""
+
+
+@dataclass
+class AddonState:
+    dir_path: str
+    instance: str
+    name: str
+    url: Optional[str]
+    branch: Optional[str]
+    head_sha: Optional[str]
+    upstream_sha: Optional[str]
+    status: Optional[str]
+    version: Optional[str]
+    checked_at: Optional[float]
+
+
+@dataclass
+class MaintenanceState:
+    dir_path: str
+    loose_objects: int
+    packs: int
+    size: int  # bytes of loose objects and packs
+    checked_at: float
+    maintained_at: Optional[float]
+    pruned_at: Optional[float]
+
+
+class StateStore:
+    """
+    StateStore persists the runtime state of addons in an embedded SQLite database.
+
+    Writes from any thread are queued and applied by a single writer thread, in
+    one transaction per batch: the writes queued while a batch commits make the
+    next one. Reads go through their own connection: the database is in WAL mode,
+    so they never wait for the writer. Pending writes are flushed first so that a
+    thread reads its own writes, unless the query doesn't need them.
+    """
+
+    def __init__(self, path: Path, batch_size: int = 500) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writes: "queue.Queue[Optional[Tuple[str, Sequence[Any]]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._read_connection: Optional[sqlite3.Connection] = None
+
+    ### Addons
+
+    def save_addon(self, state: AddonState) -> None:
+        self.execute(
+            "INSERT INTO addons VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (dir_path) DO UPDATE SET "
+            "instance = excluded.instance, name = excluded.name, "
+            "url = coalesce(excluded.url, url), "
+            "branch = coalesce(excluded.branch, branch), "
+            "head_sha = coalesce(excluded.head_sha, head_sha), "
+            "upstream_sha = coalesce(excluded.upstream_sha, upstream_sha), "
+            "status = coalesce(excluded.status, status), "
+            "version = excluded.version, "
+            "checked_at = coalesce(excluded.checked_at, checked_at)",
+            (
+                state.dir_path,
+                state.instance,
+                state.name,
+                state.url,
+                state.branch,
+                state.head_sha,
+                state.upstream_sha,
+                state.status,
+                state.version,
+                state.checked_at,
+            ),
+        )
+
+    def addon_states(
+        self,
+        instance: Optional[str] = None,
+        status: Optional[str] = None,
+        url: Optional[str] = None,
+    ) -> List[AddonState]:
+        """Returns the known addons, filtered by instance, status and/or remote"""
+        filters = [("instance", instance), ("status", status), ("url", url)]
+        where = [f"{column} = ?" for column, value in filters if value is not None]
+        params = [value for _, value in filters if value is not None]
+        sql = "SELECT * FROM addons"
+        if len(where) > 0:
+            sql += " WHERE " + " AND ".join(where)
+        return [AddonState(*row) for row in self.query(sql + " ORDER BY name", params)]
+
+    ### Timings
+
+    def record_timing(self, addon: str, operation: str, duration: float) -> None:
+        self.execute(
+            "INSERT INTO timings (addon, operation, duration, time) VALUES (?, ?, ?, ?)",
+            (addon, operation, duration, time.time()),
+        )
+
+    def timings(self, addon: str, operation: str, limit: int = 20) -> List[float]:
+        """Returns the latest durations of `operation` on `addon`, newest first"""
+        rows = self.query(
+            "SELECT duration FROM timings WHERE addon = ? AND operation = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (addon, operation, limit),
+        )
+        return [row[0] for row in rows]
+
+    ### Maintenance
+
+    def save_maintenance(self, state: MaintenanceState) -> None:
+        self.execute(
+            "INSERT OR REPLACE INTO maintenance VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                state.dir_path,
+                state.loose_objects,
+                state.packs,
+                state.size,
+                state.checked_at,
+                state.maintained_at,
+                state.pruned_at,
+            ),
+        )
+
+    def maintenance_states(
+        self, dir_path: Optional[str] = None
+    ) -> List[MaintenanceState]:
+        """Returns the maintenance state of every known repository, or of `dir_path`"""
+        if dir_path is None:
+            rows = self.query("SELECT * FROM maintenance ORDER BY dir_path")
+        else:
+            rows = self.query(
+                "SELECT * FROM maintenance WHERE dir_path = ?", (dir_path,)
+            )
+        return [MaintenanceState(*row) for row in rows]
+
+    ### Queries
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        """Queues a write, applied with the next batch"""
+        self._start_writer()
+        self._writes.put((sql, params))
+
+    def query(
+        self, sql: str, params: Sequence[Any] = (), fresh: bool = True
+    ) -> List[Tuple[Any, ...]]:
+        """Runs a read, after the queued writes unless `fresh` is False"""
+        if fresh:
+            self.flush()
+        with self._read_lock:
+            if self._read_connection is None:
+                self._read_connection = self._connect()
+            return self._read_connection.execute(sql, params).fetchall()
+
+    def flush(self) -> None:
+        """Waits until every queued write is committed"""
+        if self._writer is not None:
+            self._writes.join()
+
+    def close(self) -> None:
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._writes.put(None)
+            writer.join()
+        with self._read_lock:
+            if self._read_connection is not None:
+                self._read_connection.close()
+                self._read_connection = None
+
+    ### Writer
+
+    def _start_writer(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                return
+            connection = self._connect()
+            self._writer = threading.Thread(
+                target=self._write_batches, args=[connection], daemon=True
+            )
+            self._writer.start()
+
+    def _write_batches(self, connection: sqlite3.Connection) -> None:
+        stopped = False
+        while not stopped:
+            batch = [self._writes.get()]
+            # No waiting for more writes, a flush would wait just as long
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stopped = batch[-1] is None
+            writes = [write for write in batch if write is not None]
+            try:
+                with connection:
+                    for sql, params in writes:
+                        connection.execute(sql, params)
+            except sqlite3.Error as e:
+                logger.error(f"Couldn't write {len(writes)} state change(s): {e}")
+            for _ in batch:
+                self._writes.task_done()
+        connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.path.parent, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            connection.executescript(_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return connection
+
+
+state_store = StateStore(
+    Path(os.path.join(platformdirs.user_data_path(appname="pykek"), "state.db"))
+)
+atexit.register(state_store.close)
@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+import statistics
+from typing import Dict, Iterable, List, Optional, Tuple
+from pykek.backend.state_store import StateStore, state_store
+
+
+@dataclass
+class TimingStats:
+    """Rolling statistics of the latest durations of an operation on an addon"""
+
+    addon: str
+    operation: str
+    count: int
+    mean: float
+    p90: float
+    last: float
+
+
+class Timings:
+    """
+    Timings keeps how long fetches, checks, updates and clones take on each addon.
+
+    Durations live in the state store, which only keeps the latest
+    `window` durations of each operation of each addon, so the statistics follow
+    the addons as their repositories grow. They're used to start the slowest jobs
+    first and to estimate how long bulk operations will take.
+    """
+
+    def __init__(self, store: StateStore, window: int = 20) -> None:
+        self.store = store
+        self.window = window
+
+    def record(self, addon: str, operation: str, duration: float) -> None:
+        self.store.record_timing(addon, operation, duration)
+        self.store.execute(
+            "DELETE FROM timings WHERE addon = ? AND operation = ? AND id <= "
+            "(SELECT id FROM timings WHERE addon = ? AND operation = ? "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (addon, operation, addon, operation, self.window),
+        )
+
+    def stats(self, operation: Optional[str] = None) -> List[TimingStats]:
+        """Returns the statistics of every addon, for one or every operation"""
+        sql = "SELECT addon, operation, duration FROM timings"
+        if operation is not None:
+            rows = self.store.query(
+                sql + " WHERE operation = ? ORDER BY id DESC", (operation,)
+            )
+        else:
+            rows = self.store.query(sql + " ORDER BY id DESC")
+        durations: Dict[Tuple[str, str], List[float]] = {}
+        for addon, row_operation, duration in rows:
+            samples = durations.setdefault((addon, row_operation), [])
+            if len(samples) < self.window:
+                samples.append(duration)
+        return [
+            _stats(addon, row_operation, samples)
+            for (addon, row_operation), samples in durations.items()
+        ]
+
+    def slowest(
+        self, operation: Optional[str] = None, limit: int = 10
+    ) -> List[TimingStats]:
+        """Returns the statistics with the highest mean duration first"""
+        stats = sorted(self.stats(operation), key=lambda s: s.mean, reverse=True)
+        return stats[:limit]
+
+    def estimates(self, addons: Iterable[str], operation: str) -> Dict[str, float]:
+        """
+        Returns the expected duration of `operation` on each of `addons`, keyed by
+        addon directory. Addons without recorded durations are expected to take
+        the mean of the others. Returns an empty dict when nothing is known.
+        """
+        means = {s.addon: s.mean for s in self.stats(operation)}
+        addons = list(addons)
+        known = [means[addon] for addon in addons if addon in means]
+        if len(known) == 0:
+            return {}
+        default = statistics.fmean(known)
+        return {addon: means.get(addon, default) for addon in addons}
+
+
+def _stats(addon: str, operation: str, samples: List[float]) -> TimingStats:
+    ordered = sorted(samples)
+    return TimingStats(
+        addon=addon,
+        operation=operation,
+        count=len(samples),
+        mean=statistics.fmean(samples),
+        p90=ordered[min(int(len(ordered) * 0.9), len(ordered) - 1)],
+        last=samples[0],
+    )
+
+
+timings = Timings(state_store)
@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+import re
+import time
+from typing import Callable, List, Optional, Protocol
+from pykek.backend.metrics import metrics
+
+# e.g. "remote: Compressing objects:  50% (1/2)" or
+# "Receiving objects:  45% (450/1000), 1.20 MiB | 2.40 MiB/s"
+_PROGRESS_LINE = re.compile(
+    r"^(?:remote: )?([A-Za-z ]+):\s+(?:(\d+)% \((\d+)/(\d+)\)|(\d+))"
+    r"(?:, ([\d.]+) (bytes|KiB|MiB|GiB))?(?: \| ([\d.]+) (bytes|KiB|MiB|GiB)/s)?"
+)
+_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024**2, "GiB": 1024**3}
+
+
+@dataclass
+class TransferProgress:
+    """Where a clone or a fetch is, as reported by git"""
+
+    phase: str  # e.g. "Receiving objects" or "Resolving deltas"
+    current: int
+    total: Optional[int]
+    received_bytes: int = 0
+    rate: Optional[float] = None  # bytes per second
+    done: bool = False
+
+    def fraction(self) -> Optional[float]:
+        if self.total is None or self.total == 0:
+            return None
+        return self.current / self.total
+
+    def summary(self) -> str:
+        text = f"{self.phase}: {self.current}"
+        if self.total is not None:
+            text += f"/{self.total}"
+        if self.received_bytes > 0:
+            text += f", {_format_bytes(self.received_bytes)}"
+        if self.rate is not None and not self.done:
+            text += f" at {_format_bytes(self.rate)}/s"
+        return text
+
+
+class TransferListener(Protocol):
+    def transfer_did_progress(self, progress: TransferProgress) -> None:
+        pass
+
+
+class TransferProgressParser:
+    """
+    TransferProgressParser reads the `--progress` output of git clone and fetch.
+
+    Progress is reported to the listener at most every `interval` seconds, except
+    for the first and the last update of each phase, so that a big transfer
+    doesn't flood the listener (and the UI main loop behind it). Lines that aren't
+    progress are kept for error messages.
+    """
+
+    def __init__(
+        self,
+        listener: Optional[TransferListener] = None,
+        interval: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.listener = listener
+        self.interval = interval
+        self.other_lines: List[str] = []
+        self.received_bytes = 0
+        self._clock = clock
+        self._last: Optional[TransferProgress] = None
+        self._last_report = 0.0
+
+    def feed(self, line: str) -> None:
+        line = line.rstrip()
+        match = _PROGRESS_LINE.match(line)
+        if match is None:
+            if line != "":
+                self.other_lines.append(line)
+            return
+        phase, _, current, total, count, size, unit, rate, rate_unit = match.groups()
+        progress = TransferProgress(
+            phase=phase,
+            current=int(current if current is not None else count),
+            total=int(total) if total is not None else None,
+            done=line.endswith(", done."),
+        )
+        if size is not None:
+            progress.received_bytes = int(float(size) * _UNITS[unit])
+            self.received_bytes = max(self.received_bytes, progress.received_bytes)
+        elif self._last is not None and self._last.phase == phase:
+            progress.received_bytes = self._last.received_bytes
+        if rate is not None:
+            progress.rate = float(rate) * _UNITS[rate_unit]
+        is_new_phase = self._last is None or self._last.phase != phase
+        self._last = progress
+        now = self._clock()
+        if is_new_phase or progress.done or now - self._last_report >= self.interval:
+            self._report(progress, now)
+
+    def error_message(self) -> str:
+        return "\n".join(self.other_lines)
+
+    def _report(self, progress: TransferProgress, now: float) -> None:
+        self._last_report = now
+        if self.listener is not None:
+            self.listener.transfer_did_progress(progress)
+
+
+### Metrics
+
+_transferred_bytes = metrics.counter(
+    "pykek_transfer_bytes_total", "Bytes received by clones and fetches, by host"
+)
+_transfer_rates = metrics.histogram(
+    "pykek_transfer_rate_bytes_per_second",
+    "Average receive rate of clones and fetches, by host",
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6),
+)
+
+
+def record_transfer(host: str, received_bytes: int, duration: float) -> None:
+    if received_bytes == 0:
+        return
+    _transferred_bytes.inc(received_bytes, host=host)
+    if duration > 0:
+        _transfer_rates.observe(received_bytes / duration, host=host)
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ["bytes", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
@@ -0,0 +1,199 @@
+from concurrent.futures import Future
+from dataclasses import dataclass
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+from pykek.backend.addon import Addon
+from pykek.backend.operations import check_addon
+from pykek.backend.state_store import state_store
+from pykek.backend.timings import timings
+from pykek.log import logger
+
+MIN_INTERVAL = 3600.0
+MAX_INTERVAL = 7 * 24 * 3600.0
+JITTER = 0.1
+
+
+@dataclass
+class _RepoSchedule:
+    addon: Addon
+    interval: float
+    next_check: float
+    upstream_sha: Optional[str] = None
+    is_running: bool = False
+
+
+class UpdateScheduler:
+    """
+    UpdateScheduler periodically re-runs the update check of every git addon.
+
+    The check interval of each repository adapts to how often its upstream changes:
+    it is halved when a check finds new commits and grows otherwise, between
+    `MIN_INTERVAL` (active repos) and `MAX_INTERVAL` (dead repos). Checks are
+    jittered to avoid bursts, limited by a global concurrency budget, and can be
+    paused (e.g. on battery or on a metered connection). Due checks start with the
+    ones that took the longest before.
+    """
+
+    def __init__(
+        self,
+        check: Optional[Callable[[Addon], Future]] = None,
+        max_concurrent_checks: int = 4,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._check = check or (lambda addon: check_addon(addon).future)
+        self._budget = threading.Semaphore(max_concurrent_checks)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._schedules: Dict[str, _RepoSchedule] = {}
+        self._pause_reasons: Set[str] = set()
+        self._wake_up = threading.Event()
+        self._stopped = threading.Event()
+
+    ### Addons
+
+    def add_addons(self, addons: List[Addon]) -> None:
+        now = self._clock()
+        checked_at = {
+            state.dir_path: state.checked_at for state in state_store.addon_states()
+        }
+        schedules = []
+        for addon in addons:
+            if not addon.is_git or addon.dir_path in self._schedules:
+                continue
+            try:
+                if addon.current_branch == "":
+                    addon.reload_branches()
+                interval = _seed_interval(addon.upstream_commit_dates(), now)
+                upstream_sha = addon.upstream_sha()
+            except Exception as e:
+                logger.warning(f"Couldn't read {addon.name} history: {e}")
+                interval, upstream_sha = _seed_interval([], now), None
+            # Addons checked recently, even in a previous run, aren't checked again
+            last_check = min(checked_at.get(addon.dir_path) or now, now)
+            schedules.append(
+                _RepoSchedule(
+                    addon=addon,
+                    interval=interval,
+                    next_check=last_check + _jittered(interval),
+                    upstream_sha=upstream_sha,
+                )
+            )
+        with self._lock:
+            for schedule in schedules:
+                self._schedules.setdefault(schedule.addon.dir_path, schedule)
+        self._wake_up.set()
+
+    def remove_addons(self, addons: List[Addon]) -> None:
+        with self._lock:
+            for addon in addons:
+                self._schedules.pop(addon.dir_path, None)
+
+    def interval(self, addon: Addon) -> Optional[float]:
+        schedule = self._schedules.get(addon.dir_path)
+        return schedule.interval if schedule is not None else None
+
+    ### Pause
+
+    def pause(self, reason: str) -> None:
+        with self._lock:
+            self._pause_reasons.add(reason)
+        logger.info(f"Update checks paused ({reason})")
+
+    def resume(self, reason: str) -> None:
+        with self._lock:
+            self._pause_reasons.discard(reason)
+        self._wake_up.set()
+
+    def is_paused(self) -> bool:
+        return len(self._pause_reasons) > 0
+
+    ### Loop
+
+    def start(self) -> None:
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake_up.set()
+
+    def run_due_checks(self) -> List[Addon]:
+        """Starts the checks that are due, within the concurrency budget"""
+        if self.is_paused():
+            return []
+        now = self._clock()
+        started = []
+        with self._lock:
+            due = [s for s in self._schedules.values() if s.next_check <= now]
+        if len(due) == 0:
+            return []
+        # Longest checks first, so that a slow repository doesn't end a round alone
+        expected = timings.estimates([s.addon.dir_path for s in due], "check")
+        due.sort(key=lambda s: (-expected.get(s.addon.dir_path, 0.0), s.next_check))
+        with self._lock:
+            for schedule in due:
+                if schedule.is_running or not self._budget.acquire(blocking=False):
+                    continue
+                schedule.is_running = True
+                started.append(schedule.addon)
+        for addon in started:
+            schedule = self._schedules[addon.dir_path]
+            future = self._check(addon)
+            future.add_done_callback(lambda f, s=schedule: self._on_check_done(s, f))
+        return started
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.run_due_checks()
+            self._wake_up.clear()
+            self._wake_up.wait(self._seconds_until_next_check())
+
+    def _seconds_until_next_check(self) -> float:
+        with self._lock:
+            next_checks = [s.next_check for s in self._schedules.values()]
+        if len(next_checks) == 0 or self.is_paused():
+            return 60.0
+        return min(max(min(next_checks) - self._clock(), 1.0), 60.0)
+
+    def _on_check_done(self, schedule: _RepoSchedule, future: Future) -> None:
+        try:
+            future.result()
+            self.record_check(schedule.addon, schedule.addon.upstream_sha())
+        except Exception as e:
+            logger.error(f"Scheduled check of {schedule.addon.name} failed: {e}")
+            with self._lock:
+                schedule.next_check = self._clock() + _jittered(schedule.interval)
+        finally:
+            schedule.is_running = False
+            self._budget.release()
+            self._wake_up.set()
+
+    def record_check(self, addon: Addon, upstream_sha: Optional[str]) -> None:
+        """Adapts the interval of `addon` depending on whether its upstream changed"""
+        with self._lock:
+            schedule = self._schedules.get(addon.dir_path)
+            if schedule is None:
+                return
+            known_sha = schedule.upstream_sha
+            if known_sha is not None and upstream_sha != known_sha:
+                schedule.interval = max(MIN_INTERVAL, schedule.interval / 2)
+            else:
+                schedule.interval = min(MAX_INTERVAL, schedule.interval * 1.5)
+            schedule.upstream_sha = upstream_sha
+            schedule.next_check = self._clock() + _jittered(schedule.interval)
+
+
+def _seed_interval(commit_dates: List[int], now: float) -> float:
+    """Estimates a first interval as half the mean gap between upstream commits"""
+    if len(commit_dates) == 0:
+        return MIN_INTERVAL * 24
+    dates = sorted(commit_dates + [int(now)], reverse=True)
+    gaps = [newer - older for newer, older in zip(dates, dates[1:])]
+    mean_gap = sum(gaps) / len(gaps)
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, mean_gap / 2))
+
+
+def _jittered(interval: float) -> float:
+    return interval * random.uniform(1 - JITTER, 1 + JITTER)
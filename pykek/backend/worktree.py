@@ -0,0 +1,51 @@
+import sys
+import threading
+from typing import TYPE_CHECKING, Set
+from pykek.log import logger
+
+if TYPE_CHECKING:
+    from git import Repo
+
+# git only ships its builtin file system monitor on these platforms
+FSMONITOR_PLATFORMS = ["darwin", "win32"]
+
+
+class WorktreeAccelerator:
+    """
+    WorktreeAccelerator tells whether the worktree of an addon has local changes.
+
+    Managed repositories get git's index acceleration: the split index, and the
+    builtin fsmonitor when enabled and supported. git then only stats the
+    tracked files it can't vouch for, which is faster than anything pykek could
+    check on its own. Untracked files aren't local changes here, so the
+    untracked cache would never be read and isn't enabled.
+    """
+
+    def __init__(self, fsmonitor: bool = False) -> None:
+        self.fsmonitor = fsmonitor
+        self._lock = threading.Lock()
+        self._accelerated: Set[str] = set()
+
+    def is_dirty(self, repo: "Repo") -> bool:
+        """Returns True when tracked files differ from HEAD, like `Repo.is_dirty()`"""
+        self.accelerate(repo)
+        return repo.is_dirty()
+
+    def accelerate(self, repo: "Repo") -> None:
+        """Enables git's index acceleration on `repo`, once per process"""
+        git_dir = str(repo.git_dir)
+        with self._lock:
+            if git_dir in self._accelerated:
+                return
+            self._accelerated.add(git_dir)
+        try:
+            with repo.config_writer() as writer:
+                writer.set_value("core", "splitIndex", "true")
+                if self.fsmonitor and sys.platform in FSMONITOR_PLATFORMS:
+                    writer.set_value("core", "fsmonitor", "true")
+            repo.git.update_index("--split-index")
+        except Exception as e:
+            logger.warning(f"Couldn't enable index acceleration in {git_dir}: {e}")
+
+
+worktree_accelerator = WorktreeAccelerator()
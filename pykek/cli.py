@@ -0,0 +1,479 @@
+"""
+Headless command line interface for pykek.
+
+It is built directly on the backend and never imports GObject, so it can be used
+from cron jobs or provisioning scripts on headless boxes. Results are streamed
+as NDJSON (one JSON object per addon, as soon as it is done) or as a single JSON
+document with `--format json`.
+"""
+
+import argparse
+from concurrent.futures import Future, as_completed
+from dataclasses import asdict
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from pykek.backend.addon import Addon
+from pykek.backend.config import Config
+from pykek.backend.daemon import DaemonClient, serve, update_atomically
+from pykek.backend.game_instance import GameInstance
+from pykek.backend.history import history
+from pykek.backend.lockfile import Lockfile
+from pykek.backend.maintenance import maintain_addon
+from pykek.backend.metrics import metrics
+from pykek.backend.operations import (
+    check_addon,
+    check_and_update_addon,
+    rollback_addon,
+    switch_addon,
+    switch_addons,
+)
+from pykek.backend.scheduler import scheduler
+from pykek.backend.timings import timings
+from pykek.tracing import tracer
+
+
+class _Output:
+    def __init__(self, output_format: str) -> None:
+        self._format = output_format
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, object]] = []
+
+    def emit(self, record: Dict[str, object]) -> None:
+        with self._lock:
+            if self._format == "ndjson":
+                print(json.dumps(record), flush=True)
+            else:
+                self._records.append(record)
+
+    def close(self) -> None:
+        if self._format == "json":
+            print(json.dumps(self._records, indent=2), flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    if args.jobs is not None:
+        scheduler.max_workers = args.jobs
+    if args.trace is not None:
+        tracer.start(args.trace)
+    if args.metrics is not None:
+        metrics.start_export(args.metrics)
+    output = _Output(args.format)
+    try:
+        return args.command(args, output)
+    except Exception as e:
+        print(f"pykek: {e}", file=sys.stderr)
+        return 1
+    finally:
+        output.close()
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pykek", description=__doc__)
+    parser.add_argument(
+        "--instance", help="WoW directory to use (defaults to the favorite instance)"
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=_positive_int,
+        help="number of parallel git operations (default: from the config, or 8)",
+    )
+    parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        help="write a Chrome trace of the backend operations to this file at exit",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        help="write the metrics to this Prometheus text file periodically and at exit",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="run operations locally even if the pykek daemon is running",
+    )
+    subparsers = parser.add_subparsers(required=True)
+
+    status = subparsers.add_parser("status", help="check addons for updates")
+    status.add_argument("addons", nargs="*", help="addons to check (default: all)")
+    status.set_defaults(command=_status)
+
+    update = subparsers.add_parser("update", help="update outdated addons")
+    update.add_argument("addons", nargs="*", help="addons to update (default: all)")
+    update.add_argument(
+        "--atomic",
+        action="store_true",
+        help="if an update fails, roll back every addon already updated",
+    )
+    update.set_defaults(command=_update)
+
+    switch = subparsers.add_parser("switch", help="switch addons to another branch")
+    switch.add_argument("branch")
+    switch.add_argument("addons", nargs="*")
+    switch.add_argument(
+        "--author",
+        help="switch every addon of this author (owner of the remote) having branch",
+    )
+    switch.set_defaults(command=_switch)
+
+    rollback = subparsers.add_parser(
+        "rollback", help="move addons back to their commit before the last operation"
+    )
+    rollback.add_argument("addons", nargs="*", help="addons to roll back")
+    rollback.add_argument(
+        "--session",
+        action="store_true",
+        help="roll back every addon updated or switched in the latest session",
+    )
+    rollback.set_defaults(command=_rollback)
+
+    install = subparsers.add_parser("install", help="install an addon from git")
+    install.add_argument("url")
+    install.add_argument("--name", help="addon folder name (default: from the URL)")
+    install.set_defaults(command=_install)
+
+    export = subparsers.add_parser("export", help="export the addon set")
+    export.add_argument(
+        "--lockfile", type=Path, help="write the addon set to a lockfile instead"
+    )
+    export.set_defaults(command=_export)
+
+    import_ = subparsers.add_parser(
+        "import", help="install the addon set of a lockfile at its locked commits"
+    )
+    import_.add_argument("lockfile", type=Path)
+    import_.set_defaults(command=_import)
+
+    timings_ = subparsers.add_parser(
+        "timings", help="list the slowest addons from their recorded durations"
+    )
+    timings_.add_argument(
+        "--operation", help="only this operation, e.g. fetch, check, update or clone"
+    )
+    timings_.add_argument("--limit", type=int, default=10)
+    timings_.set_defaults(command=_timings)
+
+    maintenance = subparsers.add_parser(
+        "maintenance", help="repack addon repositories and prune stale remote refs"
+    )
+    maintenance.add_argument(
+        "addons", nargs="*", help="addons to maintain (default: all)"
+    )
+    maintenance.set_defaults(command=_maintenance)
+
+    dependencies = subparsers.add_parser(
+        "dependencies",
+        help="list addon dependencies from their TOC, missing ones and cycles",
+    )
+    dependencies.add_argument("addons", nargs="*", help="addons to list (default: all)")
+    dependencies.set_defaults(command=_dependencies)
+
+    daemon = subparsers.add_parser(
+        "daemon", help="run the background service in the foreground"
+    )
+    daemon.set_defaults(command=_daemon)
+
+    return parser
+
+
+def _game_instance(args) -> GameInstance:
+    if args.instance is not None:
+        instance = GameInstance.from_dir_path(args.instance)
+    else:
+        Config.load()
+        # --jobs takes precedence over the config
+        if args.jobs is not None:
+            scheduler.max_workers = args.jobs
+        if len(Config.game_instances) == 0:
+            raise Exception("no WoW instance configured, use --instance")
+        instance = Config.favorite_instance or Config.game_instances[0]
+    instance.load_addons()
+    return instance
+
+
+def _daemon_instance(args) -> Optional[str]:
+    """The daemon runs from its own directory, relative paths are resolved here"""
+    return os.path.abspath(args.instance) if args.instance is not None else None
+
+
+def _daemon_client(args) -> Optional[DaemonClient]:
+    if args.no_daemon:
+        return None
+    return DaemonClient.connect()
+
+
+def _emit_all(records: List[Dict[str, object]], output: _Output) -> int:
+    exit_code = 0
+    for record in records:
+        if record.get("status") == "error":
+            exit_code = 2
+        output.emit(record)
+    return exit_code
+
+
+def _select_addons(instance: GameInstance, names: List[str]) -> List[Addon]:
+    if len(names) == 0:
+        return instance.addons
+    by_name = {addon.name: addon for addon in instance.addons}
+    missing = [name for name in names if name not in by_name]
+    if len(missing) > 0:
+        raise Exception(f"unknown addon(s): {', '.join(missing)}")
+    return [by_name[name] for name in names]
+
+
+def _run_parallel(
+    addons: List[Addon],
+    start: Callable[[Addon], Future],
+    output: _Output,
+    describe: Callable[[Addon, Any], Dict[str, object]] = lambda addon, _: (
+        addon.as_dict()
+    ),
+) -> int:
+    """Starts `start` on every addon and emits each record as soon as it is done"""
+    futures: Dict[Future, Addon] = {start(addon): addon for addon in addons}
+    exit_code = 0
+    for future in as_completed(futures):
+        addon = futures[future]
+        try:
+            record = describe(addon, future.result())
+        except Exception as e:
+            record = {**addon.as_dict(), "status": "error", "error": str(e)}
+            exit_code = 2
+        output.emit(record)
+    return exit_code
+
+
+def _named_record(value: Any) -> Dict[str, object]:
+    record = asdict(value)
+    return {"addon": record.pop("name"), **record}
+
+
+### Commands
+
+
+def _status(args, output: _Output) -> int:
+    client = _daemon_client(args)
+    if client is not None:
+        records = client.call(
+            "check", instance=_daemon_instance(args), addons=args.addons
+        )
+        return _emit_all(records, output)
+    instance = _game_instance(args)
+    return _run_parallel(
+        _select_addons(instance, args.addons),
+        lambda addon: check_addon(addon).future,
+        output,
+    )
+
+
+def _update(args, output: _Output) -> int:
+    client = _daemon_client(args)
+    if client is not None:
+        records = client.call(
+            "update",
+            instance=_daemon_instance(args),
+            addons=args.addons,
+            atomic=args.atomic,
+        )
+        return _emit_all(records, output)
+    instance = _game_instance(args)
+    if args.atomic:
+        addons = _select_addons(instance, args.addons)
+        return _emit_all(update_atomically(instance, addons), output)
+    graph = instance.dependency_graph()
+    exit_code = 0
+    # Libraries are updated before their dependents
+    for wave in graph.waves(_select_addons(instance, args.addons)):
+        exit_code = max(
+            exit_code,
+            _run_parallel(
+                wave,
+                lambda addon: check_and_update_addon(addon).future,
+                output,
+                lambda addon, updated: {**addon.as_dict(), "updated": updated},
+            ),
+        )
+    return exit_code
+
+
+def _switch(args, output: _Output) -> int:
+    if args.author is None and len(args.addons) == 0:
+        raise Exception("give the addons to switch, or use --author")
+    client = _daemon_client(args)
+    if client is not None:
+        records = client.call(
+            "switch",
+            branch=args.branch,
+            addons=args.addons,
+            instance=_daemon_instance(args),
+            author=args.author,
+        )
+        return _emit_all(records, output)
+    instance = _game_instance(args)
+    if len(args.addons) == 0:
+        operations = switch_addons(instance.addons, args.branch, args.author)
+        futures = {
+            operation.addon.dir_path: operation.future for operation in operations
+        }
+        return _run_parallel(
+            [operation.addon for operation in operations],
+            lambda addon: futures[addon.dir_path],
+            output,
+        )
+    addons = _select_addons(instance, args.addons)
+    non_git = [addon.name for addon in addons if not addon.is_git]
+    if len(non_git) > 0:
+        raise Exception(f"not git addon(s): {', '.join(non_git)}")
+    return _run_parallel(
+        addons, lambda addon: switch_addon(addon, args.branch).future, output
+    )
+
+
+def _rollback(args, output: _Output) -> int:
+    if not args.session and len(args.addons) == 0:
+        raise Exception("give the addons to roll back, or use --session")
+    client = _daemon_client(args)
+    if client is not None:
+        records = client.call(
+            "rollback",
+            instance=_daemon_instance(args),
+            addons=args.addons,
+            session=args.session,
+        )
+        return _emit_all(records, output)
+    instance = _game_instance(args)
+    addons = _select_addons(instance, args.addons)
+    positions = history.last_session() if args.session else {}
+    if args.session:
+        addons = [addon for addon in addons if addon.dir_path in positions]
+
+    def describe(addon: Addon, entry) -> Dict[str, object]:
+        return {**addon.as_dict(), "sha": entry.sha if entry is not None else None}
+
+    return _run_parallel(
+        addons,
+        lambda addon: rollback_addon(addon, positions.get(addon.dir_path)).future,
+        output,
+        describe,
+    )
+
+
+def _install(args, output: _Output) -> int:
+    instance = _game_instance(args)
+    name = args.name or args.url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+    target_dir = os.path.join(instance.dir_path, "Interface/AddOns", name)
+    if os.path.exists(target_dir):
+        print(f"pykek: {target_dir} already exists", file=sys.stderr)
+        return 1
+    Addon.clone(args.url, target_dir)
+    addon = Addon.from_dir_path(Path(target_dir))
+    addon.reload_branches()
+    output.emit({**addon.as_dict(), "url": args.url})
+    return 0
+
+
+def _export(args, output: _Output) -> int:
+    instance = _game_instance(args)
+    if args.lockfile is not None:
+        lockfile = Lockfile.from_instance(instance)
+        lockfile.write(args.lockfile)
+        for entry in lockfile.entries:
+            output.emit(_named_record(entry))
+        return 0
+
+    def export(addon: Addon) -> Dict[str, object]:
+        record: Dict[str, object] = {"addon": addon.name, "git": addon.is_git}
+        if addon.is_git:
+            record.update(asdict(addon.git_info()))
+        return record
+
+    return _run_parallel(
+        instance.addons,
+        lambda addon: scheduler.submit(export, addon),
+        output,
+        lambda _, r: r,
+    )
+
+
+def _import(args, output: _Output) -> int:
+    lockfile = Lockfile.load(args.lockfile)
+    instance = _game_instance(args)
+    futures = lockfile.install(instance.dir_path)
+    names = {future: name for name, future in futures.items()}
+    exit_code = 0
+    for future in as_completed(names):
+        try:
+            output.emit(_named_record(future.result()))
+        except Exception as e:
+            output.emit({"addon": names[future], "status": "error", "error": str(e)})
+            exit_code = 2
+    return exit_code
+
+
+def _timings(args, output: _Output) -> int:
+    for stats in timings.slowest(args.operation, args.limit):
+        output.emit(
+            {
+                "addon": os.path.basename(stats.addon),
+                "path": stats.addon,
+                "operation": stats.operation,
+                "count": stats.count,
+                "mean": round(stats.mean, 3),
+                "p90": round(stats.p90, 3),
+                "last": round(stats.last, 3),
+            }
+        )
+    return 0
+
+
+def _maintenance(args, output: _Output) -> int:
+    instance = _game_instance(args)
+    addons = [a for a in _select_addons(instance, args.addons) if a.is_git]
+    return _run_parallel(
+        addons,
+        lambda addon: maintain_addon(addon, yield_to_others=False).future,
+        output,
+        lambda addon, report: {
+            **addon.as_dict(),
+            "tasks": report.tasks,
+            **asdict(report.health),
+        },
+    )
+
+
+def _dependencies(args, output: _Output) -> int:
+    instance = _game_instance(args)
+    graph = instance.dependency_graph()
+    missing = graph.missing()
+    in_cycle = {name for cycle in graph.cycles() for name in cycle}
+    for addon in _select_addons(instance, args.addons):
+        output.emit(
+            {
+                "addon": addon.name,
+                "dependencies": addon.dependencies,
+                "optional_dependencies": addon.optional_dependencies,
+                "dependents": [a.name for a in graph.dependents(addon)],
+                "missing": missing.get(addon.name, []),
+                "in_cycle": addon.name in in_cycle,
+            }
+        )
+    return 1 if len(missing) > 0 or len(in_cycle) > 0 else 0
+
+
+def _daemon(args, output: _Output) -> int:
+    serve()
+    return 0
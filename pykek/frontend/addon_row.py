@@ -1,14 +1,32 @@
+from pathlib import Path
+import re
 import threading
 from typing import List, Optional
-from gi.repository import Gtk, Adw  # type: ignore
+from gi.repository import GLib, Gtk, Adw  # type: ignore
 from pykek.backend.addon import Addon, AddonStatus, AddonStatusRepresentation
-from pykek.frontend.git.dialog import GitDialogController
+from pykek.backend.daemon import DaemonClient, status_from_record
+from pykek.backend.dependencies import DependencyGraph
+from pykek.backend.history import history
+from pykek.backend import operations
+from pykek.backend.transfer import TransferProgress
+from pykek.log import logger
+
+# `|cffrrggbb` and `|r` escapes coloring parts of TOC titles in game
+_COLOR_CODE_PATTERN = re.compile(r"\|c[0-9a-fA-F]{8}|\|r")
 
 
 class AddonRowController:
-    def __init__(self, window: Adw.ApplicationWindow, addon: Addon) -> None:
+    def __init__(
+        self,
+        window: Adw.ApplicationWindow,
+        addon: Addon,
+        daemon: Optional[DaemonClient] = None,
+        graph: Optional[DependencyGraph] = None,
+    ) -> None:
         self._window = window
         self._addon = addon
+        self._daemon = daemon
+        self._graph = graph
         self._addon.reload_branches()
         self._view = AddonRow(self, addon)
         addon.add_listener(self._view)
@@ -17,7 +35,9 @@ class AddonRowController:
         return self._view
 
     def title(self) -> str:
-        return self._addon.name
+        """Returns the TOC title without its color codes, else the folder name"""
+        title = _COLOR_CODE_PATTERN.sub("", self._addon.title or "").strip()
+        return GLib.markup_escape_text(title or self._addon.name)
 
     def version(self) -> Optional[str]:
         return self._addon.version
@@ -37,25 +57,81 @@ class AddonRowController:
     def should_show_dropdown(self) -> bool:
         return self._addon.is_git
 
+    def can_roll_back(self) -> bool:
+        # Entries are recorded before operations run, no need to wait for the writer
+        last = history.last(self._addon.dir_path, fresh=False)
+        return self._addon.is_git and last is not None
+
+    def dependents_summary(self) -> Optional[str]:
+        """Tells which addons rely on this one, when it is a library"""
+        if self._graph is None:
+            return None
+        names = [a.name for a in self._graph.dependents(self._addon, transitive=True)]
+        if len(names) == 0:
+            return None
+        if len(names) > 3:
+            return f"Also used by {', '.join(names[:3])} and {len(names) - 3} more"
+        return f"Also used by {', '.join(names)}"
+
     ### Actions
 
     def update_addon(self) -> None:
-        thread = threading.Thread(target=self._update_addon)
-        thread.start()
+        if self._daemon is not None:
+            self._call_daemon_in_background("update", addons=[self._addon.name])
+            return
+        operations.update_addon(self._addon)
 
-    def _update_addon(self) -> None:
-        self._addon.update()
-        self._addon.refresh_toc_info()
+    def refresh_status(self) -> None:
+        if self._daemon is not None:
+            self._call_daemon_in_background("check", addons=[self._addon.name])
+            return
+        operations.check_addon(self._addon)
 
     def switch_branch(self, branch: str) -> None:
-        thread = threading.Thread(target=self._switch_branch, args=[branch])
+        if self._daemon is not None:
+            self._call_daemon_in_background(
+                "switch", branch=branch, addons=[self._addon.name]
+            )
+            return
+        operations.switch_addon(self._addon, branch)
+
+    def roll_back(self) -> None:
+        if self._daemon is not None:
+            self._call_daemon_in_background("rollback", addons=[self._addon.name])
+            return
+        operations.rollback_addon(self._addon)
+
+    def _call_daemon_in_background(self, method: str, **params) -> None:
+        thread = threading.Thread(
+            target=self._call_daemon, args=[method], kwargs=params
+        )
         thread.start()
 
-    def _switch_branch(self, branch: str) -> None:
-        self._addon.switch_to_branch(branch)
-        self._addon.refresh_toc_info()
+    def _call_daemon(self, method: str, **params) -> None:
+        """Runs the operation in the daemon, then syncs the local addon state"""
+        if self._daemon is None:
+            return
+        self._addon.set_status(AddonStatus.LOADING)
+        instance_dir = str(Path(self._addon.dir_path).parents[2])
+        try:
+            records = self._daemon.call(method, instance=instance_dir, **params)
+            status = status_from_record(records[0])
+            if status is None:
+                logger.error(f"{method} failed for {self._addon.name}: {records[0]}")
+                records = self._daemon.call(
+                    "check", instance=instance_dir, addons=[self._addon.name]
+                )
+                status = status_from_record(records[0]) or AddonStatus.OUTDATED
+            self._addon.reload_branches()
+            self._addon.refresh_toc_info()
+        except Exception as e:
+            logger.error(f"{method} failed in the daemon for {self._addon.name}: {e}")
+            status = AddonStatus.UNREACHABLE
+        self._addon.set_status(status)
 
     def present_git_dialog(self) -> None:
+        from pykek.frontend.git.dialog import GitDialogController
+
         controller = GitDialogController(self._window, self._addon)
         controller.run()
 
@@ -66,10 +142,13 @@ class AddonRow(Adw.ActionRow):
         self._controller = controller
         self.set_activatable(True)
         self.set_title(controller.title())
+        self._transfer_lock = threading.Lock()
+        self._pending_transfer: Optional[TransferProgress] = None
 
         self._setup_suffix_box()
         self._setup_version_tag()
         self._setup_branches_dropdown()
+        self._setup_rollback_button()
         self._setup_action_button()
 
         self._update_action_box(self._controller.current_addon_status())
@@ -107,6 +186,19 @@ class AddonRow(Adw.ActionRow):
         )
         self._suffix_box.append(self._branches_dropdown)
 
+    def _setup_rollback_button(self) -> None:
+        self._rollback_button: Optional[Gtk.Button] = None
+        if not self._controller.should_show_dropdown():
+            return
+        self._rollback_button = Gtk.Button(
+            icon_name="edit-undo-symbolic", valign=Gtk.Align.CENTER
+        )
+        self._rollback_button.set_css_classes(["flat"])
+        self._rollback_button.set_tooltip_text("Roll back to the previous commit")
+        self._rollback_button.set_visible(self._controller.can_roll_back())
+        self._rollback_button.connect("clicked", self._on_rollback_button_clicked)
+        self._suffix_box.append(self._rollback_button)
+
     def _setup_action_button(self) -> None:
         self._action_button = Gtk.Button(
             valign=Gtk.Align.CENTER,
@@ -130,6 +222,8 @@ class AddonRow(Adw.ActionRow):
             self._action_button.set_sensitive(True)
         elif addon_status == AddonStatus.NON_GIT:
             self._action_button.set_sensitive(True)
+        elif addon_status == AddonStatus.UNREACHABLE:
+            self._action_button.set_sensitive(True)
         else:
             self._action_button.set_sensitive(False)
 
@@ -138,20 +232,44 @@ class AddonRow(Adw.ActionRow):
     def _on_action_button_clicked(self, button: Gtk.Button) -> None:
         addon_status = self._controller.current_addon_status()
         if addon_status == AddonStatus.OUTDATED:
+            self._show_dependents(button)
             self._controller.update_addon()
         elif addon_status == AddonStatus.NON_GIT:
             self._controller.present_git_dialog()
+        elif addon_status == AddonStatus.UNREACHABLE:
+            self._controller.refresh_status()
+
+    def _on_rollback_button_clicked(self, button: Gtk.Button) -> None:
+        self._controller.roll_back()
 
     def _on_branches_dropdown_selection(self, dropdown: Gtk.DropDown, param) -> None:
         item = dropdown.get_selected_item()
         if not isinstance(item, Gtk.StringObject):
             return
+        self._show_dependents(dropdown)
         self._controller.switch_branch(item.get_string())
 
+    def _show_dependents(self, anchor: Gtk.Widget) -> None:
+        summary = self._controller.dependents_summary()
+        if summary is None:
+            return
+        label = Gtk.Label(label=summary)
+        label.set_wrap(True)
+        label.set_max_width_chars(40)
+        popover = Gtk.Popover()
+        popover.set_child(label)
+        popover.set_parent(anchor)
+        popover.connect("closed", lambda p: GLib.idle_add(p.unparent))
+        popover.popup()
+
     ### AddonListener
 
     def addon_status_did_change(self, new_status: AddonStatus) -> None:
         self._update_action_box(new_status)
+        if new_status != AddonStatus.LOADING:
+            self.set_subtitle("")
+        if new_status != AddonStatus.LOADING and self._rollback_button is not None:
+            self._rollback_button.set_visible(self._controller.can_roll_back())
 
     def addon_version_did_change(self, new_version: Optional[str]) -> None:
         if not isinstance(new_version, str):
@@ -159,3 +277,25 @@ class AddonRow(Adw.ActionRow):
             return
         self._version_button.set_label(new_version)
         self._version_button.set_visible(True)
+
+    def addon_title_did_change(self, new_title: Optional[str]) -> None:
+        self.set_title(self._controller.title())
+
+    def addon_transfer_did_progress(self, progress: TransferProgress) -> None:
+        # Only the latest progress is shown, whatever the number of updates
+        # received while the main loop was busy
+        with self._transfer_lock:
+            is_scheduled = self._pending_transfer is not None
+            self._pending_transfer = progress
+        if not is_scheduled:
+            GLib.idle_add(self._show_transfer_progress)
+
+    def _show_transfer_progress(self) -> bool:
+        with self._transfer_lock:
+            progress, self._pending_transfer = self._pending_transfer, None
+        if (
+            progress is not None
+            and self._controller.current_addon_status() == AddonStatus.LOADING
+        ):
+            self.set_subtitle(progress.summary())
+        return GLib.SOURCE_REMOVE
@@ -1,10 +1,21 @@
 import threading
-from typing import List, Optional
-from gi.repository import Gtk, Adw  # type: ignore
-from pykek.backend.addon import Addon
+from typing import Dict, List, Optional, Set
+from gi.repository import Gio, GLib, Gtk, Adw  # type: ignore
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.bulk_update import BulkUpdateProgress
 from pykek.backend.config import Config
+from pykek.backend.daemon import DaemonClient, DaemonError, status_from_record
+from pykek.backend.dependencies import DependencyGraph
+from pykek.backend.fetch_coordinator import fetch_coordinator
 from pykek.backend.game_instance import GameInstance
+from pykek.backend.maintenance import MaintenanceScheduler
+from pykek.backend.scheduler import scheduler
+from pykek.backend.update_scheduler import UpdateScheduler
 from pykek.frontend.addon_row import AddonRowController
+from pykek.frontend.diagnostics import DiagnosticsController
+from pykek.frontend.switch_dialog import SwitchBranchController
+from pykek.log import logger
+from pykek.tracing import span
 
 
 class AddonsController:
@@ -13,8 +24,16 @@ class AddonsController:
     ) -> None:
         self._window = window
         self._navigation_view = navigation_view
+        self._loaded_instances: Set[int] = set()
+        self._daemon = DaemonClient.connect()
+        self._update_scheduler = UpdateScheduler()
+        self._maintenance_scheduler = MaintenanceScheduler()
         self._view = AddonsPage(self)
+        self._watch_power_and_network()
         Config.add_listener(self, get_initial_value=True)
+        if self._daemon is None:
+            self._update_scheduler.start()
+            self._maintenance_scheduler.start()
 
     def run(self) -> None:
         self._navigation_view.replace([self._view])
@@ -22,41 +41,270 @@ class AddonsController:
     def get_window(self) -> Adw.ApplicationWindow:
         return self._window
 
+    def get_daemon(self) -> Optional[DaemonClient]:
+        return self._daemon
+
+    def get_dependency_graph(self) -> Optional[DependencyGraph]:
+        instance = self.selected_instance()
+        if instance is None:
+            return None
+        return instance.dependency_graph()
+
+    ### Update checks
+
+    def _watch_power_and_network(self) -> None:
+        network_monitor = Gio.NetworkMonitor.get_default()
+        network_monitor.connect("notify::network-metered", self._on_metered_change)
+        self._on_metered_change(network_monitor, None)
+        power_monitor = Gio.PowerProfileMonitor.dup_default()
+        power_monitor.connect(
+            "notify::power-saver-enabled", self._on_power_saver_change
+        )
+        self._on_power_saver_change(power_monitor, None)
+        # Keep the monitors alive as long as the controller
+        self._monitors = [network_monitor, power_monitor]
+
+    def _on_metered_change(self, monitor: Gio.NetworkMonitor, _) -> None:
+        self._set_update_checks_paused("metered", monitor.get_network_metered())
+
+    def _on_power_saver_change(self, monitor: Gio.PowerProfileMonitor, _) -> None:
+        self._set_update_checks_paused("power-saver", monitor.get_power_saver_enabled())
+
+    def _set_update_checks_paused(self, reason: str, paused: bool) -> None:
+        if self._daemon is not None:
+            method = "pause" if paused else "resume"
+            scheduler.submit(self._daemon.call, method, reason=reason)
+        elif paused:
+            self._update_scheduler.pause(reason)
+            self._maintenance_scheduler.pause(reason)
+        else:
+            self._update_scheduler.resume(reason)
+            self._maintenance_scheduler.resume(reason)
+
+    ### Bulk update
+
+    def update_all(self, all_or_nothing: bool = False) -> None:
+        instance = self.selected_instance()
+        if instance is None:
+            return
+        thread = threading.Thread(
+            target=self._update_all, args=[instance, all_or_nothing]
+        )
+        thread.start()
+
+    def _update_all(self, instance: GameInstance, all_or_nothing: bool) -> None:
+        try:
+            if self._daemon is not None:
+                self._update_all_in_daemon(instance, all_or_nothing)
+            else:
+                instance.update_all(
+                    all_or_nothing=all_or_nothing,
+                    listener=self,
+                    max_parallel=Config.max_parallel_updates,
+                )
+        finally:
+            GLib.idle_add(self._view.bulk_update_did_finish)
+
+    def rollback_last_session(self) -> None:
+        instance = self.selected_instance()
+        if instance is None:
+            return
+        thread = threading.Thread(target=self._rollback_last_session, args=[instance])
+        thread.start()
+
+    def _rollback_last_session(self, instance: GameInstance) -> None:
+        if self._daemon is None:
+            instance.rollback_last_session()
+            return
+        records = self._daemon.call(
+            "rollback", instance=instance.dir_path, session=True
+        )
+        self._apply_daemon_records(instance, records)
+
+    def _update_all_in_daemon(
+        self, instance: GameInstance, all_or_nothing: bool
+    ) -> None:
+        if self._daemon is None:
+            return
+        records = self._daemon.call(
+            "update", instance=instance.dir_path, atomic=all_or_nothing
+        )
+        self._apply_daemon_records(instance, records)
+
+    def _apply_daemon_records(
+        self, instance: GameInstance, records: List[Dict[str, object]]
+    ) -> None:
+        """Syncs the local addons after the daemon moved them"""
+        addons = {addon.name: addon for addon in instance.addons}
+        for record in records:
+            addon = addons.get(str(record["addon"]))
+            status = status_from_record(record)
+            if addon is None or status is None:
+                continue
+            addon.refresh_toc_info()
+            addon.set_status(status)
+
+    ### Batch switch
+
+    def show_switch_dialog(self) -> None:
+        instance = self.selected_instance()
+        if instance is None:
+            return
+        controller = SwitchBranchController(
+            self._window,
+            [],
+            lambda branch, author: self.switch_branch(instance, branch, author),
+        )
+        controller.run()
+        # Reading every addon remote would block the main thread
+        scheduler.submit(self._load_remote_owners, instance, controller)
+
+    def _load_remote_owners(
+        self, instance: GameInstance, controller: SwitchBranchController
+    ) -> None:
+        GLib.idle_add(controller.set_authors, instance.remote_owners())
+
+    def switch_branch(
+        self, instance: GameInstance, branch: str, author: Optional[str]
+    ) -> None:
+        thread = threading.Thread(
+            target=self._switch_branch, args=[instance, branch, author]
+        )
+        thread.start()
+
+    def _switch_branch(
+        self, instance: GameInstance, branch: str, author: Optional[str]
+    ) -> None:
+        if self._daemon is None:
+            instance.switch_branch(branch, author)
+        else:
+            records = self._daemon.call(
+                "switch", instance=instance.dir_path, branch=branch, author=author
+            )
+            self._apply_daemon_records(instance, records)
+        # Rows read the current branch when they are created
+        GLib.idle_add(self._view.reload_list)
+
+    ### Diagnostics
+
+    def show_diagnostics(self) -> None:
+        DiagnosticsController(self._navigation_view).run()
+
+    ### BulkUpdateListener
+
+    def bulk_update_did_progress(self, progress: BulkUpdateProgress) -> None:
+        GLib.idle_add(self._view.bulk_update_did_progress, progress)
+
+    ### Instances
+
+    def selected_instance(self) -> Optional[GameInstance]:
+        if len(Config.game_instances) == 0:
+            return None
+        if Config.favorite_instance in Config.game_instances:
+            return Config.favorite_instance
+        return Config.game_instances[0]
+
+    def instance_names(self) -> List[str]:
+        return [instance.name() for instance in Config.game_instances]
+
+    def selected_instance_index(self) -> int:
+        instance = self.selected_instance()
+        if instance is None:
+            return 0
+        return Config.game_instances.index(instance)
+
+    def select_instance(self, index: int) -> None:
+        if index >= len(Config.game_instances):
+            return
+        instance = Config.game_instances[index]
+        if instance is self.selected_instance():
+            return
+        Config.favorite_instance = instance
+        Config.schedule_write()
+        self._view.reload_list()
+
     ### List
 
     def number_of_items(self) -> int:
-        if len(Config.game_instances) == 0:
+        instance = self.selected_instance()
+        if instance is None:
             return 0
-        return len(Config.game_instances[0].addons)
+        return len(instance.addons)
 
     def item(self, item_index: int) -> Optional[Addon]:
-        if len(Config.game_instances) == 0:
+        instance = self.selected_instance()
+        if instance is None:
             return None
-        instance = Config.game_instances[0]
-        if len(instance.addons) < item_index:
+        if len(instance.addons) <= item_index:
             return None
         return instance.addons[item_index]
 
     ### ConfigListener
 
     def game_instances_did_change(self, instances: List[GameInstance]) -> None:
-        if len(instances) == 0:
+        self._view.reload_instances()
+        new_instances = [i for i in instances if id(i) not in self._loaded_instances]
+        if len(new_instances) == 0:
             return
-        instance = instances[0]
-        instance.add_listener(self)
-        self._load_addons(instance)
-
-    def _load_addons(self, instance: GameInstance) -> None:
-        thread = threading.Thread(target=instance.load_addons)
-        thread.start()
+        fetch_coordinator.begin_refresh()
+        for instance in new_instances:
+            self._loaded_instances.add(id(instance))
+            instance.add_listener(self)
+            scheduler.submit_to(instance.dir_path, instance.load_addons)
 
     ### GameInstanceListener
 
-    def addons_did_load(self, addons: List[Addon]) -> None:
-        self._view.reload_list()
-        for addon in addons:
-            thread = threading.Thread(target=addon.update_status)
-            thread.start()
+    def addons_did_load(self, instance: GameInstance, addons: List[Addon]) -> None:
+        if instance is self.selected_instance():
+            self._view.reload_list()
+        if self._daemon is not None:
+            scheduler.submit(self._load_daemon_statuses, instance)
+            return
+        self._maintenance_scheduler.add_addons(addons)
+        if Config.settings(instance).check_for_updates:
+            instance.check_for_updates()
+            self._update_scheduler.add_addons(addons)
+
+    def _load_daemon_statuses(self, instance: GameInstance) -> None:
+        """Uses the daemon warm state, and only asks it to check unknown statuses"""
+        if self._daemon is None:
+            return
+        try:
+            self._apply_daemon_statuses(instance, self._daemon)
+        except DaemonError as e:
+            logger.warning(f"Daemon unavailable, checking for updates locally: {e}")
+            instance.check_for_updates()
+
+    def _apply_daemon_statuses(
+        self, instance: GameInstance, daemon: DaemonClient
+    ) -> None:
+        addons = {addon.name: addon for addon in instance.addons}
+        records = daemon.call("status", instance=instance.dir_path)
+        unknown = []
+        for record in records:
+            addon = addons.get(str(record["addon"]))
+            status = status_from_record(record)
+            if addon is None:
+                continue
+            if status is None or status == AddonStatus.LOADING:
+                unknown.append(addon.name)
+            else:
+                addon.set_status(status)
+        # Installed since the daemon scanned the instance, it rescans on check
+        known = {str(record["addon"]) for record in records}
+        unknown += [
+            addon.name
+            for addon in addons.values()
+            if addon.is_git and addon.name not in known
+        ]
+        if len(unknown) == 0:
+            return
+        records = daemon.call("check", instance=instance.dir_path, addons=unknown)
+        for record in records:
+            addon = addons.get(str(record["addon"]))
+            status = status_from_record(record)
+            if addon is not None and status is not None:
+                addon.set_status(status)
 
 
 class AddonsPage(Adw.NavigationPage):
@@ -81,6 +329,35 @@ class AddonsPage(Adw.NavigationPage):
 
     def _setup_header_bar(self) -> None:
         header_bar = Adw.HeaderBar()
+        self._is_reloading_instances = False
+        self._instances_dropdown = Gtk.DropDown.new(Gtk.StringList(), None)
+        self._instances_dropdown.set_visible(False)
+        self._instances_dropdown.connect(
+            "notify::selected", self._on_instances_dropdown_selection
+        )
+        header_bar.set_title_widget(self._instances_dropdown)
+        self._update_all_button = Gtk.Button(label="Update all")
+        self._update_all_button.connect("clicked", self._on_update_all_button_clicked)
+        header_bar.pack_end(self._update_all_button)
+        self._all_or_nothing_button = Gtk.ToggleButton(
+            icon_name="changes-prevent-symbolic"
+        )
+        self._all_or_nothing_button.set_tooltip_text(
+            "All or nothing: roll every update back if one of them fails"
+        )
+        header_bar.pack_end(self._all_or_nothing_button)
+        rollback_button = Gtk.Button(icon_name="edit-undo-symbolic")
+        rollback_button.set_tooltip_text("Roll back the latest updates")
+        rollback_button.connect("clicked", self._on_rollback_button_clicked)
+        header_bar.pack_end(rollback_button)
+        switch_button = Gtk.Button(icon_name="media-playlist-shuffle-symbolic")
+        switch_button.set_tooltip_text("Switch addons to another branch")
+        switch_button.connect("clicked", self._on_switch_button_clicked)
+        header_bar.pack_end(switch_button)
+        diagnostics_button = Gtk.Button(icon_name="utilities-system-monitor-symbolic")
+        diagnostics_button.set_tooltip_text("Diagnostics")
+        diagnostics_button.connect("clicked", self._on_diagnostics_button_clicked)
+        header_bar.pack_start(diagnostics_button)
         self._page_box.append(header_bar)
 
     def _setup_preferences_page(self) -> None:
@@ -97,13 +374,70 @@ class AddonsPage(Adw.NavigationPage):
         self._list_box.set_selection_mode(Gtk.SelectionMode.NONE)
         self._group.add(self._list_box)
 
+    ### Instances
+
+    def reload_instances(self) -> None:
+        names = self._controller.instance_names()
+        selected_index = self._controller.selected_instance_index()
+        self._is_reloading_instances = True
+        self._instances_dropdown.set_model(Gtk.StringList.new(names))
+        self._instances_dropdown.set_selected(selected_index)
+        self._is_reloading_instances = False
+        self._instances_dropdown.set_visible(len(names) > 1)
+
+    def _on_instances_dropdown_selection(self, dropdown: Gtk.DropDown, param) -> None:
+        if self._is_reloading_instances:
+            return
+        self._controller.select_instance(dropdown.get_selected())
+
+    ### Bulk update
+
+    def _on_update_all_button_clicked(self, button: Gtk.Button) -> None:
+        button.set_sensitive(False)
+        button.set_label("Updating…")
+        self._all_or_nothing_button.set_sensitive(False)
+        self._controller.update_all(self._all_or_nothing_button.get_active())
+
+    def _on_rollback_button_clicked(self, button: Gtk.Button) -> None:
+        self._controller.rollback_last_session()
+
+    def _on_switch_button_clicked(self, button: Gtk.Button) -> None:
+        self._controller.show_switch_dialog()
+
+    def _on_diagnostics_button_clicked(self, button: Gtk.Button) -> None:
+        self._controller.show_diagnostics()
+
+    def bulk_update_did_progress(self, progress: BulkUpdateProgress) -> None:
+        label = f"{progress.finished()}/{progress.total}"
+        eta = progress.eta()
+        if eta is not None and progress.finished() < progress.total:
+            label += f" · {round(eta)}s left"
+        self._update_all_button.set_label(label)
+        self._update_all_button.set_tooltip_text(
+            f"{progress.done} updated, {progress.failed} failed, "
+            f"{progress.throughput():.1f} addons/s"
+        )
+
+    def bulk_update_did_finish(self) -> None:
+        self._update_all_button.set_label("Update all")
+        self._update_all_button.set_sensitive(True)
+        self._all_or_nothing_button.set_sensitive(True)
+
     ### ListView
 
     def reload_list(self) -> None:
-        self._list_box.remove_all()
-        for i in range(0, self._controller.number_of_items()):
-            addon = self._controller.item(i)
-            if not isinstance(addon, Addon):
-                continue
-            controller = AddonRowController(self._controller.get_window(), addon)
-            self._list_box.append(controller.view())
+        with span("reload_list"):
+            self._list_box.remove_all()
+            graph = self._controller.get_dependency_graph()
+            for i in range(0, self._controller.number_of_items()):
+                addon = self._controller.item(i)
+                if not isinstance(addon, Addon):
+                    continue
+                with span("addon_row", addon=addon.name):
+                    controller = AddonRowController(
+                        self._controller.get_window(),
+                        addon,
+                        self._controller.get_daemon(),
+                        graph,
+                    )
+                    self._list_box.append(controller.view())
@@ -0,0 +1,213 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from gi.repository import GLib, Gtk, Adw  # type: ignore
+from pykek.backend.metrics import Counter, Histogram, cache_hit_rates, metrics
+from pykek.backend.timings import TimingStats, timings
+
+# Operations shown on the page, with the title of their group
+_OPERATIONS = {
+    "fetch": "Slowest fetches",
+    "check": "Slowest checks",
+    "update": "Slowest updates",
+    "clone": "Slowest clones",
+}
+
+# (title, subtitle) of the rows of each live group, by group title
+Snapshot = Dict[str, List[Tuple[str, str]]]
+
+
+class DiagnosticsController:
+    def __init__(
+        self,
+        navigation_view: Adw.NavigationView,
+        limit: int = 10,
+        refresh_interval: int = 1,
+    ) -> None:
+        self._navigation_view = navigation_view
+        self._limit = limit
+        self._refresh_interval = refresh_interval
+        self._refresh_source: Optional[int] = None
+        self._view = DiagnosticsPage()
+
+        self._view.connect("shown", self._on_shown)
+        self._view.connect("hidden", self._on_hidden)
+
+    def run(self) -> None:
+        self._navigation_view.push(self._view)
+
+    def _on_shown(self, _) -> None:
+        thread = threading.Thread(target=self._load_timings)
+        thread.start()
+        self._refresh()
+        self._refresh_source = GLib.timeout_add_seconds(
+            self._refresh_interval, self._refresh
+        )
+
+    def _on_hidden(self, _) -> None:
+        if self._refresh_source is not None:
+            GLib.source_remove(self._refresh_source)
+            self._refresh_source = None
+
+    ### Timings
+
+    def _load_timings(self) -> None:
+        slowest = {
+            operation: timings.slowest(operation, self._limit)
+            for operation in _OPERATIONS
+        }
+        GLib.idle_add(self._view.show_timings, slowest)
+
+    ### Metrics
+
+    def _refresh(self) -> bool:
+        # Counting git processes walks /proc, so metrics are collected off the UI thread
+        thread = threading.Thread(target=self._collect_metrics)
+        thread.start()
+        return GLib.SOURCE_CONTINUE
+
+    def _collect_metrics(self) -> None:
+        GLib.idle_add(self._view.show_metrics, _snapshot())
+
+
+def _snapshot() -> Snapshot:
+    finished = metrics.get("pykek_operations_total")
+    finished_count = 0.0
+    if isinstance(finished, Counter):
+        finished_count = sum(value for _, _, value in finished.samples())
+    snapshot: Snapshot = {
+        "Operations": [
+            ("Queued", _format_count(metrics.get("pykek_operations_queued"))),
+            ("Running", _format_count(metrics.get("pykek_operations_running"))),
+            ("Finished", f"{finished_count:.0f}"),
+        ],
+        "Latency": [],
+        "Resources": [
+            ("Git processes", _format_count(metrics.get("pykek_git_processes"))),
+            ("Open repositories", _format_count(metrics.get("pykek_open_repos"))),
+            ("Memory", _format_bytes(metrics.get("pykek_resident_memory_bytes"))),
+        ],
+        "Caches": [
+            (cache.capitalize(), f"{rate:.0%} hit rate")
+            for cache, rate in sorted(cache_hit_rates().items())
+        ],
+        "Transfers": [],
+    }
+    durations = metrics.get("pykek_operation_duration_seconds")
+    if isinstance(durations, Histogram):
+        for labels in sorted(durations.label_sets(), key=lambda s: s["operation"]):
+            p50 = durations.quantile(0.5, **labels) or 0.0
+            p95 = durations.quantile(0.95, **labels) or 0.0
+            snapshot["Latency"].append(
+                (
+                    labels["operation"].replace("_", " ").capitalize(),
+                    f"p50 {p50:.2f}s, p95 {p95:.2f}s, {durations.count(**labels)} run(s)",
+                )
+            )
+    transferred = metrics.get("pykek_transfer_bytes_total")
+    rates = metrics.get("pykek_transfer_rate_bytes_per_second")
+    if isinstance(transferred, Counter):
+        for _, labels, received in sorted(transferred.samples()):
+            host = dict(labels).get("host", "")
+            rate = (
+                rates.quantile(0.5, host=host) if isinstance(rates, Histogram) else None
+            )
+            subtitle = f"{_format_size(received)} received"
+            if rate is not None:
+                subtitle += f", {_format_size(rate)}/s median"
+            snapshot["Transfers"].append((host, subtitle))
+    return snapshot
+
+
+def _format_size(size: float) -> str:
+    for unit in ["bytes", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def _format_count(metric) -> str:
+    value = _value(metric)
+    return "unknown" if value is None else f"{value:.0f}"
+
+
+def _format_bytes(metric) -> str:
+    value = _value(metric)
+    return "unknown" if value is None else f"{value / 1024 / 1024:.0f} MB"
+
+
+def _value(metric) -> Optional[float]:
+    samples = metric.samples() if metric is not None else []
+    return samples[0][2] if len(samples) > 0 else None
+
+
+class DiagnosticsPage(Adw.NavigationPage):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.set_title("Diagnostics")
+        self._live_groups: Dict[str, Adw.PreferencesGroup] = {}
+        self._live_rows: Dict[str, List[Adw.ActionRow]] = {}
+        self._setup_box()
+        self._setup_header_bar()
+        self._setup_preferences_page()
+        self._setup_live_groups()
+
+    ### UI
+
+    def _setup_box(self) -> None:
+        self._box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self.set_child(self._box)
+
+    def _setup_header_bar(self) -> None:
+        self._box.append(Adw.HeaderBar())
+
+    def _setup_preferences_page(self) -> None:
+        self._pref_page = Adw.PreferencesPage.new()
+        self._pref_page.set_vexpand(True)
+        self._box.append(self._pref_page)
+
+    def _setup_live_groups(self) -> None:
+        for title in ["Operations", "Latency", "Resources", "Caches", "Transfers"]:
+            group = Adw.PreferencesGroup(title=title)
+            self._pref_page.add(group)
+            self._live_groups[title] = group
+            self._live_rows[title] = []
+
+    ### Metrics
+
+    def show_metrics(self, snapshot: Snapshot) -> bool:
+        for title, values in snapshot.items():
+            group, rows = self._live_groups[title], self._live_rows[title]
+            while len(rows) < len(values):
+                row = Adw.ActionRow()
+                row.add_css_class("property")
+                group.add(row)
+                rows.append(row)
+            while len(rows) > len(values):
+                group.remove(rows.pop())
+            for row, (row_title, subtitle) in zip(rows, values):
+                row.set_title(row_title)
+                row.set_subtitle(subtitle)
+            group.set_description("Nothing recorded yet" if len(values) == 0 else None)
+        return GLib.SOURCE_REMOVE
+
+    ### Timings
+
+    def show_timings(self, slowest: Dict[str, List[TimingStats]]) -> bool:
+        for operation, title in _OPERATIONS.items():
+            group = Adw.PreferencesGroup(title=title)
+            if len(slowest[operation]) == 0:
+                group.set_description("Nothing recorded yet")
+            for stats in slowest[operation]:
+                row = Adw.ActionRow(
+                    title=os.path.basename(stats.addon),
+                    subtitle=(
+                        f"{stats.mean:.1f}s on average, {stats.p90:.1f}s p90, "
+                        f"over the last {stats.count} run(s)"
+                    ),
+                )
+                row.set_tooltip_text(stats.addon)
+                group.add(row)
+            self._pref_page.add(group)
+        return GLib.SOURCE_REMOVE
@@ -2,6 +2,7 @@ import re
 from gi.repository import Adw  # type: ignore
 
 from pykek.backend.addon import Addon
+from pykek.backend.catalog import catalog
 from pykek.frontend.git.download_page import GitDownloadPageController
 from pykek.frontend.git.setup_page import GitSetupPage, GitSetupPageController
 from pykek.frontend.git.final_page import GitFinalPageController
@@ -18,10 +19,14 @@ class GitDialogController:
         )
 
     def run(self) -> None:
+        suggested_url = None
+        if self._addon.catalog_entry is not None:
+            suggested_url = self._addon.catalog_entry.url
         setup_controller = GitSetupPageController(
             self,
             self._navigation_view,
             self._addon.name,
+            suggested_url,
         )
         setup_controller.run()
         self._dialog.present(self._window)
@@ -53,6 +58,8 @@ class GitDialogController:
     ) -> None:
         valid_url = self._is_valid_url(text)
         page.enable_save_button(valid_url)
+        # Known repositories are suggested until a URL is complete
+        page.show_suggestions([] if valid_url else catalog.search(text))
 
     def close_button_clicked(self, _) -> None:
         self._dialog.close()
@@ -1,8 +1,9 @@
 import threading
-from gi.repository import Gtk, Adw  # type: ignore
-from loguru import logger
+from gi.repository import GLib, Gtk, Adw  # type: ignore
+from pykek.log import logger
 
 from pykek.backend.addon import Addon
+from pykek.backend.transfer import TransferProgress
 from pykek.frontend.git.dialog_coordinator import GitDialogCoordinator
 
 
@@ -32,7 +33,7 @@ class GitDownloadPageController:
     def _clone_addon(self) -> None:
         self._addon.backup()
         try:
-            Addon.clone(self._git_url, self._addon.dir_path)
+            Addon.clone(self._git_url, self._addon.dir_path, listener=self)
             self._addon.is_git = True
             self._addon.reload_branches()
             self._addon.update_status()
@@ -44,6 +45,12 @@ class GitDownloadPageController:
             self._addon.restore_backup()
             self._coordinator.install_failed()
 
+    ### TransferListener
+
+    def transfer_did_progress(self, progress: TransferProgress) -> None:
+        # Progress is already throttled by the backend, at most 10 updates a second
+        GLib.idle_add(self._view.show_progress, progress)
+
 
 class GitDownloadPage(Adw.NavigationPage):
     def __init__(self, *args, **kwargs) -> None:
@@ -56,6 +63,7 @@ class GitDownloadPage(Adw.NavigationPage):
 
         self._setup_spinner_description_label()
         self._setup_spinner()
+        self._setup_progress_bar()
 
     ### UI
 
@@ -80,13 +88,30 @@ class GitDownloadPage(Adw.NavigationPage):
         self._box.append(self._content_box)
 
     def _setup_spinner_description_label(self) -> None:
-        label = Gtk.Label()
-        label.set_css_classes(["dimmed"])
-        label.set_text("Retrieving addon from git repository...")
-        label.set_hexpand(True)
-        self._content_box.append(label)
+        self._description_label = Gtk.Label()
+        self._description_label.set_css_classes(["dimmed"])
+        self._description_label.set_text("Retrieving addon from git repository...")
+        self._description_label.set_hexpand(True)
+        self._content_box.append(self._description_label)
 
     def _setup_spinner(self) -> None:
         spinner = Gtk.Spinner(height_request=32)
         self._content_box.append(spinner)
         spinner.start()
+
+    def _setup_progress_bar(self) -> None:
+        self._progress_bar = Gtk.ProgressBar()
+        self._progress_bar.set_visible(False)
+        self._content_box.append(self._progress_bar)
+
+    ### Progress
+
+    def show_progress(self, progress: TransferProgress) -> bool:
+        self._description_label.set_text(progress.summary())
+        fraction = progress.fraction()
+        if fraction is None:
+            self._progress_bar.pulse()
+        else:
+            self._progress_bar.set_fraction(fraction)
+        self._progress_bar.set_visible(True)
+        return GLib.SOURCE_REMOVE
@@ -1,5 +1,7 @@
+from typing import List, Optional
 from gi.repository import Gtk, Adw  # type: ignore
 
+from pykek.backend.catalog import CatalogEntry
 from pykek.frontend.git.dialog_coordinator import GitDialogCoordinator  # type: ignore
 
 
@@ -9,10 +11,12 @@ class GitSetupPageController:
         coordinator: GitDialogCoordinator,
         navigation_view: Adw.NavigationView,
         addon_name: str,
+        suggested_url: Optional[str] = None,
     ) -> None:
         self._coordinator = coordinator
         self._navigation_view = navigation_view
         self._addon_name = addon_name
+        self._suggested_url = suggested_url
         self._view = GitSetupPage(self)
 
     def run(self) -> None:
@@ -21,6 +25,9 @@ class GitSetupPageController:
     def addon_name(self) -> str:
         return self._addon_name
 
+    def suggested_url(self) -> Optional[str]:
+        return self._suggested_url
+
     ### Actions
 
     def on_entry_row_change(self, page, text: str) -> None:
@@ -51,6 +58,7 @@ class GitSetupPage(Adw.NavigationPage):
 
         self._setup_description_label()
         self._setup_entry_row()
+        self._setup_suggestions_list()
         self._setup_entry_row_multiaddons_warning_label()
         self._setup_entry_row_description_label()
 
@@ -100,6 +108,17 @@ class GitSetupPage(Adw.NavigationPage):
         self._entry_row.connect("changed", self._on_entry_row_change)
         self._content_box.append(self._entry_row)
 
+    def _setup_suggestions_list(self) -> None:
+        self._suggestions_list = Gtk.ListBox()
+        self._suggestions_list.set_css_classes(["boxed-list"])
+        self._suggestions_list.set_selection_mode(Gtk.SelectionMode.NONE)
+        self._suggestions_list.set_visible(False)
+        self._content_box.append(self._suggestions_list)
+        # Set last, the suggestions list must exist when the change is handled
+        suggested_url = self._controller.suggested_url()
+        if suggested_url is not None:
+            self._entry_row.set_text(suggested_url)
+
     def _setup_entry_row_multiaddons_warning_label(self) -> None:
         label = Gtk.Label()
         label.set_css_classes(["warning"])
@@ -135,3 +154,15 @@ class GitSetupPage(Adw.NavigationPage):
 
     def enable_save_button(self, enabled: bool) -> None:
         self._install_button.set_sensitive(enabled)
+
+    def show_suggestions(self, entries: List[CatalogEntry]) -> None:
+        self._suggestions_list.remove_all()
+        for entry in entries:
+            row = Adw.ActionRow(title=entry.name, subtitle=entry.url)
+            row.set_activatable(True)
+            row.connect("activated", self._on_suggestion_activated, entry.url)
+            self._suggestions_list.append(row)
+        self._suggestions_list.set_visible(len(entries) > 0)
+
+    def _on_suggestion_activated(self, _, url: str) -> None:
+        self._entry_row.set_text(url)
@@ -35,7 +35,7 @@ class OnboardingController:
         try:
             instance = GameInstance.from_dir_path(dir_path)
             Config.add_game_instance(instance)
-            Config.write()
+            Config.schedule_write()
             self._on_onboarding_selection()
         except Exception as _:
             self._view.show_not_a_wow_directory_popover()
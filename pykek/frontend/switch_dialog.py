@@ -0,0 +1,104 @@
+from typing import Callable, List, Optional
+from gi.repository import Gtk, Adw  # type: ignore
+
+# First entry of the authors list, switching addons of every author
+_EVERY_AUTHOR = "Every author"
+
+
+class SwitchBranchController:
+    """
+    Asks for a branch (and optionally an author) to switch many addons to.
+    Authors can be set once the dialog is shown, they read every addon remote.
+    """
+
+    def __init__(
+        self,
+        window: Adw.ApplicationWindow,
+        authors: List[str],
+        on_switch: Callable[[str, Optional[str]], None],
+    ) -> None:
+        self._window = window
+        self._authors = authors
+        self._on_switch = on_switch
+        self._view = SwitchBranchDialog(self)
+
+    def run(self) -> None:
+        self._view.present(self._window)
+
+    def authors(self) -> List[str]:
+        return [_EVERY_AUTHOR] + self._authors
+
+    def set_authors(self, authors: List[str]) -> None:
+        """Must be called from the main thread"""
+        self._authors = authors
+        self._view.reload_authors()
+
+    def switch(self, branch: str, author_index: int) -> None:
+        author = self._authors[author_index - 1] if author_index > 0 else None
+        self._view.close()
+        self._on_switch(branch.strip(), author)
+
+
+class SwitchBranchDialog(Adw.Dialog):
+    def __init__(self, controller: SwitchBranchController, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._controller = controller
+        self.set_title("Switch branch")
+        self.set_content_width(400)
+        self._setup_box()
+        self._setup_rows()
+        self._setup_switch_button()
+
+    ### UI
+
+    def _setup_box(self) -> None:
+        toolbar_view = Adw.ToolbarView()
+        toolbar_view.add_top_bar(Adw.HeaderBar())
+        self._box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self._box.set_spacing(12)
+        self._box.set_margin_top(12)
+        self._box.set_margin_start(25)
+        self._box.set_margin_end(25)
+        self._box.set_margin_bottom(25)
+        toolbar_view.set_content(self._box)
+        self.set_child(toolbar_view)
+
+    def _setup_rows(self) -> None:
+        list_box = Gtk.ListBox()
+        list_box.set_css_classes(["boxed-list"])
+        list_box.set_selection_mode(Gtk.SelectionMode.NONE)
+        self._branch_row = Adw.EntryRow(title="Branch")
+        self._branch_row.connect("changed", self._on_branch_row_change)
+        list_box.append(self._branch_row)
+        self._author_row = Adw.ComboRow(
+            title="Author", model=Gtk.StringList.new(self._controller.authors())
+        )
+        list_box.append(self._author_row)
+        self._box.append(list_box)
+
+        label = Gtk.Label()
+        label.set_css_classes(["dimmed"])
+        label.set_text("Addons without this branch are left alone.")
+        label.set_halign(Gtk.Align.START)
+        self._box.append(label)
+
+    def reload_authors(self) -> None:
+        self._author_row.set_model(Gtk.StringList.new(self._controller.authors()))
+
+    def _setup_switch_button(self) -> None:
+        self._switch_button = Gtk.Button(label="Switch")
+        self._switch_button.set_css_classes(["pill", "suggested-action"])
+        self._switch_button.set_halign(Gtk.Align.CENTER)
+        self._switch_button.set_sensitive(False)
+        self._switch_button.connect("clicked", self._on_switch_button_click)
+        self._box.append(self._switch_button)
+
+    ### Actions
+
+    def _on_branch_row_change(self, entry_row: Adw.EntryRow) -> None:
+        self._switch_button.set_sensitive(entry_row.get_text().strip() != "")
+
+    def _on_switch_button_click(self, _) -> None:
+        self._controller.switch(
+            self._branch_row.get_text(), self._author_row.get_selected()
+        )
@@ -1,24 +1,51 @@
-from gi.repository import Adw  # type: ignore # noqa: E402
-from pykek.backend.config import Config  # noqa: E402
-from pykek.frontend.addons import AddonsController
-from pykek.frontend.onboarding import OnboardingController  # noqa: E402
+import os
+import threading
+from gi.repository import Adw, GLib, Gtk  # type: ignore # noqa: E402
 
 
 class MainWindowController:
     def __init__(self, app) -> None:
+        self._app = app
         self._view = MainWindow(self, application=app)
 
     def run(self) -> None:
         self._view.present()
+        if os.environ.get("PYKEK_QUIT_AFTER_FIRST_FRAME"):
+            self._quit_after_first_frame()
+        # Heavy modules and the config are loaded once the window is on screen
+        thread = threading.Thread(target=self._warm_up)
+        thread.start()
+
+    def _warm_up(self) -> None:
+        # Only modules without GTK, the widget modules are imported on the main
+        # thread by _on_warm_up_done
+        import git  # noqa: F401
+        import pykek.backend.bulk_update  # noqa: F401
+        import pykek.backend.daemon  # noqa: F401
+        import pykek.backend.fetch_coordinator  # noqa: F401
+        import pykek.backend.metrics  # noqa: F401
+        from pykek.backend.config import Config
+
+        Config.load()
+        GLib.idle_add(self._on_warm_up_done)
+
+    def _on_warm_up_done(self) -> bool:
+        from pykek.backend.config import Config
+
         self._run_addons_page()
         if len(Config.game_instances) == 0:
             self._run_onboarding()
+        return GLib.SOURCE_REMOVE
 
     def _run_addons_page(self) -> None:
+        from pykek.frontend.addons import AddonsController
+
         addons_controller = AddonsController(self._view, self._view.navigation_view)
         addons_controller.run()
 
     def _run_onboarding(self) -> None:
+        from pykek.frontend.onboarding import OnboardingController
+
         onboarding_controller = OnboardingController(self._view)
         onboarding_controller.connect_on_closed(self._on_onboarding_closed)
         onboarding_controller.connect_on_selection(
@@ -27,12 +54,18 @@ class MainWindowController:
         onboarding_controller.run()
 
     def _on_onboarding_closed(self):
+        from pykek.backend.config import Config
+
         if len(Config.game_instances) == 0:
             quit()
 
-    def _on_onboarding_selection(self, onboarding: OnboardingController) -> None:
+    def _on_onboarding_selection(self, onboarding) -> None:
         onboarding.close()
 
+    def _quit_after_first_frame(self) -> None:
+        frame_clock = self._view.get_frame_clock()
+        frame_clock.connect("after-paint", lambda _: self._app.quit())
+
 
 class MainWindow(Adw.ApplicationWindow):
     def __init__(self, controller: MainWindowController, *args, **kwargs) -> None:
@@ -48,4 +81,13 @@ class MainWindow(Adw.ApplicationWindow):
 
     def _setup_navigation_view(self) -> None:
         self.navigation_view = Adw.NavigationView()
+        self.navigation_view.add(self._loading_page())
         self.set_content(self.navigation_view)
+
+    def _loading_page(self) -> Adw.NavigationPage:
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.append(Adw.HeaderBar())
+        spinner = Gtk.Spinner(height_request=32, vexpand=True)
+        spinner.start()
+        box.append(spinner)
+        return Adw.NavigationPage(title="pykek", child=box)
@@ -0,0 +1,13 @@
+class _LazyLogger:
+    """
+    Forwards to loguru's logger, importing loguru on first use
+    so that it doesn't weigh on startup time.
+    """
+
+    def __getattr__(self, name: str):
+        from loguru import logger as loguru_logger
+
+        return getattr(loguru_logger, name)
+
+
+logger = _LazyLogger()
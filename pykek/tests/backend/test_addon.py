@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import List, Optional
 
 import pytest
 from pykek.backend.addon import Addon, _TOCInfo
@@ -36,3 +37,63 @@ class TestAddon:
         toc = _TOCInfo.from_toc_path(Path("/fake/path/VeryCoolAddon/VeryCoolAddon.toc"))
 
         assert toc.version == "1.4.5"
+
+    def test_toc_info_dependencies(self, fs) -> None:
+        "Test that required and optional dependencies are read from the TOC"
+        fs.create_file(
+            "/fake/path/VeryCoolAddon/VeryCoolAddon.toc",
+            contents="""## Interface: 110002
+## Dependencies: LibStub, Ace3
+## RequiredDeps: Ace3,LibDataBroker
+## DepsExtra: Details
+## OptionalDeps: Masque ,  ,WeakAuras\r
+## X-Dependencies-Note: ignored""",
+        )
+
+        toc = _TOCInfo.from_toc_path(Path("/fake/path/VeryCoolAddon/VeryCoolAddon.toc"))
+
+        assert toc.dependencies == ["LibStub", "Ace3", "LibDataBroker", "Details"]
+        assert toc.optional_dependencies == ["Masque", "WeakAuras"]
+
+    def test_refresh_toc_info(self, fs) -> None:
+        "Test that refreshing the TOC info updates the title, version and dependencies"
+        toc_path = "/fake/path/VeryCoolAddon/VeryCoolAddon.toc"
+        fs.create_file(toc_path, contents="## Title: Very Cool\n## Version: 1.0\n")
+        addon = Addon.from_dir_path(Path("/fake/path/VeryCoolAddon"))
+        Path(toc_path).write_text(
+            "## Title: Very Cool Addon\n## Version: 2.0\n## Dependencies: LibStub\n"
+        )
+
+        addon.refresh_toc_info()
+
+        assert addon.title == "Very Cool Addon"
+        assert addon.version == "2.0"
+        assert addon.dependencies == ["LibStub"]
+
+    def test_refresh_unreadable_toc_info(self, fs) -> None:
+        "Test that the TOC info is reset and listeners notified once it's gone"
+        toc_path = "/fake/path/VeryCoolAddon/VeryCoolAddon.toc"
+        fs.create_file(
+            toc_path,
+            contents="## Title: Very Cool\n## Version: 1.0\n## OptionalDeps: Ace3\n",
+        )
+        addon = Addon.from_dir_path(Path("/fake/path/VeryCoolAddon"))
+        titles: List[Optional[str]] = []
+
+        class Listener:
+            def addon_title_did_change(self, new_title: Optional[str]) -> None:
+                titles.append(new_title)
+
+            def addon_version_did_change(self, new_version: Optional[str]) -> None:
+                pass
+
+        addon.add_listener(Listener())  # type: ignore[arg-type]
+        Path(toc_path).unlink()
+
+        addon.refresh_toc_info()
+
+        assert addon.title is None
+        assert addon.version is None
+        assert addon.dependencies == []
+        assert addon.optional_dependencies == []
+        assert titles == [None]
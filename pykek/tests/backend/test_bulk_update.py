@@ -0,0 +1,90 @@
+from typing import Dict, List
+from pykek.backend import bulk_update
+from pykek.backend.addon import AddonStatus
+from pykek.backend.bulk_update import BulkUpdateProgress
+from pykek.backend.game_instance import GameInstance
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestBulkUpdate:
+    ### Helpers
+
+    def _instance(self, tmp_path, count: int) -> GameInstance:
+        wow_dir = tmp_path / "wow"
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        for i in range(count):
+            work = make_upstream(tmp_path, f"Addon{i}")
+            clone_addon(work, wow_dir / "Interface" / "AddOns")
+            for j in range(i + 1):
+                push_commit(work, f"Update {j}", version=f"1.{j + 1}")
+        instance = GameInstance.from_dir_path(str(wow_dir))
+        instance.load_addons()
+        for addon in instance.addons:
+            addon.update_status()
+        return instance
+
+    ### Tests
+
+    def test_update_all(self, tmp_path) -> None:
+        "Test that every outdated addon is updated and reported once done"
+        instance = self._instance(tmp_path, 3)
+        progresses: List[BulkUpdateProgress] = []
+
+        class Listener:
+            def bulk_update_did_progress(self, progress) -> None:
+                progresses.append(progress)
+
+        result = instance.update_all(listener=Listener(), max_parallel=2)
+
+        assert len(result.updated) == 3
+        assert result.failed == {}
+        assert all(a.current_status == AddonStatus.UP_TO_DATE for a in instance.addons)
+        assert sorted(a.version or "" for a in instance.addons) == ["1.1", "1.2", "1.3"]
+        assert progresses[-1].done == 3
+        assert progresses[-1].eta() == 0
+
+    def test_all_or_nothing_rollback(self, tmp_path) -> None:
+        "Test that a failure rolls every updated addon back to its previous commit"
+        instance = self._instance(tmp_path, 2)
+        previous_shas = {a.name: a.git_info().sha for a in instance.addons}
+        broken = instance.addons[0]
+        broken.current_branch = "deleted-branch"
+
+        result = instance.update_all(all_or_nothing=True)
+
+        assert result.rolled_back
+        assert list(result.failed) == [broken.name]
+        assert result.updated == []
+        for addon in instance.addons:
+            assert addon.git_info().sha == previous_shas[addon.name]
+            assert addon.version == "1.0"
+
+    def test_eta_from_recorded_durations(self) -> None:
+        "Test that the ETA uses the expected work left before anything finished"
+        progress = BulkUpdateProgress(total=4, expected_work=12.0, parallelism=2)
+
+        assert progress.eta() == 6.0
+        assert BulkUpdateProgress(total=4).eta() is None
+
+    def test_libraries_first(self, tmp_path, monkeypatch) -> None:
+        "Test that libraries are updated before the addons depending on them"
+        instance = self._instance(tmp_path, 3)
+        library, *dependents = sorted(instance.addons, key=lambda a: a.name)
+        for addon in dependents:
+            addon.dependencies = [library.name]
+        operations: Dict[str, object] = {}
+        library_done_at_start: List[bool] = []
+        update_addon = bulk_update.update_addon
+
+        def recording_update_addon(addon, **kwargs):
+            if addon is not library:
+                library_done_at_start.append(operations[library.name].future.done())
+            operations[addon.name] = update_addon(addon, **kwargs)
+            return operations[addon.name]
+
+        monkeypatch.setattr(bulk_update, "update_addon", recording_update_addon)
+        result = instance.update_all(max_parallel=4)
+
+        assert len(result.updated) == 3
+        assert library_done_at_start == [True, True]
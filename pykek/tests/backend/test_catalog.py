@@ -0,0 +1,122 @@
+import json
+import pytest
+from pykek.backend.catalog import Catalog, CatalogEntry, catalog, normalize
+from pykek.backend.game_instance import GameInstance
+
+_ENTRIES = [
+    CatalogEntry("Details", "https://github.com/Tercioo/Details-Damage-Meter"),
+    CatalogEntry("AdiBags", "https://github.com/AdiAddons/AdiBags"),
+    CatalogEntry("Bagnon", "https://github.com/Jaliborc/Bagnon"),
+    CatalogEntry(
+        "DBM-Core",
+        "https://github.com/DeadlyBossMods/DeadlyBossMods.git",
+        title="|cffff7d0aDeadly Boss Mods|r",
+    ),
+]
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(
+        json.dumps({e.name: {"url": e.url, "title": e.title} for e in _ENTRIES})
+    )
+    catalog.path = path
+    yield path
+    catalog.clear()
+
+
+class TestCatalog:
+    ### Helpers
+
+    def _catalog(self) -> Catalog:
+        catalog = Catalog()
+        catalog.set_entries(_ENTRIES)
+        return catalog
+
+    def _names(self, entries) -> list:
+        return [entry.name for entry in entries]
+
+    ### Tests
+
+    def test_normalize(self) -> None:
+        "Test that color codes, case and punctuation don't matter"
+        assert normalize("|cff00ff00Deadly Boss-Mods|r") == "deadlybossmods"
+
+    def test_search(self) -> None:
+        "Test that prefixes, substrings, typos and URLs find their entry"
+        catalog = self._catalog()
+
+        assert self._names(catalog.search("det"))[0] == "Details"
+        assert self._names(catalog.search("detials")) == ["Details"]
+        assert set(self._names(catalog.search("bags"))) == {"AdiBags", "Bagnon"}
+        assert self._names(catalog.search("deadly boss")) == ["DBM-Core"]
+        assert self._names(catalog.search("github.com/AdiAddons/AdiBags.git")) == [
+            "AdiBags"
+        ]
+        assert catalog.search("zzz") == []
+        assert self._names(catalog.search("d")) == ["Details", "DBM-Core"]
+        assert len(catalog.search("d", limit=1)) == 1
+
+    def test_exact_match_first(self) -> None:
+        "Test that an exact name ranks before longer names it prefixes"
+        catalog = Catalog()
+        catalog.set_entries(
+            [
+                CatalogEntry("WeakAurasOptions", "https://example.com/a/WAO"),
+                CatalogEntry("WeakAuras", "https://example.com/a/WA"),
+            ]
+        )
+
+        assert self._names(catalog.search("weakauras")) == [
+            "WeakAuras",
+            "WeakAurasOptions",
+        ]
+
+    def test_load_files(self, tmp_path) -> None:
+        "Test that JSON mappings and YAML lists are loaded on first use"
+        json_path = tmp_path / "catalog.json"
+        json_path.write_text(
+            json.dumps(
+                {
+                    "Details": "https://github.com/Tercioo/Details-Damage-Meter",
+                    "Bagnon": {
+                        "url": "https://github.com/Jaliborc/Bagnon",
+                        "author": "Jaliborc",
+                    },
+                    "Broken": 42,
+                }
+            )
+        )
+        yaml_path = tmp_path / "catalog.yml"
+        yaml_path.write_text(
+            "- name: AdiBags\n  url: https://github.com/AdiAddons/AdiBags\n"
+        )
+        catalog = Catalog()
+
+        catalog.path = json_path
+        assert self._names(catalog.entries()) == ["Details", "Bagnon"]
+        assert catalog.entries()[1].author == "Jaliborc"
+        catalog.path = yaml_path
+        assert self._names(catalog.entries()) == ["AdiBags"]
+        catalog.path = tmp_path / "missing.json"
+        assert catalog.entries() == []
+
+    def test_match_addons(self, tmp_path, catalog_file) -> None:
+        "Test that non-git addons are matched by folder name or TOC title on load"
+        wow_dir = tmp_path / "wow"
+        addons_dir = wow_dir / "Interface" / "AddOns"
+        for name in ["Details", "DBM-StatusBarTimers", "Unknown"]:
+            (addons_dir / name).mkdir(parents=True)
+        (addons_dir / "DBM-StatusBarTimers" / "DBM-StatusBarTimers.toc").write_text(
+            "## Title: |cffff7d0aDeadly Boss Mods|r\n"
+        )
+        (wow_dir / "WoW.exe").touch()
+        instance = GameInstance.from_dir_path(str(wow_dir))
+
+        instance.load_addons()
+
+        matches = {a.name: a.catalog_entry for a in instance.addons}
+        assert matches["Details"] == _ENTRIES[0]
+        assert matches["DBM-StatusBarTimers"] == _ENTRIES[3]
+        assert matches["Unknown"] is None
@@ -1,7 +1,9 @@
 import os
 from pathlib import Path
-from pykek.backend.config import Config
+from pykek.backend.catalog import catalog
+from pykek.backend.config import Config, InstanceSettings
 from pykek.backend.game_instance import GameInstance
+from pykek.backend.remote import remote_policy
 
 
 class TestConfig:
@@ -107,3 +109,147 @@ class TestConfig:
             raw_conf = f.read()
             f.close()
             assert raw_conf == expected_raw_conf
+
+    def test_load_favorite_instance(self, fs) -> None:
+        "Test `Config.load()` with a favorite instance among 2 valid instances."
+        fs.create_file("/games/wow1/WoW.exe")
+        fs.create_file("/games/wow2/WoW.exe")
+        fs.create_file(
+            "/config/pykek/config.yml",
+            contents="""favorite: /games/wow2
+instances:
+- /games/wow1
+- /games/wow2
+""",
+        )
+
+        Config.load()
+
+        assert Config.favorite_instance is Config.game_instances[1]
+
+    def test_write_favorite_instance(self, fs) -> None:
+        "Test `Config.write()` with a favorite instance."
+        Config.load()
+        fs.create_file("/games/wow1/WoW.exe")
+        fs.create_file("/games/wow2/WoW.exe")
+        Config.game_instances.append(GameInstance.from_dir_path("/games/wow1"))
+        Config.game_instances.append(GameInstance.from_dir_path("/games/wow2"))
+        Config.favorite_instance = Config.game_instances[1]
+        expected_raw_conf = """favorite: /games/wow2
+instances:
+- /games/wow1
+- /games/wow2
+"""
+
+        Config.write()
+        with open(Config.CONFIG_FILE_PATH, "r") as f:
+            raw_conf = f.read()
+            f.close()
+            assert raw_conf == expected_raw_conf
+
+    def test_load_instance_settings_and_limits(self, fs) -> None:
+        "Test `Config.load()` with per-instance settings and concurrency limits."
+        fs.create_file("/games/wow1/WoW.exe")
+        fs.create_file("/games/wow2/WoW.exe")
+        fs.create_file(
+            "/config/pykek/config.yml",
+            contents="""instances:
+- /games/wow1
+- path: /games/wow2
+  check_for_updates: false
+max_per_host: 2
+""",
+        )
+        max_per_host = remote_policy.max_per_host
+
+        Config.load()
+
+        assert Config.settings(Config.game_instances[0]).check_for_updates
+        assert not Config.settings(Config.game_instances[1]).check_for_updates
+        assert remote_policy.max_per_host == 2
+        remote_policy.max_per_host = max_per_host
+
+    def test_catalog_path(self, fs) -> None:
+        "Test that the catalog path is loaded from and written to the config file."
+        fs.create_file("/games/wow/WoW.exe")
+        fs.create_file(
+            "/config/pykek/config.yml",
+            contents="""catalog: /addons/catalog.json
+instances:
+- /games/wow
+""",
+        )
+
+        Config.load()
+        assert catalog.path == Path("/addons/catalog.json")
+        Config.write()
+
+        with open(Config.CONFIG_FILE_PATH, "r") as f:
+            assert "catalog: /addons/catalog.json" in f.read()
+
+    def test_load_schema_errors(self, fs) -> None:
+        "Test that `Config.load()` keeps a config file with schema errors aside."
+        fs.create_file("/games/wow/WoW.exe")
+        fs.create_file(
+            "/config/pykek/config.yml",
+            contents="""instances:
+- path: /games/wow
+  check_for_updates: sometimes
+""",
+        )
+
+        Config.load()
+
+        assert len(Config.game_instances) == 0
+        assert os.path.exists("/config/pykek/config.yml.invalid")
+
+    def test_load_corrupt_yaml(self, fs) -> None:
+        "Test that `Config.load()` keeps a corrupt config file aside."
+        fs.create_file("/config/pykek/config.yml", contents="instances: [/games/wow")
+
+        Config.load()
+
+        assert len(Config.game_instances) == 0
+        with open("/config/pykek/config.yml.invalid", "r") as f:
+            assert f.read() == "instances: [/games/wow"
+
+    def test_write_is_atomic(self, fs) -> None:
+        "Test that `Config.write()` replaces the config file through a temporary file."
+        fs.create_file("/games/wow/WoW.exe")
+        fs.create_file("/config/pykek/config.yml", contents="instances: []\n")
+        Config.game_instances.append(GameInstance.from_dir_path("/games/wow"))
+        Config.instance_settings["/games/wow"] = InstanceSettings(
+            check_for_updates=False
+        )
+
+        Config.write()
+
+        assert os.listdir("/config/pykek") == ["config.yml"]
+        Config.game_instances = []
+        Config.instance_settings = {}
+        Config.load()
+        assert not Config.settings(Config.game_instances[0]).check_for_updates
+
+    def test_schedule_write_coalesces_changes(self, fs, monkeypatch) -> None:
+        "Test that scheduled writes are debounced into a single write."
+        Config.load()
+        fs.create_file("/games/wow1/WoW.exe")
+        fs.create_file("/games/wow2/WoW.exe")
+        writes = []
+        write = Config.write
+
+        def counting_write() -> None:
+            writes.append(1)
+            write()
+
+        monkeypatch.setattr(Config, "write", counting_write)
+
+        Config.game_instances.append(GameInstance.from_dir_path("/games/wow1"))
+        Config.schedule_write()
+        Config.game_instances.append(GameInstance.from_dir_path("/games/wow2"))
+        Config.schedule_write()
+        Config.flush()
+
+        assert len(writes) == 1
+        with open(Config.CONFIG_FILE_PATH, "r") as f:
+            assert f.read() == "instances:\n- /games/wow1\n- /games/wow2\n"
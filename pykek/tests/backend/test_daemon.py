@@ -0,0 +1,179 @@
+import socket
+import sys
+import threading
+import warnings
+import platformdirs
+import pytest
+from pykek.backend.config import Config
+from pykek.backend.daemon import (
+    Daemon,
+    DaemonClient,
+    DaemonError,
+    DaemonServer,
+    socket_path,
+)
+from pykek.backend.game_instance import GameInstance
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestDaemon:
+    ### Setup / Teardown
+
+    def teardown_method(self) -> None:
+        Config.reset()
+
+    ### Helpers
+
+    def _serve(self, tmp_path, daemon: Daemon) -> DaemonServer:
+        server = DaemonServer(daemon, tmp_path / "pykek.sock")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+    ### Tests
+
+    def test_client_not_running(self, tmp_path) -> None:
+        "Test that connecting without a running daemon returns None"
+        assert DaemonClient.connect(tmp_path / "pykek.sock") is None
+
+    @pytest.mark.skipif(sys.platform in ["darwin", "win32"], reason="XDG only")
+    def test_socket_path_without_runtime_dir(self, monkeypatch) -> None:
+        "Test that the socket goes to the user cache without a runtime directory"
+        monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            path = socket_path()
+
+        assert path.is_relative_to(platformdirs.user_cache_path(appname="pykek"))
+
+    def test_status_and_check(self, tmp_path) -> None:
+        "Test the daemon status and check methods through a client"
+        wow_dir = tmp_path / "wow"
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        work = make_upstream(tmp_path)
+        clone_addon(work, wow_dir / "Interface" / "AddOns")
+        push_commit(work, "Update", version="1.1")
+        Config.game_instances.append(GameInstance.from_dir_path(str(wow_dir)))
+        daemon = Daemon()
+        daemon.start()
+        server = self._serve(tmp_path, daemon)
+        client = DaemonClient.connect(server.socket_path)
+        assert client is not None
+
+        statuses = client.call("status")
+        checks = client.call("check", addons=["VeryCoolAddon"])
+
+        client.close()
+        server.shutdown()
+        server.server_close()
+        daemon.stop()
+        assert statuses[0]["addon"] == "VeryCoolAddon"
+        assert checks[0]["status"] == "outdated"
+
+    def test_concurrent_calls(self, tmp_path) -> None:
+        "Test that a call waiting on the daemon doesn't hold back other calls"
+        started = threading.Event()
+        release = threading.Event()
+
+        class SlowDaemon(Daemon):
+            def pause(self, reason: str) -> bool:
+                started.set()
+                return release.wait(timeout=5)
+
+        server = self._serve(tmp_path, SlowDaemon())
+        client = DaemonClient.connect(server.socket_path)
+        assert client is not None
+        thread = threading.Thread(
+            target=client.call, args=["pause"], kwargs={"reason": "test"}
+        )
+        thread.start()
+        started.wait(timeout=5)
+
+        instances = client.call("instances")
+        still_paused = thread.is_alive()
+        release.set()
+        thread.join()
+
+        client.close()
+        server.shutdown()
+        server.server_close()
+        assert instances == []
+        assert still_paused
+
+    def test_addons_installed_later(self, tmp_path) -> None:
+        "Test that addons installed after the daemon started are found on demand"
+        wow_dir = tmp_path / "wow"
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        Config.game_instances.append(GameInstance.from_dir_path(str(wow_dir)))
+        daemon = Daemon()
+        daemon.start()
+        server = self._serve(tmp_path, daemon)
+        client = DaemonClient.connect(server.socket_path)
+        assert client is not None
+        assert client.call("status") == []
+        addons_dir = wow_dir / "Interface" / "AddOns"
+        clone_addon(make_upstream(tmp_path), addons_dir)
+        clone_addon(make_upstream(tmp_path, "OtherAddon"), addons_dir)
+
+        checks = client.call("check", addons=["VeryCoolAddon"])
+        statuses = client.call("rescan")
+
+        client.close()
+        server.shutdown()
+        server.server_close()
+        daemon.stop()
+        assert checks[0]["status"] == "up_to_date"
+        assert {record["addon"] for record in statuses} == {
+            "OtherAddon",
+            "VeryCoolAddon",
+        }
+
+    def test_single_daemon(self, tmp_path) -> None:
+        "Test that a second daemon doesn't take the socket of a running one"
+        server = self._serve(tmp_path, Daemon())
+
+        with pytest.raises(DaemonError):
+            DaemonServer(Daemon(), server.socket_path)
+
+        client = DaemonClient.connect(server.socket_path)
+        assert client is not None
+        assert client.call("instances") == []
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    def test_stale_socket(self, tmp_path) -> None:
+        "Test that the socket left by a daemon that didn't exit cleanly is replaced"
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(str(tmp_path / "pykek.sock"))
+        stale.close()
+
+        server = self._serve(tmp_path, Daemon())
+
+        client = DaemonClient.connect(server.socket_path)
+        assert client is not None
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    def test_unknown_instance(self, tmp_path) -> None:
+        "Test that a path that isn't a configured instance is reported as unknown"
+        wow_dir = tmp_path / "wow"
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        Config.game_instances.append(GameInstance.from_dir_path(str(wow_dir)))
+        server = self._serve(tmp_path, Daemon())
+        client = DaemonClient.connect(server.socket_path)
+        assert client is not None
+
+        with pytest.raises(DaemonError, match="Unknown instance"):
+            client.call("status", instance=str(tmp_path / "missing"))
+        statuses = client.call("status", instance=str(wow_dir / "Interface" / ".."))
+
+        client.close()
+        server.shutdown()
+        server.server_close()
+        assert statuses == []
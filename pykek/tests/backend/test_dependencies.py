@@ -0,0 +1,112 @@
+import time
+from typing import List
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.dependencies import DependencyGraph
+
+
+class TestDependencyGraph:
+    ### Helpers
+
+    def _addon(
+        self, name: str, dependencies: List[str] = [], optional: List[str] = []
+    ) -> Addon:
+        return Addon(
+            dir_path=f"/wow/Interface/AddOns/{name}",
+            name=name,
+            is_git=False,
+            version=None,
+            current_status=AddonStatus.NON_GIT,
+            branches=[],
+            current_branch="",
+            dependencies=list(dependencies),
+            optional_dependencies=list(optional),
+        )
+
+    def _names(self, waves: List[List[Addon]]) -> List[List[str]]:
+        return [sorted(addon.name for addon in wave) for wave in waves]
+
+    ### Tests
+
+    def test_waves(self) -> None:
+        "Test that libraries come before their dependents, optional ones included"
+        lib = self._addon("LibStub")
+        ace = self._addon("Ace3", ["libstub"])
+        ui = self._addon("CoolUI", ["Ace3"], optional=["Details"])
+        details = self._addon("Details", ["LibStub"])
+        graph = DependencyGraph()
+        graph.sync([lib, ace, ui, details])
+
+        waves = graph.waves([ui, details, ace, lib])
+
+        assert self._names(waves) == [["LibStub"], ["Ace3", "Details"], ["CoolUI"]]
+        assert [a.name for a in graph.dependents(lib)] == ["Ace3", "Details"]
+        assert [a.name for a in graph.dependents(lib, transitive=True)] == [
+            "Ace3",
+            "CoolUI",
+            "Details",
+        ]
+
+    def test_waves_through_left_out_addons(self) -> None:
+        "Test that an addon waits for a library it only depends on transitively"
+        lib = self._addon("LibStub")
+        ace = self._addon("Ace3", ["LibStub"])
+        ui = self._addon("CoolUI", ["Ace3"])
+        graph = DependencyGraph()
+        graph.sync([lib, ace, ui])
+
+        assert self._names(graph.waves([ui, lib])) == [["LibStub"], ["CoolUI"]]
+
+    def test_missing_and_cycles(self) -> None:
+        "Test that missing required dependencies and cycles are reported"
+        a = self._addon("A", ["B"], optional=["NotInstalled"])
+        b = self._addon("B", ["A", "Missing"])
+        c = self._addon("C", ["C"])
+        d = self._addon("D", ["A"])
+        graph = DependencyGraph()
+        graph.sync([a, b, c, d])
+
+        assert graph.missing() == {"B": ["Missing"]}
+        assert sorted(graph.cycles()) == [["A", "B"], ["C"]]
+        # The addons of a cycle share a wave, their dependents come after
+        assert self._names(graph.waves([a, b, c, d])) == [["A", "B", "C"], ["D"]]
+
+    def test_sync_relinks_changed_addons(self) -> None:
+        "Test that a TOC change or a removed addon updates the graph"
+        lib = self._addon("LibStub")
+        ace = self._addon("Ace3")
+        graph = DependencyGraph()
+        graph.sync([lib, ace])
+        assert graph.dependents(lib) == []
+
+        ace.dependencies = ["LibStub"]
+        graph.sync([lib, ace])
+        assert graph.dependents(lib) == [ace]
+        assert self._names(graph.waves([lib, ace])) == [["LibStub"], ["Ace3"]]
+
+        graph.sync([ace])
+        assert graph.missing() == {"Ace3": ["LibStub"]}
+        assert self._names(graph.waves([ace])) == [["Ace3"]]
+
+    def test_large_instance(self) -> None:
+        "Test that thousands of addons, and long chains, are handled quickly"
+        addons = [
+            self._addon(f"Lib{i}", [f"Lib{i - 1}"] if i > 0 else [])
+            for i in range(2000)
+        ]
+        addons += [
+            self._addon(f"Addon{i}", [f"Lib{i % 50}", f"Lib{i % 7}"])
+            for i in range(3000)
+        ]
+        graph = DependencyGraph()
+
+        started_at = time.perf_counter()
+        graph.sync(addons)
+        waves = graph.waves(addons)
+        addons[-1].dependencies = ["Lib1999"]
+        graph.sync(addons)
+        graph.waves(addons)
+        elapsed = time.perf_counter() - started_at
+
+        assert len(waves) == 2000
+        assert graph.cycles() == []
+        assert elapsed < 2.0
@@ -0,0 +1,55 @@
+from pykek.backend.fetch_coordinator import FetchCoordinator
+from pykek.backend.remote import normalize_remote_url
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestFetchCoordinator:
+    ### Tests
+
+    def test_normalize_remote_url(self) -> None:
+        "Test that different spellings of the same remote share the same key"
+        expected = "github.com/author/VeryCoolAddon"
+
+        assert (
+            normalize_remote_url("https://github.com/author/VeryCoolAddon") == expected
+        )
+        assert (
+            normalize_remote_url("https://GitHub.com/author/VeryCoolAddon.git/")
+            == expected
+        )
+        assert (
+            normalize_remote_url("git@github.com:author/VeryCoolAddon.git") == expected
+        )
+        assert (
+            normalize_remote_url("ssh://git@github.com/author/VeryCoolAddon")
+            == expected
+        )
+
+    def test_fetch_same_remote_once(self, tmp_path) -> None:
+        "Test that two addons sharing a remote only fetch once from the network"
+        work = make_upstream(tmp_path)
+        first = clone_addon(work, tmp_path / "wow1")
+        second = clone_addon(work, tmp_path / "wow2")
+        new_sha = push_commit(work, "Update", version="1.1")
+        coordinator = FetchCoordinator()
+
+        coordinator.fetch(first, "main")
+        coordinator.fetch(second, "main")
+
+        assert coordinator.stats.network_fetches == 1
+        assert coordinator.stats.saved_fetches == 1
+        assert second.commit("origin/main").hexsha == new_sha
+
+    def test_begin_refresh_resets_stats(self, tmp_path) -> None:
+        "Test that a new refresh fetches from the network again"
+        work = make_upstream(tmp_path)
+        addon = clone_addon(work, tmp_path / "wow")
+        coordinator = FetchCoordinator()
+        coordinator.fetch(addon, "main")
+
+        previous = coordinator.begin_refresh()
+        coordinator.fetch(addon, "main")
+
+        assert previous.network_fetches == 1
+        assert coordinator.stats.network_fetches == 1
+        assert coordinator.stats.saved_fetches == 0
@@ -60,3 +60,34 @@ class TestGameInstance:
         instance.load_addons()
 
         assert len(instance.addons) == 1
+
+    def test_load_addons_notifies_instance(self, fs) -> None:
+        "Test that GameInstance loadAddons tells its listeners which instance loaded"
+        fs.create_file("/games/wow/WoW.exe")
+        fs.create_dir("/games/wow/Interface/AddOns/VeryCoolAddon")
+        instance = GameInstance.from_dir_path("/games/wow")
+        loaded = []
+
+        class Listener:
+            def addons_did_load(self, instance, addons) -> None:
+                loaded.append((instance, len(addons)))
+
+        instance.add_listener(Listener())
+        instance.load_addons()
+
+        assert loaded == [(instance, 1)]
+
+    def test_check_for_updates(self, fs) -> None:
+        "Test that GameInstance checkForUpdates checks every addon on the scheduler"
+        fs.create_file("/games/wow/WoW.exe")
+        fs.create_dir("/games/wow/Interface/AddOns/VeryCoolAddon")
+        fs.create_dir("/games/wow/Interface/AddOns/OtherAddon")
+        instance = GameInstance.from_dir_path("/games/wow")
+        instance.load_addons()
+
+        futures = instance.check_for_updates()
+        for future in futures:
+            future.result()
+
+        assert len(futures) == 2
+        assert all(a.current_status == AddonStatus.NON_GIT for a in instance.addons)
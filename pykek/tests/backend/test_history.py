@@ -0,0 +1,93 @@
+from pathlib import Path
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.game_instance import GameInstance
+from pykek.backend.history import History, history
+from pykek.backend.state_store import StateStore
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestHistory:
+    ### Tests
+
+    def test_last_entry(self, tmp_path) -> None:
+        "Test that the latest entry of an addon is returned"
+        log = History(StateStore(tmp_path / "state.db"))
+        log.record("/wow/A", "update", "main", "a" * 40)
+        log.record("/wow/B", "update", "main", "b" * 40)
+        log.record("/wow/A", "switch", "main", "c" * 40)
+
+        entry = log.last("/wow/A")
+
+        assert entry is not None
+        assert (entry.action, entry.sha) == ("switch", "c" * 40)
+        assert log.last("/wow/C") is None
+
+    def test_compaction(self, tmp_path) -> None:
+        "Test that the log only keeps the latest entries of each addon"
+        log = History(StateStore(tmp_path / "state.db"), max_entries_per_addon=3)
+        for i in range(11):
+            log.record("/wow/A", "update", "main", f"{i:040d}")
+
+        entries = log.entries("/wow/A")
+
+        assert [e.sha for e in entries] == [f"{i:040d}" for i in range(8, 11)]
+
+    def test_last_session(self, tmp_path) -> None:
+        "Test that the first position of each addon in the latest session is returned"
+        log = History(StateStore(tmp_path / "state.db"))
+        log.record("/wow/A", "update", "main", "a" * 40)
+        log.begin_session()
+        log.record("/wow/A", "update", "main", "b" * 40)
+        log.record("/wow/A", "update", "main", "c" * 40)
+        log.record("/wow/B", "switch", "main", "d" * 40)
+        log.record("/wow/B", "rollback", "dev", "e" * 40)
+
+        positions = log.last_session()
+
+        assert {k: v.sha for k, v in positions.items()} == {
+            "/wow/A": "b" * 40,
+            "/wow/B": "d" * 40,
+        }
+
+    def test_addon_rollback(self, tmp_path) -> None:
+        "Test that an update can be rolled back without network access"
+        work = make_upstream(tmp_path)
+        repo = clone_addon(work, tmp_path / "wow")
+        previous_sha = repo.head.commit.hexsha
+        push_commit(work, "Update", version="1.1")
+        addon = Addon.from_dir_path(Path(tmp_path / "wow" / "VeryCoolAddon"))
+        addon.update_status()
+        addon.update()
+
+        (tmp_path / "upstreams").rename(tmp_path / "offline")
+        entry = addon.rollback()
+
+        assert entry is not None
+        assert entry.sha == previous_sha
+        assert repo.head.commit.hexsha == previous_sha
+        assert addon.current_status == AddonStatus.OUTDATED
+
+    def test_rollback_last_session(self, tmp_path) -> None:
+        "Test that every addon updated in the latest session is rolled back"
+        wow_dir = tmp_path / "wow"
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        previous_shas = {}
+        for name in ["AddonA", "AddonB"]:
+            work = make_upstream(tmp_path, name)
+            repo = clone_addon(work, wow_dir / "Interface" / "AddOns")
+            previous_shas[name] = repo.head.commit.hexsha
+            push_commit(work, "Update", version="1.1")
+        instance = GameInstance.from_dir_path(str(wow_dir))
+        instance.load_addons()
+        for addon in instance.addons:
+            addon.update_status()
+        instance.update_all()
+        history.begin_session()
+
+        rolled_back = instance.rollback_last_session()
+
+        assert len(rolled_back) == 2
+        for addon in instance.addons:
+            assert addon.git_info().sha == previous_shas[addon.name]
+            assert addon.version == "1.0"
@@ -0,0 +1,110 @@
+from git import Repo
+import pytest
+from pykek.backend.game_instance import GameInstance
+from pykek.backend.lockfile import LockEntry, Lockfile, LockfileError
+from pykek.backend.mirror import mirror_store
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestLockfile:
+    ### Setup / Teardown
+
+    def setup_method(self) -> None:
+        self._root = mirror_store.root
+
+    def teardown_method(self) -> None:
+        mirror_store.root = self._root
+        mirror_store.enabled = False
+
+    ### Helpers
+
+    def _instance(self, wow_dir) -> GameInstance:
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True, exist_ok=True)
+        (wow_dir / "WoW.exe").touch()
+        instance = GameInstance.from_dir_path(str(wow_dir))
+        instance.load_addons()
+        return instance
+
+    ### Tests
+
+    def test_export_and_install(self, tmp_path) -> None:
+        "Test that installing an exported lockfile reproduces the locked commits"
+        source_addons = tmp_path / "source" / "Interface" / "AddOns"
+        locked_shas = {}
+        for name in ["AddonA", "AddonB"]:
+            work = make_upstream(tmp_path, name)
+            push_commit(work, "Dev work", branch="dev", version="2.0")
+            repo = clone_addon(work, source_addons)
+            repo.git.checkout("dev")
+            locked_shas[name] = repo.head.commit.hexsha
+            push_commit(work, "Newer dev work", branch="dev", version="2.1")
+        source = self._instance(tmp_path / "source")
+        lockfile_path = tmp_path / "pykek.lock"
+        Lockfile.from_instance(source).write(lockfile_path)
+
+        target = self._instance(tmp_path / "target")
+        futures = Lockfile.load(lockfile_path).install(target.dir_path)
+        results = {name: future.result() for name, future in futures.items()}
+
+        for name, sha in locked_shas.items():
+            repo = Repo(tmp_path / "target" / "Interface" / "AddOns" / name)
+            assert results[name].action == "cloned"
+            assert repo.head.commit.hexsha == sha
+            assert repo.active_branch.name == "dev"
+
+    def test_install_over_existing_addon(self, tmp_path) -> None:
+        "Test that an installed addon is moved to its locked commit, not re-cloned"
+        work = make_upstream(tmp_path)
+        addons_dir = tmp_path / "wow" / "Interface" / "AddOns"
+        repo = clone_addon(work, addons_dir)
+        locked_sha = repo.head.commit.hexsha
+        instance = self._instance(tmp_path / "wow")
+        lockfile = Lockfile.from_instance(instance)
+        push_commit(work, "Update", version="1.1")
+        repo.remote().pull()
+
+        futures = lockfile.install(instance.dir_path)
+        results = {name: future.result() for name, future in futures.items()}
+
+        assert results["VeryCoolAddon"].action == "updated"
+        assert repo.head.commit.hexsha == locked_sha
+
+    def test_install_reuses_mirror(self, tmp_path) -> None:
+        "Test that an existing local mirror is reused even with mirrors disabled"
+        mirror_store.root = tmp_path / "mirrors"
+        mirror_store.enabled = True
+        work = make_upstream(tmp_path)
+        url = work.remote().url
+        source_dir = tmp_path / "source" / "Interface" / "AddOns" / "VeryCoolAddon"
+        mirror_store.clone(url, str(source_dir))
+        lockfile = Lockfile.from_instance(self._instance(tmp_path / "source"))
+        mirror_store.enabled = False
+
+        lockfile.install(str(tmp_path / "target"))["VeryCoolAddon"].result()
+
+        repo = Repo(tmp_path / "target" / "Interface" / "AddOns" / "VeryCoolAddon")
+        assert lockfile.entries[0].mode == "mirror"
+        assert mirror_store.is_borrowing(repo, url)
+
+    def test_path_traversal(self, tmp_path) -> None:
+        "Test that addon names escaping the AddOns folder are rejected"
+        lockfile_path = tmp_path / "pykek.lock"
+        lockfile_path.write_text(
+            "version: 1\n"
+            "addons:\n"
+            "- name: ../../../evil\n"
+            "  url: https://example.com/evil.git\n"
+            "  branch: main\n"
+            "  sha: 0000000000000000000000000000000000000000\n"
+            "  mode: clone\n"
+        )
+        with pytest.raises(LockfileError):
+            Lockfile.load(lockfile_path)
+
+        for name in ["..", str(tmp_path / "evil")]:
+            entry = LockEntry(
+                name, "https://example.com/evil.git", "main", "0", "clone"
+            )
+            with pytest.raises(LockfileError):
+                Lockfile([entry]).install(str(tmp_path / "wow"))
+        assert not (tmp_path / "evil").exists()
@@ -0,0 +1,175 @@
+from pathlib import Path
+from git import Repo
+import pytest
+from pykek.backend import maintenance
+from pykek.backend.addon import Addon
+from pykek.backend.maintenance import (
+    CHECK_INTERVAL,
+    MaintenanceScheduler,
+    maintain_addon,
+    maintain_mirror,
+    repo_health,
+)
+from pykek.backend.mirror import mirror_store
+from pykek.backend.operations import OperationCancelledError, operation_coordinator
+from pykek.backend.state_store import state_store
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestMaintenance:
+    ### Helpers
+
+    def _addon(self, tmp_path, name: str = "VeryCoolAddon") -> Addon:
+        work = make_upstream(tmp_path, name)
+        clone_addon(work, tmp_path / "wow")
+        return Addon.from_dir_path(tmp_path / "wow" / name)
+
+    def _fetch_commits(self, tmp_path, addon: Addon, count: int) -> None:
+        """Small fetches leave their objects loose, like update checks do"""
+        work = Repo(tmp_path / "work" / addon.name)
+        for i in range(count):
+            push_commit(work, f"Commit {i}", version=f"1.{i}")
+            Repo(addon.dir_path).remote().fetch()
+
+    ### Tests
+
+    def test_packs_loose_objects(self, tmp_path, monkeypatch) -> None:
+        "Test that loose objects are packed and the commit-graph is written"
+        monkeypatch.setattr(maintenance, "LOOSE_OBJECTS_LIMIT", 5)
+        addon = self._addon(tmp_path)
+        self._fetch_commits(tmp_path, addon, 3)
+        assert repo_health(Repo(addon.dir_path)).loose_objects >= 5
+
+        report = maintain_addon(addon, yield_to_others=False).result()
+
+        assert report.tasks == ["loose-objects", "commit-graph", "prune-remote"]
+        assert report.health.loose_objects == 0
+        assert report.health.has_commit_graph
+        [state] = state_store.maintenance_states(addon.dir_path)
+        assert state.loose_objects == 0
+        assert state.maintained_at == state.pruned_at == state.checked_at
+
+    def test_consolidates_packs(self, tmp_path, monkeypatch) -> None:
+        "Test that packs are consolidated through a multi-pack-index"
+        monkeypatch.setattr(maintenance, "PACKS_LIMIT", 3)
+        addon = self._addon(tmp_path)
+        # One large pack, like after a clone
+        self._fetch_commits(tmp_path, addon, 10)
+        Repo(addon.dir_path).git.repack("-a", "-d", "-q")
+        with Repo(addon.dir_path).config_writer() as writer:
+            writer.set_value("fetch", "unpackLimit", "1")
+        self._fetch_commits(tmp_path, addon, 3)
+        pack_dir = Path(addon.dir_path) / ".git" / "objects" / "pack"
+        packs = repo_health(Repo(addon.dir_path)).packs
+        assert packs >= 4
+        largest = max(pack_dir.glob("*.pack"), key=lambda path: path.stat().st_size)
+
+        report = maintain_addon(addon, yield_to_others=False).result()
+
+        assert "incremental-repack" in report.tasks
+        assert report.health.packs < packs
+        assert report.health.has_multi_pack_index
+        # The clone pack isn't rewritten, only the small ones are combined
+        assert largest.exists()
+
+    def test_healthy_repo(self, tmp_path) -> None:
+        "Test that a maintained repository is only counted the next times"
+        addon = self._addon(tmp_path)
+        maintain_addon(addon, yield_to_others=False).result()
+
+        report = maintain_addon(addon, yield_to_others=False).result()
+
+        assert report.tasks == []
+
+    def test_prunes_stale_remote_refs(self, tmp_path) -> None:
+        "Test that branches deleted upstream lose their remote-tracking ref"
+        work = make_upstream(tmp_path)
+        push_commit(work, "Feature", branch="feature")
+        clone_addon(work, tmp_path / "wow")
+        addon = Addon.from_dir_path(tmp_path / "wow" / "VeryCoolAddon")
+        work.remote().push(":feature")
+        assert "origin/feature" in Repo(addon.dir_path).git.branch("-r")
+
+        maintain_addon(addon, yield_to_others=False).result()
+
+        assert "origin/feature" not in Repo(addon.dir_path).git.branch("-r")
+
+    def test_maintains_mirror(self, tmp_path, monkeypatch) -> None:
+        "Test that mirrors are maintained without losing any object"
+        monkeypatch.setattr(maintenance, "LOOSE_OBJECTS_LIMIT", 5)
+        work = make_upstream(tmp_path)
+        url = work.remote().url
+        mirror = Repo(mirror_store.ensure(url))
+        for i in range(3):
+            push_commit(work, f"Commit {i}", version=f"1.{i}")
+            mirror_store.update(url)
+        push_commit(work, "Feature", branch="feature")
+        mirror_store.update(url)
+        feature_sha = mirror.git.rev_parse("feature")
+        work.remote().push(":feature")
+        mirror_store.update(url)
+        (tmp_path / "unreachable.txt").write_text("Unreachable")
+        unreachable = mirror.git.hash_object("-w", str(tmp_path / "unreachable.txt"))
+
+        report = maintain_mirror(Path(mirror.git_dir), yield_to_others=False)
+
+        assert report.tasks == ["loose-objects", "commit-graph"]
+        assert report.health.loose_objects <= 1
+        mirror.git.cat_file("-e", feature_sha)
+        mirror.git.cat_file("-e", unreachable)
+        [state] = state_store.maintenance_states(mirror.git_dir)
+        assert state.maintained_at == state.checked_at
+
+    def test_yields_to_other_operations(self, tmp_path, monkeypatch) -> None:
+        "Test that maintenance stops as soon as another operation is waiting"
+        addon = self._addon(tmp_path)
+        monkeypatch.setattr(operation_coordinator, "queued", lambda: 1)
+
+        with pytest.raises(OperationCancelledError):
+            maintain_addon(addon).result()
+        assert state_store.maintenance_states(addon.dir_path) == []
+
+
+class TestMaintenanceScheduler:
+    ### Tests
+
+    def test_waits_for_idle(self, tmp_path) -> None:
+        "Test that repositories are maintained only after the idle delay"
+        clock = FakeClock()
+        scheduler = MaintenanceScheduler(idle_delay=60, clock=clock)
+        work = make_upstream(tmp_path)
+        clone_addon(work, tmp_path / "wow")
+        addon = Addon.from_dir_path(tmp_path / "wow" / "VeryCoolAddon")
+        scheduler.add_addons([addon])
+
+        assert scheduler.run_next() is None
+        clock.now += 61
+        assert scheduler.run_next() is addon
+        # Checked, it isn't due again before the next interval
+        clock.now += 61
+        scheduler.run_next()
+        clock.now += 61
+        assert scheduler.due_addons() == []
+        clock.now += CHECK_INTERVAL
+        assert scheduler.due_addons() == [addon]
+
+    def test_paused(self, tmp_path) -> None:
+        "Test that a paused scheduler doesn't maintain anything"
+        clock = FakeClock()
+        scheduler = MaintenanceScheduler(idle_delay=0, clock=clock)
+        work = make_upstream(tmp_path)
+        clone_addon(work, tmp_path / "wow")
+        scheduler.add_addons([Addon.from_dir_path(tmp_path / "wow" / "VeryCoolAddon")])
+
+        scheduler.pause("power-saver")
+        assert scheduler.run_next() is None
+        scheduler.resume("power-saver")
+        assert scheduler.run_next() is not None
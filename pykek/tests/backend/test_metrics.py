@@ -0,0 +1,90 @@
+import builtins
+import sys
+import pytest
+from pykek.backend.addon import Addon
+from pykek.backend.metrics import MetricsRegistry, _rss_bytes, cache_hit_rates, metrics
+from pykek.backend.operations import check_addon
+from pykek.tests.git_utils import clone_addon, make_upstream
+
+
+class TestMetrics:
+    ### Tests
+
+    def test_prometheus_text(self) -> None:
+        "Test that counters, gauges and histograms are dumped in the Prometheus format"
+        registry = MetricsRegistry()
+        registry.counter("ops_total", "Operations").inc(operation="check")
+        registry.gauge("queued", "Queued operations").set(3)
+        registry.gauge("unknown", "Unknown value", lambda: None)
+        durations = registry.histogram("duration_seconds", "Durations", (0.1, 1.0))
+        durations.observe(0.05, operation="fetch")
+        durations.observe(0.5, operation="fetch")
+
+        lines = registry.prometheus_text().splitlines()
+
+        assert "# TYPE ops_total counter" in lines
+        assert 'ops_total{operation="check"} 1' in lines
+        assert "queued 3" in lines
+        assert not any(line.startswith("unknown") for line in lines)
+        assert 'duration_seconds_bucket{operation="fetch",le="0.1"} 1' in lines
+        assert 'duration_seconds_bucket{operation="fetch",le="+Inf"} 2' in lines
+        assert 'duration_seconds_count{operation="fetch"} 2' in lines
+        assert 'duration_seconds_sum{operation="fetch"} 0.55' in lines
+
+    def test_quantiles(self) -> None:
+        "Test that quantiles are computed from the latest observations"
+        registry = MetricsRegistry()
+        durations = registry.histogram("duration_seconds", "Durations")
+        for i in range(1, 101):
+            durations.observe(i / 100, operation="check")
+
+        assert durations.quantile(0.5, operation="check") == pytest.approx(0.51)
+        assert durations.quantile(0.95, operation="check") == pytest.approx(0.96)
+        assert durations.quantile(0.5, operation="update") is None
+
+    def test_registry_returns_existing_metric(self) -> None:
+        "Test that a metric is registered once, and can't change kind"
+        registry = MetricsRegistry()
+        counter = registry.counter("ops_total", "Operations")
+
+        assert registry.counter("ops_total", "Operations") is counter
+        with pytest.raises(ValueError):
+            registry.gauge("ops_total", "Operations")
+
+    def test_write_prometheus(self, tmp_path) -> None:
+        "Test that the metrics are written to a text file"
+        registry = MetricsRegistry()
+        registry.counter("ops_total", "Operations").inc()
+
+        registry.write_prometheus(tmp_path / "pykek.prom")
+
+        assert "ops_total 1" in (tmp_path / "pykek.prom").read_text().splitlines()
+
+    def test_rss_without_proc_or_resource(self, monkeypatch) -> None:
+        "Test that the resident memory is unknown without /proc and resource"
+        open_file = builtins.open
+
+        def fake_open(path, *args, **kwargs):
+            if str(path).startswith("/proc/"):
+                raise OSError(path)
+            return open_file(path, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, "open", fake_open)
+        monkeypatch.setitem(sys.modules, "resource", None)
+
+        assert _rss_bytes() is None
+
+    def test_operations_are_measured(self, tmp_path) -> None:
+        "Test that finished operations, their latency and fetch lookups are recorded"
+        work = make_upstream(tmp_path)
+        clone_addon(work, tmp_path / "wow")
+        addon = Addon.from_dir_path(tmp_path / "wow" / "VeryCoolAddon")
+        finished = metrics.counter("pykek_operations_total", "")
+        before = finished.value(operation="check", result="ok")
+
+        check_addon(addon).result(timeout=30)
+
+        assert finished.value(operation="check", result="ok") == before + 1
+        assert metrics.get("pykek_operation_duration_seconds") is not None
+        assert "fetch" in cache_hit_rates()
+        assert "pykek_open_repos" in metrics.prometheus_text()
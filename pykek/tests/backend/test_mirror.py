@@ -0,0 +1,100 @@
+from pathlib import Path
+from pykek.backend.fetch_coordinator import FetchCoordinator
+from pykek.backend.mirror import MirrorStore, mirror_store
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestMirrorStore:
+    ### Setup / Teardown
+
+    def setup_method(self) -> None:
+        self._root = mirror_store.root
+
+    def teardown_method(self) -> None:
+        mirror_store.root = self._root
+        mirror_store.enabled = False
+
+    ### Tests
+
+    def test_mirror_path_shared_by_url_spellings(self, tmp_path) -> None:
+        "Test that different spellings of the same upstream share a mirror"
+        store = MirrorStore(tmp_path / "mirrors")
+
+        first = store.mirror_path("https://github.com/author/VeryCoolAddon")
+        second = store.mirror_path("https://github.com/author/VeryCoolAddon.git")
+
+        assert first == second
+        assert first.name.startswith("VeryCoolAddon-")
+
+    def test_clone_borrows_mirror_objects(self, tmp_path) -> None:
+        "Test that clones in two instances borrow their objects from a single mirror"
+        work = make_upstream(tmp_path)
+        url = work.remote().url
+        store = MirrorStore(tmp_path / "mirrors", enabled=True)
+
+        first = store.clone(url, str(tmp_path / "wow1" / "VeryCoolAddon"))
+        second = store.clone(url, str(tmp_path / "wow2" / "VeryCoolAddon"))
+
+        assert len(list(store.root.iterdir())) == 1
+        assert store.is_borrowing(first, url)
+        assert store.is_borrowing(second, url)
+        assert second.remote().url == url
+        assert second.active_branch.name == "main"
+
+    def test_borrow_existing_repo(self, tmp_path) -> None:
+        "Test that an existing addon repo drops the objects its mirror already has"
+        work = make_upstream(tmp_path)
+        url = work.remote().url
+        addon = clone_addon(work, tmp_path / "wow")
+        store = MirrorStore(tmp_path / "mirrors", enabled=True)
+        store.ensure(url)
+
+        store.borrow(addon, url)
+
+        packs = list(Path(addon.git_dir, "objects", "pack").glob("*.pack"))
+        assert store.is_borrowing(addon, url)
+        assert all(p.stat().st_size < 100 for p in packs)
+        assert addon.head.commit.hexsha == work.head.commit.hexsha
+
+    def test_fetch_through_mirror(self, tmp_path) -> None:
+        "Test that addons sharing an upstream are fetched through its mirror once"
+        work = make_upstream(tmp_path)
+        first = clone_addon(work, tmp_path / "wow1")
+        second = clone_addon(work, tmp_path / "wow2")
+        new_sha = push_commit(work, "Update", version="1.1")
+        mirror_store.root = tmp_path / "mirrors"
+        mirror_store.enabled = True
+        coordinator = FetchCoordinator()
+
+        coordinator.fetch(first, "main")
+        coordinator.fetch(second, "main")
+
+        assert coordinator.stats.network_fetches == 1
+        assert coordinator.stats.saved_fetches == 1
+        assert first.commit("origin/main").hexsha == new_sha
+        assert second.commit("origin/main").hexsha == new_sha
+
+    def test_reinstall_from_mirror_fast_forwards(self, tmp_path) -> None:
+        "Test that a reinstall from an existing mirror gets the latest upstream commit"
+        work = make_upstream(tmp_path)
+        url = work.remote().url
+        store = MirrorStore(tmp_path / "mirrors", enabled=True)
+        store.ensure(url)
+        new_sha = push_commit(work, "Update", version="1.1")
+
+        addon = store.clone(url, str(tmp_path / "wow" / "VeryCoolAddon"))
+
+        assert addon.head.commit.hexsha == new_sha
+
+    def test_offline_install_from_mirror(self, tmp_path) -> None:
+        "Test that an install still succeeds from the mirror when upstream is unreachable"
+        work = make_upstream(tmp_path)
+        url = work.remote().url
+        store = MirrorStore(tmp_path / "mirrors", enabled=True)
+        store.ensure(url)
+        Path(url).rename(Path(url + ".offline"))
+
+        addon = store.clone(url, str(tmp_path / "wow" / "VeryCoolAddon"))
+
+        assert addon.head.commit.hexsha == work.head.commit.hexsha
+        assert addon.remote().url == url
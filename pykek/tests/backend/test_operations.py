@@ -0,0 +1,126 @@
+from pathlib import Path
+import threading
+from typing import List
+import pytest
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.operations import (
+    Operation,
+    OperationCancelledError,
+    OperationCoordinator,
+)
+from pykek.backend.remote import RemoteUnreachableError
+
+
+class TestOperationCoordinator:
+    ### Helpers
+
+    def _addon(self) -> Addon:
+        return Addon.from_dir_path(Path("/fake/path/VeryCoolAddon"))
+
+    def _blocking_job(self, started: threading.Event, release: threading.Event):
+        def job(_: Operation) -> None:
+            started.set()
+            release.wait(5)
+
+        return job
+
+    ### Tests
+
+    def test_coalescing(self) -> None:
+        "Test that identical requests on an addon share one operation"
+        coordinator = OperationCoordinator()
+        addon = self._addon()
+        runs: List[int] = []
+        started, release = threading.Event(), threading.Event()
+
+        first = coordinator.submit(
+            addon, ("check",), self._blocking_job(started, release)
+        )
+        second = coordinator.submit(addon, ("check",), lambda _: runs.append(1))
+        release.set()
+        first.result(5)
+
+        assert first is second
+        assert runs == []
+
+    def test_serialization(self) -> None:
+        "Test that operations on the same addon run one after the other"
+        coordinator = OperationCoordinator()
+        addon = self._addon()
+        order: List[str] = []
+        started, release = threading.Event(), threading.Event()
+
+        def update(_: Operation) -> None:
+            started.set()
+            release.wait(5)
+            order.append("update")
+
+        coordinator.submit(addon, ("update",), update)
+        started.wait(5)
+        switch = coordinator.submit(
+            addon, ("switch", "dev"), lambda _: order.append("switch")
+        )
+        release.set()
+        switch.result(5)
+
+        assert order == ["update", "switch"]
+
+    def test_cancel_queued(self) -> None:
+        "Test that a cancelled operation never runs if it was still queued"
+        coordinator = OperationCoordinator()
+        addon = self._addon()
+        runs: List[int] = []
+        started, release = threading.Event(), threading.Event()
+
+        running = coordinator.submit(
+            addon, ("update",), self._blocking_job(started, release)
+        )
+        started.wait(5)
+        queued = coordinator.submit(addon, ("check",), lambda _: runs.append(1))
+        coordinator.cancel(addon, ["check"])
+        release.set()
+        running.result(5)
+
+        assert queued.future.cancelled()
+        assert runs == []
+        assert coordinator.operations(addon) == []
+
+    def test_cancel_running(self) -> None:
+        "Test that a running job stops at its next checkpoint once cancelled"
+        coordinator = OperationCoordinator()
+        addon = self._addon()
+        started, release = threading.Event(), threading.Event()
+
+        def job(operation: Operation) -> None:
+            started.set()
+            release.wait(5)
+            operation.raise_if_cancelled()
+
+        operation = coordinator.submit(addon, ("update",), job)
+        started.wait(5)
+        operation.cancel()
+        release.set()
+
+        with pytest.raises(OperationCancelledError):
+            operation.result(5)
+        assert operation.is_cancelled()
+
+    def test_failed_job_settles_status(self) -> None:
+        "Test that an addon left loading by a failed job gets a settled status"
+        coordinator = OperationCoordinator()
+        addon = self._addon()
+
+        def job(error: Exception):
+            def run(_: Operation) -> None:
+                addon.set_status(AddonStatus.LOADING)
+                raise error
+
+            return run
+
+        with pytest.raises(FileNotFoundError):
+            coordinator.submit(addon, ("update",), job(FileNotFoundError())).result(5)
+        assert addon.current_status == AddonStatus.OUTDATED
+        with pytest.raises(RemoteUnreachableError):
+            error = RemoteUnreachableError("offline")
+            coordinator.submit(addon, ("check",), job(error)).result(5)
+        assert addon.current_status == AddonStatus.UNREACHABLE
@@ -0,0 +1,126 @@
+import shutil
+from git import Repo
+import pytest
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.operations import switch_addon, switch_addons
+from pykek.backend.prefetch import BranchPrefetcher, prefetcher
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def prefetch_enabled():
+    prefetcher.enabled = True
+    yield
+    prefetcher.enabled = False
+    prefetcher.reset()
+
+
+class TestBranchPrefetcher:
+    ### Helpers
+
+    def _addon(self, tmp_path, name: str = "VeryCoolAddon"):
+        work = make_upstream(tmp_path, name)
+        clone_addon(work, tmp_path / "wow")
+        addon = Addon.from_dir_path(tmp_path / "wow" / name)
+        addon.reload_branches()
+        return work, addon
+
+    def _go_offline(self, tmp_path) -> None:
+        shutil.rmtree(tmp_path / "upstreams")
+
+    ### Tests
+
+    def test_is_due(self, tmp_path) -> None:
+        "Test that addons are prefetched once per interval, and only when enabled"
+        clock = FakeClock()
+        branch_prefetcher = BranchPrefetcher(interval=3600, clock=clock)
+        _, addon = self._addon(tmp_path)
+        assert not branch_prefetcher.is_due(addon)
+
+        branch_prefetcher.enabled = True
+        assert branch_prefetcher.is_due(addon)
+        branch_prefetcher.prefetch(addon)
+        assert not branch_prefetcher.is_due(addon)
+        clock.now += 3600
+        assert branch_prefetcher.is_due(addon)
+
+    def test_prefetch(self, tmp_path) -> None:
+        "Test that new branches and commits are fetched without going through LOADING"
+        work, addon = self._addon(tmp_path)
+        push_commit(work, "Dev", branch="dev", version="2.0-dev")
+        push_commit(work, "Update", branch="main", version="1.1")
+        statuses = []
+
+        class Listener:
+            def addon_status_did_change(self, status: AddonStatus) -> None:
+                statuses.append(status)
+
+        addon.add_listener(Listener())  # type: ignore[arg-type]
+        addon.prefetch()
+
+        assert addon.branches == ["dev", "main"]
+        assert statuses == [AddonStatus.OUTDATED]
+
+    def test_switch_offline(self, tmp_path, prefetch_enabled) -> None:
+        "Test that switching to a prefetched branch lands on its tip offline"
+        work, addon = self._addon(tmp_path)
+        push_commit(work, "Dev", branch="dev", version="2.0-dev")
+        addon.prefetch()
+        switch_addon(addon, "dev").result(5)
+        switch_addon(addon, "main").result(5)
+        dev_sha = push_commit(work, "Dev again", branch="dev", version="2.1-dev")
+        prefetcher.prefetch(addon)
+        self._go_offline(tmp_path)
+
+        switch_addon(addon, "dev").result(5)
+
+        assert Repo(addon.dir_path).head.commit.hexsha == dev_sha
+        assert addon.version == "2.1-dev"
+
+    def test_switch_keeps_rolled_back_branch(self, tmp_path, prefetch_enabled) -> None:
+        "Test that a branch rolled back or rewritten upstream isn't reset on switch"
+        work, addon = self._addon(tmp_path)
+        push_commit(work, "Dev", branch="dev", version="2.0-dev")
+        dev_sha = push_commit(work, "Dev again", branch="dev", version="2.1-dev")
+        addon.prefetch()
+        switch_addon(addon, "dev").result(5)
+        switch_addon(addon, "main").result(5)
+        work.git.reset("--hard", "HEAD~1")
+        work.remote().push("+dev:dev")
+        addon.prefetch()
+
+        switch_addon(addon, "dev").result(5)
+        assert Repo(addon.dir_path).head.commit.hexsha == dev_sha
+        assert addon.current_status == AddonStatus.UP_TO_DATE
+
+        switch_addon(addon, "main").result(5)
+        push_commit(work, "Rewritten dev", branch="dev", version="2.1-rewritten")
+        work.remote().push("+dev:dev")
+        addon.prefetch()
+        switch_addon(addon, "dev").result(5)
+        assert Repo(addon.dir_path).head.commit.hexsha == dev_sha
+        assert addon.current_status == AddonStatus.OUTDATED
+
+    def test_switch_addons(self, tmp_path) -> None:
+        "Test that addons having the branch are switched together, by author"
+        work, addon = self._addon(tmp_path)
+        push_commit(work, "Dev", branch="dev", version="2.0-dev")
+        _, other = self._addon(tmp_path, "OtherAddon")
+        addon.prefetch()
+
+        assert switch_addons([addon, other], "dev", author="someone-else") == []
+        operations = switch_addons([addon, other], "dev", author="upstreams")
+        for operation in operations:
+            operation.result(5)
+
+        assert [operation.addon for operation in operations] == [addon]
+        assert Repo(addon.dir_path).active_branch.name == "dev"
+        assert Repo(other.dir_path).active_branch.name == "main"
@@ -0,0 +1,127 @@
+import os
+from pathlib import Path
+import shutil
+import time
+from git import GitCommandError
+import pytest
+from pykek.backend.addon import Addon, AddonStatus
+from pykek.backend.remote import (
+    RemotePolicy,
+    RemoteUnreachableError,
+    remote_host,
+    remote_owner,
+)
+from pykek.tests.git_utils import clone_addon, make_upstream
+
+
+class TestRemotePolicy:
+    ### Helpers
+
+    def _failing_operation(
+        self, calls, stderr: str = "fatal: Could not resolve host: example.com"
+    ):
+        def operation(options) -> None:
+            calls.append(options)
+            raise GitCommandError("fetch", 128, stderr)
+
+        return operation
+
+    ### Tests
+
+    def test_remote_host(self) -> None:
+        "Test that remotes are grouped by host"
+        assert remote_host("https://github.com/author/VeryCoolAddon") == "github.com"
+        assert remote_host("git@github.com:author/VeryCoolAddon.git") == "github.com"
+        assert remote_host("/srv/git/VeryCoolAddon.git") == "/srv/git/VeryCoolAddon"
+
+    def test_remote_owner(self) -> None:
+        "Test that the owner of a remote is the segment before its name"
+        assert remote_owner("https://github.com/Author/MyAddon.git") == "Author"
+        assert remote_owner("git@gitlab.com:group/author/MyAddon") == "author"
+        assert remote_owner("/srv/git/addons/MyAddon.git") == "addons"
+        assert remote_owner("https://example.com/MyAddon") is None
+
+    def test_retries(self) -> None:
+        "Test that a failing operation is retried before being reported unreachable"
+        policy = RemotePolicy(retries=2, backoff_base=0.01, failure_threshold=2)
+        calls = []
+
+        with pytest.raises(RemoteUnreachableError):
+            policy.run("https://example.com/a.git", self._failing_operation(calls))
+
+        assert len(calls) == 3
+        assert calls[0]["kill_after_timeout"] == policy.timeout
+        # Retries of a single operation count as one failure of the host
+        assert not policy.is_unreachable("example.com")
+
+    def test_circuit_breaker(self) -> None:
+        "Test that a host is skipped during its cool-down after repeated failures"
+        policy = RemotePolicy(retries=0, failure_threshold=2)
+        calls = []
+        for _ in range(2):
+            with pytest.raises(RemoteUnreachableError):
+                policy.run("https://example.com/a.git", self._failing_operation(calls))
+
+        with pytest.raises(RemoteUnreachableError):
+            policy.run("https://example.com/b.git", self._failing_operation(calls))
+
+        assert policy.is_unreachable("example.com")
+        assert len(calls) == 2
+
+    def test_missing_repository(self) -> None:
+        "Test that a missing repository fails right away, its host stays reachable"
+        policy = RemotePolicy(retries=2, backoff_base=0.01, failure_threshold=3)
+        calls = []
+        stderr = (
+            "remote: Repository not found.\n"
+            "fatal: repository 'https://github.com/author/Gone.git/' not found"
+        )
+        for _ in range(3):
+            with pytest.raises(RemoteUnreachableError):
+                policy.run(
+                    "https://github.com/author/Gone.git",
+                    self._failing_operation(calls, stderr),
+                )
+
+        assert len(calls) == 3
+        assert not policy.is_unreachable("github.com")
+        assert policy.run("https://github.com/author/Other.git", lambda _: 1) == 1
+
+    def test_timeout(self, tmp_path) -> None:
+        "Test that a hung remote is killed after the overall timeout"
+        work = make_upstream(tmp_path)
+        repo = clone_addon(work, tmp_path / "wow")
+        slow_upload_pack = tmp_path / "slow-upload-pack"
+        slow_upload_pack.write_text('#!/bin/sh\nsleep 30\nexec git-upload-pack "$@"\n')
+        os.chmod(slow_upload_pack, 0o755)
+        with repo.config_writer() as writer:
+            writer.set_value('remote "origin"', "uploadpack", str(slow_upload_pack))
+        policy = RemotePolicy(timeout=1, retries=0)
+
+        start = time.monotonic()
+        with pytest.raises(RemoteUnreachableError):
+            policy.fetch(repo)
+
+        assert time.monotonic() - start < 10
+
+    def test_addon_unreachable_status(self, tmp_path) -> None:
+        "Test that an addon whose remote can't be reached gets the UNREACHABLE status"
+        work = make_upstream(tmp_path)
+        clone_addon(work, tmp_path / "wow")
+        shutil.rmtree(work.remote().url)
+        addon = Addon.from_dir_path(Path(tmp_path / "wow" / "VeryCoolAddon"))
+
+        addon.update_status()
+
+        assert addon.current_status == AddonStatus.UNREACHABLE
+
+    def test_addon_check_error_status(self, tmp_path) -> None:
+        "Test that an addon whose update check fails gets the UNREACHABLE status"
+        work = make_upstream(tmp_path)
+        clone = clone_addon(work, tmp_path / "wow")
+        clone.git.checkout("-b", "local-only")
+        addon = Addon.from_dir_path(Path(tmp_path / "wow" / "VeryCoolAddon"))
+
+        addon.update_status()
+
+        assert addon.current_status == AddonStatus.UNREACHABLE
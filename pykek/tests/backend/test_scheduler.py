@@ -0,0 +1,49 @@
+import threading
+from typing import List
+from pykek.backend.scheduler import Scheduler
+
+
+class TestScheduler:
+    ### Tests
+
+    def test_groups_take_turns(self) -> None:
+        "Test that the jobs of a group don't wait behind every job of another group"
+        scheduler = Scheduler(max_workers=1)
+        started = threading.Event()
+        release = threading.Event()
+        order: List[str] = []
+
+        def blocker() -> None:
+            started.set()
+            release.wait(5)
+
+        scheduler.submit_to("wow1", blocker)
+        started.wait(5)
+        futures = [
+            scheduler.submit_to("wow1", order.append, f"wow1-{i}") for i in range(3)
+        ]
+        futures += [
+            scheduler.submit_to("wow2", order.append, f"wow2-{i}") for i in range(2)
+        ]
+        release.set()
+        for future in futures:
+            future.result(5)
+        scheduler.shutdown()
+
+        assert order == ["wow1-0", "wow2-0", "wow1-1", "wow2-1", "wow1-2"]
+
+    def test_cancelled_jobs_are_skipped(self) -> None:
+        "Test that a job cancelled while queued never runs"
+        scheduler = Scheduler(max_workers=1)
+        release = threading.Event()
+        ran: List[str] = []
+        scheduler.submit(release.wait, 5)
+        cancelled = scheduler.submit(ran.append, "cancelled")
+        done = scheduler.submit(ran.append, "done")
+
+        assert cancelled.cancel()
+        release.set()
+        done.result(5)
+        scheduler.shutdown()
+
+        assert ran == ["done"]
@@ -0,0 +1,109 @@
+import threading
+import time
+from pykek.backend.addon import AddonStatus
+from pykek.backend.game_instance import GameInstance
+from pykek.backend.operations import check_addon
+from pykek.backend.state_store import AddonState, StateStore
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestStateStore:
+    ### Helpers
+
+    def _state(self, name: str, instance: str, status: str, url: str) -> AddonState:
+        return AddonState(
+            dir_path=f"{instance}/Interface/AddOns/{name}",
+            instance=instance,
+            name=name,
+            url=url,
+            branch="main",
+            head_sha=None,
+            upstream_sha=None,
+            status=status,
+            version=None,
+            checked_at=None,
+        )
+
+    ### Tests
+
+    def test_wal_mode(self, tmp_path) -> None:
+        "Test that the database is in WAL mode"
+        store = StateStore(tmp_path / "state.db")
+
+        assert store.query("PRAGMA journal_mode") == [("wal",)]
+        store.close()
+
+    def test_filtered_addon_states(self, tmp_path) -> None:
+        "Test that addon states can be queried by instance, status and remote"
+        store = StateStore(tmp_path / "state.db")
+        store.save_addon(self._state("A", "/wow", "outdated", "https://a"))
+        store.save_addon(self._state("B", "/wow", "up_to_date", "https://b"))
+        store.save_addon(self._state("C", "/ptr", "outdated", "https://a"))
+
+        outdated = store.addon_states(instance="/wow", status="outdated")
+        from_a = store.addon_states(url="https://a")
+
+        assert [state.name for state in outdated] == ["A"]
+        assert [state.name for state in from_a] == ["A", "C"]
+        store.close()
+
+    def test_partial_update_keeps_known_fields(self, tmp_path) -> None:
+        "Test that saving a state without git info keeps the previously known one"
+        store = StateStore(tmp_path / "state.db")
+        store.save_addon(self._state("A", "/wow", "outdated", "https://a"))
+        partial = self._state("A", "/wow", "up_to_date", "https://a")
+        partial.url = None
+
+        store.save_addon(partial)
+
+        [state] = store.addon_states()
+        assert (state.url, state.status) == ("https://a", "up_to_date")
+        store.close()
+
+    def test_batched_concurrent_writes(self, tmp_path) -> None:
+        "Test that writes from many threads are all committed"
+        store = StateStore(tmp_path / "state.db")
+
+        def write(thread_index: int) -> None:
+            for i in range(100):
+                store.record_timing(f"addon-{thread_index}", "check", i)
+
+        threads = [threading.Thread(target=write, args=[i]) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert store.query("SELECT count(*) FROM timings") == [(800,)]
+        assert store.timings("addon-3", "check", limit=2) == [99, 98]
+        store.close()
+
+    def test_read_after_write_latency(self, tmp_path) -> None:
+        "Test that reading your own writes doesn't wait for more writes to batch"
+        store = StateStore(tmp_path / "state.db")
+        store.query("SELECT 1")
+
+        start = time.monotonic()
+        for i in range(20):
+            store.record_timing("addon", "check", i)
+            assert store.timings("addon", "check", limit=1) == [i]
+
+        assert time.monotonic() - start < 2
+        store.close()
+
+    def test_load_addons_restores_statuses(self, tmp_path) -> None:
+        "Test that loading an instance shows the statuses found by the last checks"
+        wow_dir = tmp_path / "wow"
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        work = make_upstream(tmp_path)
+        clone_addon(work, wow_dir / "Interface" / "AddOns")
+        push_commit(work, "Update", version="1.1")
+        instance = GameInstance.from_dir_path(str(wow_dir))
+        instance.load_addons()
+        check_addon(instance.addons[0]).result(10)
+
+        reloaded = GameInstance.from_dir_path(str(wow_dir))
+        reloaded.load_addons()
+
+        assert reloaded.addons[0].current_status == AddonStatus.OUTDATED
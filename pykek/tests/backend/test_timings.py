@@ -0,0 +1,47 @@
+import pytest
+from pykek.backend.state_store import StateStore
+from pykek.backend.timings import Timings
+
+
+class TestTimings:
+    ### Tests
+
+    def test_rolling_window(self, tmp_path) -> None:
+        "Test that only the latest durations of each operation are kept"
+        log = Timings(StateStore(tmp_path / "state.db"), window=3)
+        for duration in [9.0, 9.0, 1.0, 2.0, 3.0]:
+            log.record("/wow/A", "check", duration)
+        log.record("/wow/A", "update", 7.0)
+
+        [stats] = log.stats("check")
+
+        assert (stats.count, stats.mean, stats.p90, stats.last) == (3, 2.0, 3.0, 3.0)
+        assert log.store.timings("/wow/A", "check") == [3.0, 2.0, 1.0]
+        assert len(log.stats()) == 2
+
+    def test_slowest(self, tmp_path) -> None:
+        "Test that the addons with the highest mean duration come first"
+        log = Timings(StateStore(tmp_path / "state.db"))
+        for addon, duration in [("/wow/A", 1.0), ("/wow/B", 3.0), ("/wow/C", 2.0)]:
+            log.record(addon, "fetch", duration)
+        log.record("/wow/A", "clone", 10.0)
+
+        slowest = log.slowest("fetch", limit=2)
+
+        assert [s.addon for s in slowest] == ["/wow/B", "/wow/C"]
+        assert log.slowest()[0].operation == "clone"
+
+    def test_estimates(self, tmp_path) -> None:
+        "Test that unknown addons are expected to take the mean of the known ones"
+        log = Timings(StateStore(tmp_path / "state.db"))
+        assert log.estimates(["/wow/A"], "update") == {}
+
+        log.record("/wow/A", "update", 1.0)
+        log.record("/wow/B", "update", 3.0)
+        log.record("/wow/C", "update", 100.0)
+
+        assert log.estimates(["/wow/A", "/wow/B", "/wow/D"], "update") == {
+            "/wow/A": 1.0,
+            "/wow/B": 3.0,
+            "/wow/D": pytest.approx(2.0),
+        }
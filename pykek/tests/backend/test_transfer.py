@@ -0,0 +1,88 @@
+from typing import List
+import pytest
+from pykek.backend.remote import RemotePolicy, RemoteUnreachableError
+from pykek.backend.transfer import TransferProgress, TransferProgressParser
+from pykek.tests.git_utils import make_upstream, push_commit
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.progresses: List[TransferProgress] = []
+
+    def transfer_did_progress(self, progress: TransferProgress) -> None:
+        self.progresses.append(progress)
+
+
+class TestTransfer:
+    ### Tests
+
+    def test_parse_progress(self) -> None:
+        "Test that objects, bytes and rate are read from the git progress lines"
+        recorder = Recorder()
+        parser = TransferProgressParser(recorder)
+
+        parser.feed("remote: Counting objects: 100% (12/12), done.\n")
+        parser.feed("Receiving objects:  45% (450/1000), 1.50 MiB | 512.00 KiB/s\n")
+        parser.feed("Resolving deltas: 100% (3/3), done.\n")
+        parser.feed("fatal: unable to access 'https://example.com/a.git/'\n")
+
+        [counting, receiving, resolving] = recorder.progresses
+        assert (counting.phase, counting.current, counting.done) == (
+            "Counting objects",
+            12,
+            True,
+        )
+        assert receiving.fraction() == 0.45
+        assert receiving.received_bytes == 1.5 * 1024 * 1024
+        assert receiving.rate == 512 * 1024
+        assert (
+            receiving.summary() == "Receiving objects: 450/1000, 1.5 MiB at 512.0 KiB/s"
+        )
+        assert resolving.done
+        assert parser.received_bytes == 1.5 * 1024 * 1024
+        assert parser.error_message().startswith("fatal: unable to access")
+
+    def test_throttling(self) -> None:
+        "Test that progress is reported at most every interval, and when a phase ends"
+        recorder = Recorder()
+        clock = FakeClock()
+        parser = TransferProgressParser(recorder, interval=0.1, clock=clock)
+
+        for i in range(1, 100):
+            clock.now += 0.001
+            parser.feed(f"Receiving objects: {i}% ({i}/100)")
+        clock.now += 0.001
+        parser.feed("Receiving objects: 100% (100/100), done.")
+
+        assert [p.current for p in recorder.progresses] == [1, 100]
+
+    def test_clone_progress(self, tmp_path) -> None:
+        "Test that a clone streams its progress to the listener"
+        work = make_upstream(tmp_path)
+        for i in range(5):
+            push_commit(work, f"Update {i}", version=f"1.{i}")
+        recorder = Recorder()
+        url = (tmp_path / "upstreams" / "VeryCoolAddon.git").as_uri()
+
+        RemotePolicy().clone(url, str(tmp_path / "clone"), listener=recorder)
+
+        phases = [p.phase for p in recorder.progresses]
+        assert "Receiving objects" in phases
+        assert recorder.progresses[-1].done
+        assert (tmp_path / "clone" / "VeryCoolAddon.toc").exists()
+
+    def test_failed_clone(self, tmp_path) -> None:
+        "Test that git errors are still reported when the progress is streamed"
+        policy = RemotePolicy(retries=0)
+        url = (tmp_path / "missing.git").as_uri()
+
+        with pytest.raises(RemoteUnreachableError, match="does not appear to be a git"):
+            policy.clone(url, str(tmp_path / "clone"))
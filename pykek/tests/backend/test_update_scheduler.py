@@ -0,0 +1,113 @@
+from concurrent.futures import Future
+from pykek.backend.addon import Addon
+from pykek.backend.timings import timings
+from pykek.backend.update_scheduler import (
+    MAX_INTERVAL,
+    MIN_INTERVAL,
+    UpdateScheduler,
+    _seed_interval,
+)
+from pykek.tests.git_utils import clone_addon, make_upstream
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestUpdateScheduler:
+    ### Helpers
+
+    def _addons(self, tmp_path, count: int):
+        addons = []
+        for i in range(count):
+            work = make_upstream(tmp_path, f"Addon{i}")
+            clone_addon(work, tmp_path / "wow")
+            addons.append(Addon.from_dir_path(tmp_path / "wow" / f"Addon{i}"))
+        return addons
+
+    def _done(self) -> Future:
+        future = Future()
+        future.set_result(None)
+        return future
+
+    ### Tests
+
+    def test_seed_interval(self) -> None:
+        "Test that active repos start hourly and dead repos weekly"
+        now = 1_000_000_000
+        active = [now - i * 600 for i in range(1, 11)]
+        dead = [now - 365 * 24 * 3600 - i * 3600 for i in range(10)]
+
+        assert _seed_interval(active, now) == MIN_INTERVAL
+        assert _seed_interval(dead, now) == MAX_INTERVAL
+
+    def test_interval_adapts_to_upstream_changes(self, tmp_path) -> None:
+        "Test that the interval grows without changes and shrinks on changes"
+        clock = FakeClock()
+        scheduler = UpdateScheduler(clock=clock)
+        [addon] = self._addons(tmp_path, 1)
+        scheduler.add_addons([addon])
+        initial = scheduler.interval(addon)
+        assert initial is not None
+
+        scheduler.record_check(addon, addon.upstream_sha())
+        grown = scheduler.interval(addon)
+        scheduler.record_check(addon, "0" * 40)
+        shrunk = scheduler.interval(addon)
+
+        assert grown == min(MAX_INTERVAL, initial * 1.5)
+        assert shrunk == max(MIN_INTERVAL, grown / 2)
+
+    def test_pause(self, tmp_path) -> None:
+        "Test that a paused scheduler doesn't start due checks"
+        clock = FakeClock()
+        scheduler = UpdateScheduler(check=lambda _: self._done(), clock=clock)
+        scheduler.add_addons(self._addons(tmp_path, 1))
+        clock.now += MAX_INTERVAL * 2
+
+        scheduler.pause("metered")
+        paused_checks = scheduler.run_due_checks()
+        scheduler.resume("metered")
+        resumed_checks = scheduler.run_due_checks()
+
+        assert paused_checks == []
+        assert len(resumed_checks) == 1
+
+    def test_concurrency_budget(self, tmp_path) -> None:
+        "Test that due checks never exceed the concurrency budget"
+        release = Future()
+        clock = FakeClock()
+        scheduler = UpdateScheduler(
+            check=lambda _: release, max_concurrent_checks=1, clock=clock
+        )
+        scheduler.add_addons(self._addons(tmp_path, 2))
+        clock.now += MAX_INTERVAL * 2
+
+        started = scheduler.run_due_checks()
+        started_again = scheduler.run_due_checks()
+        release.set_result(None)
+
+        assert len(started) == 1
+        assert started_again == []
+
+    def test_slowest_checks_first(self, tmp_path) -> None:
+        "Test that the due checks that took the longest before start first"
+        release = Future()
+        clock = FakeClock()
+        scheduler = UpdateScheduler(
+            check=lambda _: release, max_concurrent_checks=1, clock=clock
+        )
+        addons = self._addons(tmp_path, 3)
+        scheduler.add_addons(addons)
+        timings.record(addons[0].dir_path, "check", 0.1)
+        timings.record(addons[2].dir_path, "check", 2.0)
+        clock.now += MAX_INTERVAL * 2
+
+        started = scheduler.run_due_checks()
+        release.set_result(None)
+
+        assert started == [addons[2]]
@@ -0,0 +1,39 @@
+from pathlib import Path
+from git import Repo
+from pykek.backend.worktree import WorktreeAccelerator
+from pykek.tests.git_utils import clone_addon, make_upstream
+
+
+class TestWorktreeAccelerator:
+    ### Helpers
+
+    def _clone(self, tmp_path) -> Repo:
+        work = make_upstream(tmp_path)
+        return clone_addon(work, tmp_path / "wow")
+
+    ### Tests
+
+    def test_local_changes(self, tmp_path) -> None:
+        "Test that modified and deleted files are local changes"
+        accelerator = WorktreeAccelerator()
+        repo = self._clone(tmp_path)
+        toc_path = Path(repo.working_dir) / "VeryCoolAddon.toc"
+        assert not accelerator.is_dirty(repo)
+
+        toc_path.write_text(toc_path.read_text().replace("1.0", "2.0"))
+        assert accelerator.is_dirty(repo)
+        toc_path.unlink()
+        assert accelerator.is_dirty(repo)
+        repo.git.checkout("--", ".")
+        assert not accelerator.is_dirty(repo)
+
+    def test_index_acceleration(self, tmp_path) -> None:
+        "Test that the split index is enabled"
+        accelerator = WorktreeAccelerator()
+        repo = self._clone(tmp_path)
+
+        accelerator.is_dirty(repo)
+
+        reader = repo.config_reader("repository")
+        assert reader.get_value("core", "splitIndex") is True
+        assert list(Path(repo.git_dir).glob("sharedindex.*")) != []
@@ -0,0 +1,35 @@
+import pytest
+from pykek.backend.mirror import mirror_store
+from pykek.backend.remote import remote_policy
+from pykek.backend.state_store import state_store
+
+
+@pytest.fixture(autouse=True)
+def fast_remote_policy():
+    "Forgets unreachable hosts between tests and keeps retries backoff short"
+    backoff_base = remote_policy.backoff_base
+    remote_policy.backoff_base = 0.01
+    remote_policy.reset()
+    yield
+    remote_policy.backoff_base = backoff_base
+    remote_policy.reset()
+
+
+@pytest.fixture(autouse=True)
+def isolated_state_store(tmp_path_factory):
+    "Keeps the state of tests (history, checks, timings) out of the user data directory"
+    path = state_store.path
+    state_store.close()
+    state_store.path = tmp_path_factory.mktemp("state") / "state.db"
+    yield
+    state_store.close()
+    state_store.path = path
+
+
+@pytest.fixture(autouse=True)
+def isolated_mirror_store(tmp_path_factory):
+    "Keeps the mirrors of tests (and their maintenance) out of the user data directory"
+    root = mirror_store.root
+    mirror_store.root = tmp_path_factory.mktemp("mirrors")
+    yield
+    mirror_store.root = root
@@ -0,0 +1,41 @@
+from pathlib import Path
+from git import Repo
+
+
+def make_upstream(root: Path, name: str = "VeryCoolAddon") -> Repo:
+    """
+    Creates a bare upstream repository for `name` with an initial commit on `main`,
+    and returns the working clone used to push commits to it.
+    """
+    bare_path = root / "upstreams" / f"{name}.git"
+    Repo.init(bare_path, bare=True, initial_branch="main")
+    work = Repo.clone_from(str(bare_path), root / "work" / name)
+    work.git.checkout("-b", "main")
+    push_commit(work, "Initial commit", version="1.0")
+    return work
+
+
+def push_commit(
+    work: Repo, message: str, branch: str = "main", version: str = "1.0"
+) -> str:
+    """Commits a TOC change on `branch` and pushes it upstream, returns the new SHA."""
+    if work.head.is_valid() and work.active_branch.name != branch:
+        if branch in work.heads:
+            work.git.checkout(branch)
+        else:
+            work.git.checkout("-b", branch)
+    name = Path(work.working_dir).name
+    toc_path = Path(work.working_dir) / f"{name}.toc"
+    toc_path.write_text(
+        f"## Title: {name}\n## Version: {version}\n## Notes: {message}\n"
+    )
+    work.index.add([str(toc_path)])
+    commit = work.index.commit(message)
+    work.remote().push(f"{branch}:{branch}")
+    return commit.hexsha
+
+
+def clone_addon(work: Repo, addons_dir: Path, name: str = "") -> Repo:
+    """Clones the upstream of `work` into `addons_dir` as an installed addon."""
+    folder = name or Path(work.working_dir).name
+    return Repo.clone_from(work.remote().url, addons_dir / folder)
@@ -0,0 +1,214 @@
+from concurrent.futures import Future
+import json
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from pykek.backend import bulk_update
+from pykek.backend.timings import timings
+from pykek.cli import main
+from pykek.tests.git_utils import clone_addon, make_upstream, push_commit
+
+
+class TestCli:
+    ### Helpers
+
+    def _make_instance(self, tmp_path):
+        wow_dir = tmp_path / "wow"
+        addons_dir = wow_dir / "Interface" / "AddOns"
+        addons_dir.mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        (addons_dir / "NonGitAddon").mkdir()
+        return wow_dir, addons_dir
+
+    def _records(self, capsys):
+        out = capsys.readouterr().out
+        return {r["addon"]: r for r in map(json.loads, out.splitlines())}
+
+    ### Tests
+
+    def test_does_not_import_gobject(self) -> None:
+        "Test that the CLI never imports GObject"
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, pykek.cli; print('gi' in sys.modules)"],
+            capture_output=True,
+            text=True,
+        )
+
+        assert result.stdout.strip() == "False"
+
+    def test_invalid_jobs(self, capsys) -> None:
+        "Test that `--jobs` below 1 is a usage error, not a crash"
+        with pytest.raises(SystemExit) as exit_info:
+            main(["--jobs", "0", "status"])
+
+        assert exit_info.value.code == 2
+        assert "not a positive integer" in capsys.readouterr().err
+
+    def test_status(self, tmp_path, capsys) -> None:
+        "Test `pykek status` with an outdated git addon and a non-git addon"
+        wow_dir, addons_dir = self._make_instance(tmp_path)
+        work = make_upstream(tmp_path)
+        clone_addon(work, addons_dir)
+        push_commit(work, "Update", version="1.1")
+
+        exit_code = main(["--instance", str(wow_dir), "status"])
+
+        records = self._records(capsys)
+        assert exit_code == 0
+        assert records["VeryCoolAddon"]["status"] == "outdated"
+        assert records["VeryCoolAddon"]["branch"] == "main"
+        assert records["NonGitAddon"]["status"] == "non_git"
+
+    def test_update(self, tmp_path, capsys) -> None:
+        "Test `pykek update` updates outdated addons"
+        wow_dir, addons_dir = self._make_instance(tmp_path)
+        work = make_upstream(tmp_path)
+        addon = clone_addon(work, addons_dir)
+        new_sha = push_commit(work, "Update", version="1.1")
+
+        exit_code = main(["--instance", str(wow_dir), "update", "VeryCoolAddon"])
+
+        records = self._records(capsys)
+        assert exit_code == 0
+        assert records["VeryCoolAddon"]["updated"] is True
+        assert records["VeryCoolAddon"]["version"] == "1.1"
+        assert addon.head.commit.hexsha == new_sha
+
+    def test_update_atomic(self, tmp_path, capsys, monkeypatch) -> None:
+        "Test `pykek update --atomic` rolls every update back when one fails"
+        wow_dir, addons_dir = self._make_instance(tmp_path)
+        addons = {}
+        for name in ["Addon0", "Addon1"]:
+            work = make_upstream(tmp_path, name)
+            addons[name] = clone_addon(work, addons_dir, name)
+            push_commit(work, "Update", version="1.1")
+        shas = {name: addon.head.commit.hexsha for name, addon in addons.items()}
+        update_addon = bulk_update.update_addon
+
+        def failing_update_addon(addon, **kwargs):
+            if addon.name != "Addon1":
+                return update_addon(addon, **kwargs)
+            future: Future = Future()
+            future.set_exception(Exception("boom"))
+            return SimpleNamespace(future=future)
+
+        monkeypatch.setattr(bulk_update, "update_addon", failing_update_addon)
+
+        exit_code = main(["--instance", str(wow_dir), "update", "--atomic"])
+
+        records = self._records(capsys)
+        assert exit_code == 2
+        assert records["Addon1"]["status"] == "error"
+        assert records["Addon0"]["updated"] is False
+        assert records["Addon0"]["rolled_back"] is True
+        for name, addon in addons.items():
+            assert addon.head.commit.hexsha == shas[name]
+
+    def test_switch_author(self, tmp_path, capsys) -> None:
+        "Test that `pykek switch --author` switches the addons of an author"
+        wow_dir, addons_dir = self._make_instance(tmp_path)
+        work = make_upstream(tmp_path)
+        push_commit(work, "Dev", branch="dev", version="2.0-dev")
+        addon = clone_addon(work, addons_dir)
+        clone_addon(make_upstream(tmp_path, "OtherAddon"), addons_dir)
+
+        args = ["--instance", str(wow_dir), "switch", "dev", "--author", "upstreams"]
+        exit_code = main(args)
+
+        records = self._records(capsys)
+        assert exit_code == 0
+        assert list(records) == ["VeryCoolAddon"]
+        assert records["VeryCoolAddon"]["branch"] == "dev"
+        assert addon.active_branch.name == "dev"
+
+    def test_rollback(self, tmp_path, capsys) -> None:
+        "Test `pykek rollback` moves an updated addon back to its previous commit"
+        wow_dir, addons_dir = self._make_instance(tmp_path)
+        work = make_upstream(tmp_path)
+        addon = clone_addon(work, addons_dir)
+        previous_sha = addon.head.commit.hexsha
+        push_commit(work, "Update", version="1.1")
+        main(["--instance", str(wow_dir), "update", "VeryCoolAddon"])
+        capsys.readouterr()
+
+        exit_code = main(["--instance", str(wow_dir), "rollback", "--session"])
+
+        records = self._records(capsys)
+        assert exit_code == 0
+        assert records["VeryCoolAddon"]["sha"] == previous_sha
+        assert records["VeryCoolAddon"]["version"] == "1.0"
+        assert addon.head.commit.hexsha == previous_sha
+
+    def test_install_and_export(self, tmp_path, capsys) -> None:
+        "Test `pykek install` followed by `pykek export`"
+        wow_dir, _ = self._make_instance(tmp_path)
+        work = make_upstream(tmp_path)
+        url = work.remote().url
+
+        main(["--instance", str(wow_dir), "install", url])
+        capsys.readouterr()
+        exit_code = main(["--instance", str(wow_dir), "export"])
+
+        records = self._records(capsys)
+        assert exit_code == 0
+        assert records["VeryCoolAddon"]["url"] == url
+        assert records["VeryCoolAddon"]["sha"] == work.head.commit.hexsha
+        assert records["NonGitAddon"]["git"] is False
+
+    def test_timings(self, tmp_path, capsys) -> None:
+        "Test that `pykek timings` lists the slowest addons first"
+        timings.record("/wow/Interface/AddOns/Fast", "fetch", 0.5)
+        timings.record("/wow/Interface/AddOns/Slow", "fetch", 4.0)
+        timings.record("/wow/Interface/AddOns/Slow", "clone", 9.0)
+
+        exit_code = main(["timings", "--operation", "fetch"])
+        out = capsys.readouterr().out
+        records = list(map(json.loads, out.splitlines()))
+
+        assert exit_code == 0
+        assert [r["addon"] for r in records] == ["Slow", "Fast"]
+        assert records[0]["mean"] == 4.0
+
+    def test_maintenance(self, tmp_path, capsys) -> None:
+        "Test that `pykek maintenance` maintains git addons and reports their health"
+        wow_dir, addons_dir = self._make_instance(tmp_path)
+        clone_addon(make_upstream(tmp_path), addons_dir)
+
+        exit_code = main(["--instance", str(wow_dir), "maintenance"])
+
+        records = self._records(capsys)
+        assert exit_code == 0
+        assert list(records) == ["VeryCoolAddon"]
+        assert "commit-graph" in records["VeryCoolAddon"]["tasks"]
+        assert records["VeryCoolAddon"]["has_commit_graph"] is True
+
+    def test_dependencies(self, tmp_path, capsys) -> None:
+        "Test that `pykek dependencies` reports dependents and missing dependencies"
+        wow_dir, addons_dir = self._make_instance(tmp_path)
+        (addons_dir / "NonGitAddon" / "NonGitAddon.toc").write_text(
+            "## Dependencies: LibStub, Missing\n"
+        )
+        (addons_dir / "LibStub").mkdir()
+
+        exit_code = main(["--instance", str(wow_dir), "dependencies"])
+
+        records = self._records(capsys)
+        assert exit_code == 1
+        assert records["LibStub"]["dependents"] == ["NonGitAddon"]
+        assert records["NonGitAddon"]["missing"] == ["Missing"]
+
+    def test_does_not_import_heavy_modules(self) -> None:
+        "Test that GitPython, yaml and loguru are only imported on first use"
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, pykek.cli; "
+                "print([m for m in ['git', 'yaml', 'loguru'] if m in sys.modules])",
+            ],
+            capture_output=True,
+            text=True,
+        )
+
+        assert result.stdout.strip() == "[]"
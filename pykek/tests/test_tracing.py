@@ -0,0 +1,69 @@
+import json
+import threading
+from pykek.cli import main
+from pykek.tests.git_utils import clone_addon, make_upstream
+from pykek.tracing import Tracer, tracer
+
+
+class TestTracing:
+    ### Setup / Teardown
+
+    def teardown_method(self) -> None:
+        tracer.reset()
+
+    ### Tests
+
+    def test_disabled(self) -> None:
+        "Test that no span is recorded while tracing is disabled"
+        disabled = Tracer()
+
+        with disabled.span("load_addons", instance="/games/wow"):
+            pass
+
+        assert disabled.events() == []
+
+    def test_span_events(self, tmp_path) -> None:
+        "Test that spans are exported as Chrome complete events with their thread"
+        enabled = Tracer()
+        enabled.start(tmp_path / "trace.json")
+
+        def work() -> None:
+            with enabled.span("update", addon="VeryCoolAddon"):
+                pass
+
+        thread = threading.Thread(target=work, name="worker")
+        thread.start()
+        thread.join()
+        enabled.export()
+
+        with open(tmp_path / "trace.json", "r") as f:
+            events = json.load(f)["traceEvents"]
+        [span] = [e for e in events if e["ph"] == "X"]
+        [thread_name] = [e for e in events if e["ph"] == "M"]
+        assert span["name"] == "update"
+        assert span["args"] == {"addon": "VeryCoolAddon"}
+        assert span["dur"] >= 0
+        assert span["tid"] == thread_name["tid"]
+        assert thread_name["args"] == {"name": "worker"}
+
+    def test_cli_trace(self, tmp_path) -> None:
+        "Test that `pykek --trace` records the spans of the backend operations"
+        wow_dir = tmp_path / "wow"
+        (wow_dir / "Interface" / "AddOns").mkdir(parents=True)
+        (wow_dir / "WoW.exe").touch()
+        clone_addon(make_upstream(tmp_path), wow_dir / "Interface" / "AddOns")
+
+        main(
+            [
+                "--trace",
+                str(tmp_path / "trace.json"),
+                "--instance",
+                str(wow_dir),
+                "status",
+            ]
+        )
+        tracer.export()
+
+        with open(tmp_path / "trace.json", "r") as f:
+            names = {e["name"] for e in json.load(f)["traceEvents"]}
+        assert {"load_addons", "parse_toc", "check_for_update", "fetch"} <= names
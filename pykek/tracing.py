@@ -0,0 +1,125 @@
+"""
+Opt-in tracing of backend and UI operations.
+
+Spans are recorded only once tracing is started, either with the
+`PYKEK_TRACE=<path>` environment variable or with `pykek --trace <path>`, and
+are written at exit in the Chrome trace-event format, which can be opened in
+Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+"""
+
+import atexit
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+TRACE_ENV_VAR = "PYKEK_TRACE"
+
+
+class _NullSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *_) -> None:
+        return None
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_args", "_start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter_ns()
+
+    def __exit__(self, *_) -> None:
+        self._tracer._add(self._name, self._start, time.perf_counter_ns(), self._args)
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Tracer records spans, and costs a single attribute check while disabled"""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.path: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        self._thread_names: Dict[int, str] = {}
+        self._export_registered = False
+
+    def start(self, path: Path) -> None:
+        """Starts recording, the trace is written to `path` at exit"""
+        with self._lock:
+            if not self._export_registered:
+                atexit.register(self.export)
+                self._export_registered = True
+            self.path = path
+            self.enabled = True
+
+    def reset(self) -> None:
+        """Stops recording and drops the recorded spans. Mostly used for testing purpose."""
+        with self._lock:
+            self.enabled = False
+            self.path = None
+            self._events = []
+            self._thread_names = {}
+
+    def span(self, name: str, **args: Any):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": thread_name},
+            }
+            for tid, thread_name in thread_names.items()
+        ]
+        return metadata + events
+
+    def export(self, path: Optional[Path] = None) -> None:
+        path = path or self.path
+        if path is None:
+            return
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+
+    def _add(self, name: str, start_ns: int, end_ns: int, args: Dict[str, Any]) -> None:
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": "pykek",
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": args,
+        }
+        with self._lock:
+            self._events.append(event)
+            if thread.ident not in self._thread_names and thread.ident is not None:
+                self._thread_names[thread.ident] = thread.name
+
+
+tracer = Tracer()
+span = tracer.span
+
+if os.environ.get(TRACE_ENV_VAR):
+    tracer.start(Path(os.environ[TRACE_ENV_VAR]))